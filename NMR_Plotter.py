@@ -1,27 +1,169 @@
 import sys
+import time
+
+_STARTUP_T0 = time.perf_counter()
+
+if __name__ == "__main__" and sys.argv[1:2] == ["render"]:
+    # Headless batch rendering: run nmrplot.cli as the main module, so neither this
+    # process nor its pool workers import the GUI below (tkinter, TkAgg)
+    import runpy
+    del sys.argv[1]
+    runpy.run_module("nmrplot.cli", run_name="__main__", alter_sys=True)
+    sys.exit()
+
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 import os
-from pathlib import Path
-import threading, time 
-import pandas as pd
-import numpy as np
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from matplotlib import ticker
-from collections import defaultdict
-from collections import deque
-
-try:
-    import nmrglue as ng
-    HAS_NMRGLUE = True
-except Exception:
-    HAS_NMRGLUE = False
+import threading
+import queue
+import itertools
+import hashlib
+import importlib
+import base64
+
+from nmrplot.scan import (is_valid_pdata_dir, parse_expt_proc, quick_validate_bruker_top,
+                          traverse_directory_ascii, traverse_directory_pdata,
+                          extract_experiment_number, extract_proc_number, guess_leaf_type,
+                          read_scan_cache, save_scan_cache, cached_tree,
+                          sample_name, label_for)
+from nmrplot.templates import read_template
+from nmrplot.settings import PlotSettings
+from nmrplot.preferences import PREF_FILENAME, DEFAULT_PREFERENCES, safe_float
+from nmrplot import perf
+from nmrplot.watchdog import StallWatchdog
+
+# `python NMR_Plotter.py --profile-startup` prints import and phase timings
+PROFILE_STARTUP = __name__ == "__main__" and "--profile-startup" in sys.argv[1:]
+_startup_phases = [("light imports", time.perf_counter() - _STARTUP_T0)]
+
+def _startup_phase(name, t_start):
+    """Record a startup phase that began at *t_start* (perf_counter)."""
+    _startup_phases.append((name, time.perf_counter() - t_start))
+
+# ---------------------------------------------------------------------------
+#  Plotting modules, imported after the window is up
+# ---------------------------------------------------------------------------
+# numpy, matplotlib (with its Tk canvas) and nmrplot's drawing/export code are
+# most of a cold start, and nothing needs them until the first plot. The window
+# is built without them; NMRPlotterApp starts load_plotting_modules() on a
+# background thread once mainloop is running, and every plotting entry point
+# calls it again, which returns at once if the import is done and otherwise
+# waits for it (or does it).
+np = mpl = Figure = FigureCanvasTkAgg = CustomNavigationToolbar = None
+HAS_NMRGLUE = load_traces = load_spectrum = load_dataset = None
+transform_lines_for = draw_plot_on = build_export_figure = resolve_trace_colors = None
+write_figure = _format_bytes = VECTOR_FORMATS = None
+SPECTRUM_CACHE = lines_nbytes = figure_nbytes = decimate_lines = None
+PREFETCHER = None
+PREVIEW_CACHE = find_thumb = sparkline_ppm = None
+RESAMPLE_CACHE = None
+derived_path = derived_label = None
+PEAK_CACHE = PeakParams = None
+INTEGRAL_CACHE = integrals = None
+STATS_INDEX = None
+
+_plotting_lock = threading.Lock()
+_plotting_loaded = threading.Event()
+_import_times = []          # (module, seconds) of the deferred imports, for --profile-startup
+
+def _timed_import(name):
+    t0 = time.perf_counter()
+    module = importlib.import_module(name)
+    _import_times.append((name, time.perf_counter() - t0))
+    return module
+
+def load_plotting_modules():
+    """Import the plotting modules into this module's globals (any thread; idempotent)."""
+    global np, mpl, Figure, FigureCanvasTkAgg, CustomNavigationToolbar
+    global HAS_NMRGLUE, load_traces, load_spectrum, load_dataset
+    global transform_lines_for, draw_plot_on, build_export_figure, resolve_trace_colors
+    global write_figure, _format_bytes, VECTOR_FORMATS
+    global SPECTRUM_CACHE, lines_nbytes, figure_nbytes, decimate_lines, PREFETCHER
+    global PREVIEW_CACHE, find_thumb, sparkline_ppm, RESAMPLE_CACHE, derived_path, derived_label
+    global PEAK_CACHE, PeakParams, INTEGRAL_CACHE, integrals, STATS_INDEX
+    if _plotting_loaded.is_set():
+        return
+    with _plotting_lock:
+        if _plotting_loaded.is_set():
+            return
+        np = _timed_import("numpy")
+        mpl = _timed_import("matplotlib")
+        Figure = _timed_import("matplotlib.figure").Figure
+        backend = _timed_import("matplotlib.backends.backend_tkagg")
+        loaders = _timed_import("nmrplot.loaders")
+        render = _timed_import("nmrplot.render")
+        export = _timed_import("nmrplot.export")
+        memory = _timed_import("nmrplot.memory")
+
+        FigureCanvasTkAgg = backend.FigureCanvasTkAgg
+        CustomNavigationToolbar = _make_navigation_toolbar(backend.NavigationToolbar2Tk)
+        HAS_NMRGLUE, load_traces = loaders.HAS_NMRGLUE, loaders.load_traces
+        load_spectrum, load_dataset = loaders.load_spectrum, loaders.load_dataset
+        transform_lines_for, draw_plot_on = render.transform_lines_for, render.draw_plot_on
+        build_export_figure = render.build_export_figure
+        resolve_trace_colors = render.resolve_trace_colors
+        write_figure, VECTOR_FORMATS = export.write_figure, export.VECTOR_FORMATS
+        _format_bytes = export.format_bytes
+        SPECTRUM_CACHE = memory.SpectrumCache()
+        lines_nbytes, figure_nbytes = memory.lines_nbytes, memory.figure_nbytes
+        decimate_lines = memory.decimate_lines
+        prefetch = _timed_import("nmrplot.prefetch")
+        PREFETCHER = prefetch.Prefetcher(SPECTRUM_CACHE, loaders.load_spectrum, threads=2,
+                                         on_done=_prefetch_done)
+        RESAMPLE_CACHE = _timed_import("nmrplot.resample").ResampleCache()
+        arithmetic = _timed_import("nmrplot.arithmetic")
+        derived_path, derived_label = arithmetic.derived_path, arithmetic.derived_label
+        peaks = _timed_import("nmrplot.peaks")
+        PEAK_CACHE, PeakParams = peaks.PeakCache(), peaks.PeakParams
+        integrals = _timed_import("nmrplot.integrals")
+        INTEGRAL_CACHE = integrals.IntegralCache()
+        # every spectrum read from disk updates its statistics in the index
+        STATS_INDEX = _timed_import("nmrplot.stats").StatsIndex(STATS_INDEX_FILE)
+        SPECTRUM_CACHE.on_load = STATS_INDEX.record
+        preview = _timed_import("nmrplot.preview")
+        PREVIEW_CACHE = preview.PreviewCache()
+        find_thumb, sparkline_ppm = preview.find_thumb, preview.sparkline_ppm
+        _plotting_loaded.set()
+
+def _warm_up_plotting_modules(settings, dpi):
+    """Background thread body: import the plotting modules, then warm up the renderer.
+
+    The warm-up draws an off-screen figure with the startup template's fonts so
+    the first real plot skips font lookup, mathtext parsing and Agg setup
+    (benchmarks/bench_first_plot.py measures the difference).
+    """
+    t0 = time.perf_counter()
+    try:
+        load_plotting_modules()
+    except Exception as e:
+        # not fatal here: the first plot imports again and shows the real error
+        print(f"Background import of the plotting modules failed: {e}")
+        return
+    _startup_phase("plotting modules (background)", t0)
+    t0 = time.perf_counter()
+    try:
+        _timed_import("nmrplot.render").warm_up(settings, dpi)
+    except Exception as e:
+        print(f"Renderer warm-up failed: {e}")
+    _startup_phase("renderer warm-up (background)", t0)
+    _startup_phases.append(("ready to plot (since launch)", time.perf_counter() - _STARTUP_T0))
+    if PROFILE_STARTUP:
+        app.after(0, _print_startup_profile)
+
+def _print_startup_profile():
+    out = sys.stderr
+    print("Startup profile:", file=out)
+    for name, seconds in _startup_phases:
+        print(f"  {name:<34}{seconds * 1e3:>9.1f} ms", file=out)
+    print("Deferred imports (each line excludes what the lines above already loaded):", file=out)
+    for name, seconds in _import_times:
+        print(f"  {name:<34}{seconds * 1e3:>9.1f} ms", file=out)
 
 BASE_DIR   = os.path.dirname(os.path.abspath(__file__))
+STALL_LOG  = os.path.join(BASE_DIR, "stalls.log")
 CACHE_FILE_ASCII = os.path.join(BASE_DIR, "cache_ascii.txt")
 CACHE_FILE_PDATA = os.path.join(BASE_DIR, "cache_pdata.txt")
+STATS_INDEX_FILE = os.path.join(BASE_DIR, "stats_index.txt")
 
 # ---------------------------------------------------------------------------
 # Global container used by add_dirs / traverse_directory helpers
@@ -32,8 +174,6 @@ existing_data = {}
 # --------------------
 # Preference Handling
 # --------------------
-PREF_FILENAME = "preferences.txt"
-
 def get_preferences():
     base_dir = os.path.dirname(os.path.abspath(__file__))
     return {
@@ -41,10 +181,20 @@ def get_preferences():
         "template_dir": os.path.join(base_dir, "plot_templates"),
         "default_template": os.path.join(base_dir, "plot_templates", "default.txt"),
         "figure_save_dir": os.path.join(base_dir, "figures"),
-        "couple_x_limits": "1",
-        "disable_int_norm": "0",
-        "import_mode": "ascii",
-        "export_use_fixed_size": "1",  # "1" = export uses fixed W/H/DPI; "0" = WYSIWYG
+        "perf_instrumentation": "0",   # "1" = record stage timings (Performance dialog)
+        "stall_watchdog": "0",         # "1" = log main-loop stalls to stalls.log
+        "stall_threshold_ms": "250",
+        "memory_budget_mb": "1024",    # loaded spectra + live figure + caches + queued exports
+        "peak_threshold_sigma": "8",   # peaks rise this many noise sigmas above the median
+        "peak_min_separation": "0.02", # x-axis units; only the tallest of closer peaks is kept
+        "peak_interpolate": "1",       # "1" = refine peak positions on a parabola
+        "peak_max_labels": "20",       # labelled peaks per trace, tallest first
+        "integral_regions": "",        # e.g. "7.4-7.2, 3.3-3.1", in integral_unit
+        "integral_unit": "ppm",        # ppm or Hz
+        "integral_show": "1",          # "1" = shade the regions on the plot
+        "integral_curves": "0",        # "1" = draw each trace's running integral over them
+        "index_stats_on_scan": "1",    # "1" = read scanned datasets in the background for their SNR
+        **DEFAULT_PREFERENCES,   # plotting/export options, shared with the batch renderer
     }
 
 def get_pref(preferences, key, default=""):
@@ -52,23 +202,13 @@ def get_pref(preferences, key, default=""):
 
 def load_template_file(filepath):
     try:
-        with open(filepath, "r") as f:
-            for line_number, line in enumerate(f, 1):
-                if not line.strip():
-                    continue
-                if ':' not in line:
-                    print(f"Warning: Line {line_number} is malformed (missing colon): {line.strip()}")
-                    continue
-                key, value = line.strip().split(":", 1)
-                if not key:                         # allow empty values
-                    print(f"Warning: Line {line_number} has empty key: {line.strip()}")
-                    continue
-                if key in state:
-                    if isinstance(state[key], tk.Entry):
-                        state[key].delete(0, tk.END)
-                        state[key].insert(0, value)
-                    elif isinstance(state[key], tk.StringVar):
-                        state[key].set(value)
+        for key, value in read_template(filepath).items():
+            if key in state:
+                if isinstance(state[key], tk.Entry):
+                    state[key].delete(0, tk.END)
+                    state[key].insert(0, value)
+                elif isinstance(state[key], tk.StringVar):
+                    state[key].set(value)
     except Exception as e:
         print(f"Error loading default template: {e}")
 
@@ -150,6 +290,11 @@ def _init_plot_status_bar(parent_frame):
     lbl.grid(row=99, column=0, columnspan=10, sticky='ew', padx=5, pady=2)
     state['plot_status_var'] = plot_status
 
+    memory_var = tk.StringVar(value="")
+    ttk.Label(parent_frame, textvariable=memory_var, anchor='e', foreground="#555").grid(
+        row=100, column=0, columnspan=10, sticky='ew', padx=5, pady=(0, 2))
+    state['memory_var'] = memory_var
+
 _plot_status_clear_job = None
 def set_plot_status(msg, duration=None):
     """Set the plot-frame status bar message. Optionally clear after duration (ms)."""
@@ -203,194 +348,6 @@ def clear_status():
         app.after_cancel(_status_clear_job)
         _status_clear_job = None
 
-def _save_dir_cache(top_dir: str, ascii_list: list[str]):
-    """
-    Save or update one directory’s scan in last_scan.txt.
-    If *top_dir* already exists in the cache, its block is **replaced**.
-    """
-    ascii_list = [p for p in ascii_list if _is_valid_ascii_layout(top_dir, p)]
-    # ---------- read existing blocks ----------
-    blocks: dict[str, set[str]] = {}
-    if os.path.exists(CACHE_FILE_ASCII):
-        with open(CACHE_FILE_ASCII, "r", encoding="utf-8") as fh:
-            cur_top = None
-            for ln in fh:
-                line = ln.rstrip("\n")
-                if line.startswith("TOP:"):
-                    cur_top = line[4:]
-                    blocks[cur_top] = set()
-                elif cur_top and line:
-                    blocks[cur_top].add(line)
-
-    # ---------- overwrite *only* this directory ----------
-    blocks[top_dir] = set(ascii_list)          # <- overwrite, no .update()
-
-    # ---------- write back ----------
-    with open(CACHE_FILE_ASCII, "w", encoding="utf-8") as fh:
-        for td, paths in blocks.items():
-            fh.write(f"TOP:{td}\n")
-            for p in sorted(paths):
-                fh.write(p + "\n")
-
-def _load_dir_cache() -> list[tuple[str, list[str]]] | None:
-    """Return [(top_dir, [ascii1 …]), …] or None if the file is absent/empty."""
-    if not os.path.exists(CACHE_FILE_ASCII):
-        return None
-
-    blocks = []
-    with open(CACHE_FILE_ASCII, "r", encoding="utf-8") as fh:
-        cur_top, cur_paths = None, []
-        for ln in fh:
-            line = ln.rstrip("\n")
-            if line.startswith("TOP:"):
-                if cur_top:
-                    blocks.append((cur_top, cur_paths))
-                cur_top, cur_paths = line[4:], []
-            elif line:
-                cur_paths.append(line)
-        if cur_top:
-            blocks.append((cur_top, cur_paths))
-
-    return blocks or None
-
-def _save_dir_cache_pdata(top_dir: str, pdata_dirs: list[str]):
-    """Save/update one directory’s scan in last_scan_pdata.txt (TOP: blocks)."""
-    pdata_dirs = [d for d in pdata_dirs if _is_valid_pdata_layout(top_dir, d)]
-    blocks: dict[str, set[str]] = {}
-    if os.path.exists(CACHE_FILE_PDATA):
-        with open(CACHE_FILE_PDATA, "r", encoding="utf-8") as fh:
-            cur_top = None
-            for ln in fh:
-                line = ln.rstrip("\n")
-                if line.startswith("TOP:"):
-                    cur_top = line[4:]
-                    blocks[cur_top] = set()
-                elif cur_top and line:
-                    blocks[cur_top].add(line)
-    blocks[top_dir] = set(pdata_dirs)  # replace this directory’s block
-    with open(CACHE_FILE_PDATA, "w", encoding="utf-8") as fh:
-        for td, paths in blocks.items():
-            fh.write(f"TOP:{td}\n")
-            for p in sorted(paths):
-                fh.write(p + "\n")
-
-def _load_dir_cache_pdata() -> list[tuple[str, list[str]]] | None:
-    """Return [(top_dir, [pdata_dir …]), …] from last_scan_pdata.txt."""
-    if not os.path.exists(CACHE_FILE_PDATA):
-        return None
-    blocks = []
-    with open(CACHE_FILE_PDATA, "r", encoding="utf-8") as fh:
-        cur_top, cur_paths = None, []
-        for ln in fh:
-            line = ln.rstrip("\n")
-            if line.startswith("TOP:"):
-                if cur_top:
-                    blocks.append((cur_top, cur_paths))
-                cur_top, cur_paths = line[4:], []
-            elif line:
-                cur_paths.append(line)
-        if cur_top:
-            blocks.append((cur_top, cur_paths))
-    return blocks or None
-
-def _is_valid_pdata_dir(path: str) -> bool:
-    """Accept only pdata/<proc> dirs that include procs and 1r (2rr unsupported)."""
-    return (
-        os.path.isdir(path)
-        and os.path.isfile(os.path.join(path, "procs"))
-        and os.path.isfile(os.path.join(path, "1r"))
-    )
-
-def _parse_expt_proc_from_any(path_like: str) -> tuple[str, str]:
-    """
-    Given either a pdata dir or .../pdata/<proc>/ascii-spec.txt,
-    return (expno, procno) as strings. Falls back to '?' if unclear.
-    """
-    p = Path(path_like)
-    if p.name == "ascii-spec.txt":
-        p = p.parent  # -> pdata/<proc>
-    # expect .../<expno>/pdata/<proc>
-    parts = [part for part in p.parts]
-    try:
-        i = len(parts) - 1
-        procno = parts[i]
-        if parts[i - 1].lower() == "pdata":
-            expno = parts[i - 2]
-        else:
-            expno = "?"
-    except Exception:
-        expno, procno = "?", "?"
-    return expno, procno
-
-def _label_for(path_like: str) -> str:
-    expno, procno = _parse_expt_proc_from_any(path_like)
-    return f"Expt {expno}, proc {procno}"
-
-def _as_float(val):
-    """Coerce Bruker/nmrglue values (which can be arrays/strings) to a float, or None."""
-    try:
-        if isinstance(val, (list, tuple, np.ndarray)):
-            val = np.asarray(val).ravel()[0]
-        return float(val)
-    except Exception:
-        return None
-
-def _load_bruker_pdata(pdata_dir: str, x_unit: str):
-    """
-    Version-proof Bruker pdata loader: returns (x, y) as 1-D float arrays.
-    X built from procs: OFFSET (ppm at leftmost point), SW (hz width), SF (MHz).
-    """
-    if not HAS_NMRGLUE:
-        raise ImportError("nmrglue is not installed; cannot read Bruker pdata.")
-
-    dic, data = ng.bruker.read_pdata(pdata_dir)  # dic contains 'procs' and 'acqus'
-    y = np.asarray(data, dtype=float).squeeze().ravel()
-    npts = y.size
-
-    procs = dic.get("procs", {})
-    acqus = dic.get("acqus", {})
-
-    offset_ppm = _as_float(procs.get("OFFSET"))      # ppm at leftmost point
-    sw_hz      = _as_float(procs.get("SW_p"))        # Hz in procs
-    sf_mhz     = _as_float(procs.get("SF"))          # spectrometer frequency in MHz
-
-    # Fallbacks if needed
-    if sw_hz is None:
-        sw_hz = _as_float(acqus.get("SW_h"))         # Hz from acqus
-    if sf_mhz in (None, 0.0):
-        # last resort: try from acqus
-        sf_mhz = _as_float(acqus.get("SFO1")) or _as_float(acqus.get("SF"))
-
-    npts = max(int(npts), 1)
-
-    # Build X axis
-    if (x_unit == "ppm") and (offset_ppm is not None) and (sw_hz is not None) and (sf_mhz not in (None, 0.0)) and (npts > 1):
-        sw_ppm  = sw_hz / sf_mhz            # 1 ppm = SF_MHz Hz  → ppm = Hz / SF_MHz
-        step_ppm = sw_ppm / (npts - 1)      # ensure total span == sw_ppm
-        x = offset_ppm - np.arange(npts, dtype=float) * step_ppm
-    else:
-        # Build in Hz then convert (or fall back to index if params missing)
-        if (offset_ppm is not None) and (sw_hz is not None) and (sf_mhz not in (None, 0.0)) and (npts > 1):
-            offset_hz = offset_ppm * sf_mhz
-            step_hz   = sw_hz / (npts - 1)
-            x_hz = offset_hz - np.arange(npts, dtype=float) * step_hz
-        else:
-            x_hz = np.arange(npts, dtype=float)
-
-        if x_unit == "kHz":
-            x = x_hz / 1000.0
-        elif x_unit == "Hz":
-            x = x_hz
-        else:  # asked for ppm but we lack params; safest fallback: show Hz axis
-            x = x_hz
-
-    x = np.asarray(x, dtype=float).ravel()
-    return x, y
-
-
-# --------------------
-# Preferences Dialog
-# --------------------
 class PreferencesDialog(tk.Toplevel):
     def __init__(self, master, preferences, on_save_callback):
         super().__init__(master)
@@ -445,6 +402,39 @@ class PreferencesDialog(tk.Toplevel):
             variable=self.vars["export_use_fixed_size"], onvalue="1", offvalue="0"
         ).grid(row=row, column=0, columnspan=3, sticky="w", padx=10, pady=(8,0)); row += 1
 
+        simp = ttk.Frame(self)
+        simp.grid(row=row, column=0, columnspan=3, sticky="w", padx=10, pady=(8, 0))
+        ttk.Checkbutton(simp,
+            text="Simplify traces in vector exports (PDF/SVG); tolerance (pt):",
+            variable=self.vars["export_simplify"], onvalue="1", offvalue="0"
+        ).grid(row=0, column=0, sticky="w")
+        ttk.Entry(simp, textvariable=self.vars["export_simplify_tol_pt"], width=6).grid(
+            row=0, column=1, sticky="w", padx=(4, 0))
+        row += 1
+
+        ttk.Checkbutton(self,
+            text="Rasterise spectrum lines in vector exports (axes and text stay vector)",
+            variable=self.vars["export_rasterize_lines"], onvalue="1", offvalue="0"
+        ).grid(row=row, column=0, columnspan=3, sticky="w", padx=10, pady=(4, 0)); row += 1
+
+        ttk.Label(self, text="Write PNG exports in strips at or above (megapixels)").grid(
+            row=row, column=0, sticky="w", padx=10, pady=(8, 2))
+        ttk.Entry(self, textvariable=self.vars["export_tiled_png_mpx"], width=8).grid(
+            row=row, column=1, sticky="w", padx=10, pady=(8, 2))
+        row += 1
+
+        ttk.Label(self, text="Render this many queued exports at the same time").grid(
+            row=row, column=0, sticky="w", padx=10, pady=(8, 2))
+        ttk.Entry(self, textvariable=self.vars["export_threads"], width=8).grid(
+            row=row, column=1, sticky="w", padx=10, pady=(8, 2))
+        row += 1
+
+        ttk.Label(self, text="Batch traces into a single LineCollection above (traces)").grid(
+            row=row, column=0, sticky="w", padx=10, pady=(8, 2))
+        ttk.Entry(self, textvariable=self.vars["linecollection_threshold"], width=8).grid(
+            row=row, column=1, sticky="w", padx=10, pady=(8, 2))
+        row += 1
+
         # --- Import mode combobox ---
         self.import_mode_var = tk.StringVar(
             value=("ascii" if self.vars.get("import_mode", tk.StringVar(value="ascii")).get() == "ascii" else "pdata")
@@ -463,12 +453,54 @@ class PreferencesDialog(tk.Toplevel):
         self.import_mode_combo.bind("<<ComboboxSelected>>", lambda e: self.on_change())
         row += 1
 
+        ttk.Separator(self, orient="horizontal").grid(row=row, column=0, columnspan=3,
+                                             sticky="ew", pady=5)
+        row += 1
+
+        stall = ttk.Frame(self)
+        stall.grid(row=row, column=0, columnspan=3, sticky="w", padx=10)
+        ttk.Checkbutton(stall,
+            text="Log UI stalls longer than (ms):",
+            variable=self.vars["stall_watchdog"], onvalue="1", offvalue="0"
+        ).grid(row=0, column=0, sticky="w")
+        ttk.Entry(stall, textvariable=self.vars["stall_threshold_ms"], width=6).grid(
+            row=0, column=1, sticky="w", padx=(4, 0))
+        ttk.Label(stall, text=f"→ {STALL_LOG}", foreground="#555").grid(
+            row=0, column=2, sticky="w", padx=(8, 0))
+        row += 1
+        self._build_stall_summary(row)
+        row += 1
+
         self.save_btn = ttk.Button(self, text="Save Preferences", command=self.save, state='disabled')
         self.save_btn.grid(row=row, column=0, columnspan=3, pady=15)
 
         for var in self.vars.values():
             var.trace_add("write", self.on_change)
 
+    def _build_stall_summary(self, row):
+        """Worst main-loop stalls of this session, by the callback they happened in."""
+        watchdog = getattr(self.master, "watchdog", None)
+        if watchdog is None:
+            ttk.Label(self, text="Stall watchdog is off.", foreground="#555").grid(
+                row=row, column=0, columnspan=3, sticky="w", padx=10, pady=(2, 0))
+            return
+        tree = ttk.Treeview(self, columns=("stalls", "total", "worst", "where"),
+                            show="tree headings", height=5)
+        tree.heading("#0", text="Worst stalls (callback)")
+        tree.column("#0", width=220)
+        for col, text, width in (("stalls", "Stalls", 60), ("total", "Total ms", 80),
+                                 ("worst", "Worst ms", 80), ("where", "Busiest in", 220)):
+            tree.heading(col, text=text)
+            tree.column(col, width=width, anchor="w" if col == "where" else "e")
+        for callback, entry in watchdog.summary():
+            tree.insert("", "end", text=callback, values=(
+                entry["stalls"], f"{entry['total_ms']:.0f}", f"{entry['worst_ms']:.0f}", entry["where"]))
+        lat = sorted(watchdog.latencies_ms)
+        if lat:
+            tree.insert("", "end", text="(tick latency, recent)", values=(
+                len(lat), f"p50 {lat[len(lat) // 2]:.0f}", f"max {lat[-1]:.0f}", ""))
+        tree.grid(row=row, column=0, columnspan=3, sticky="ew", padx=10, pady=(2, 0))
+
     def browse(self, key):
         current = self.vars[key].get() or BASE_DIR
 
@@ -512,128 +544,651 @@ class PreferencesDialog(tk.Toplevel):
                 pass
             self.destroy()
 # ---------------------------------------------------------------------------
-#  Custom toolbar so “Save” starts in preferences["figure_save_dir"]
+#  Background export queue
 # ---------------------------------------------------------------------------
-class CustomNavigationToolbar(NavigationToolbar2Tk):
-    # Hide “Configure subplots” and “Customize” buttons (see section 4)
-    toolitems = [t for t in NavigationToolbar2Tk.toolitems
-                 if t and t[0] not in {"Subplots", "Customize","Pan"}]
-
-    def press_zoom(self, event):
-        # turn off constrained while zooming to avoid the zero-size warning
-        self._had_constrained = self.canvas.figure.get_constrained_layout()
-        if self._had_constrained:
-            self.canvas.figure.set_constrained_layout(False)
-        super().press_zoom(event)
-
-    def release_zoom(self, event):
-        super().release_zoom(event)
-        fig = self.canvas.figure
-        # re-pad so labels are visible post-zoom
-        try:
-            # If constrained_layout is active, subplots_adjust is incompatible and will be skipped.
-            if getattr(fig, "get_constrained_layout", lambda: False)():
-                # constrained_layout will handle spacing automatically; do nothing here.
-                pass
-            else:
-                fig.subplots_adjust(left=0.06, right=0.94, top=0.94, bottom=0.12)
-        except Exception:
-            # Be defensive — if anything goes wrong, at least don't crash the GUI.
-            pass
-        self.canvas.draw_idle()
-    
-    def save_figure(self, *args):  # overrides the stock method
-        default_dir = app.preferences.get("figure_save_dir", ".")
-        filetypes = [('PDF', '*.pdf'),
-                     ('PNG', '*.png'),
-                     ('SVG', '*.svg')
-                     # ('PostScript', '*.ps'),  # currently disabled, suboptimal export characteristics
-                     # ('EPS', '*.eps'),        # currently disabled, suboptimal export characteristics
-                     ]
+def _widget_values(state):
+    """{key: text} of every Entry/Variable in *state*, keyed like a template file."""
+    return {key: obj.get() for key, obj in state.items()
+            if isinstance(obj, (tk.Entry, tk.Variable))}
+
+def _plot_settings(state):
+    """PlotSettings read from the widgets (Tk thread only). ValueError names a bad field."""
+    return PlotSettings.from_values(_widget_values(state))
+
+def _traces_digest(lines):
+    """Content digest of the plotted traces, for cache and duplicate keys."""
+    h = hashlib.blake2b(digest_size=16)
+    for x, y in lines:
+        for arr in (x, y):
+            arr = np.ascontiguousarray(arr, dtype=float)
+            h.update(arr.size.to_bytes(8, "little"))
+            h.update(arr.tobytes())
+    return h.hexdigest()
+
+def _snapshot_plot_state(state):
+    """Copy everything an export needs out of the live widgets (Tk thread only).
+
+    Settings are parsed, traces are copied, and trace colours are resolved
+    here so a bad field or custom colour is reported before anything is queued.
+    Raises ValueError.
+    """
+    load_plotting_modules()
+    shown = state.get('lines') or []
+    if not shown:
+        raise ValueError("Plot a spectrum before exporting.")
+    settings = _plot_settings(state)
+    snap = {'settings': settings, 'data_key': _traces_digest(shown),
+            'colors': resolve_trace_colors(settings, len(shown)), 'peaks': state.get('peaks'),
+            'integrals': state.get('integrals') or (None, False),
+            'view_limits': None}     # [(xlim, ylim)] per axis to keep a toolbar zoom; set by save_figure
+    if state.get('decimated'):
+        # the plot shows decimated traces; the export worker re-reads them at full resolution
+        snap['lines'], snap['source'] = None, state['plot_source']
+    else:
+        snap['lines'] = [[np.array(x, dtype=float), np.array(y, dtype=float)] for x, y in shown]
+    return snap
+
+class ExportCancelled(Exception):
+    pass
+
+class ExportJob:
+    """One queued figure export. Status/progress are written by the worker, read by the UI."""
+    _ids = itertools.count(1)
+
+    def __init__(self, filename, fmt, w_in, h_in, dpi, snapshot,
+                 simplify_tol_pt=None, rasterize_lines=False, tiled_png_mpx=None):
+        self.id = next(self._ids)
+        self.filename = filename
+        self.fmt = fmt
+        self.w_in, self.h_in, self.dpi = w_in, h_in, dpi
+        self.snapshot = snapshot
+        # vector-only options; ignored for raster formats
+        self.simplify_tol_pt = simplify_tol_pt
+        self.rasterize_lines = rasterize_lines
+        # PNG only: write in strips when the image has at least this many megapixels
+        self.tiled_png_mpx = tiled_png_mpx
+        # identical key = identical output file; used to drop duplicate submissions
+        self.key = (snapshot['settings'].content_hash(), snapshot['data_key'],
+                    str(snapshot['view_limits']), fmt,
+                    round(w_in, 4), round(h_in, 4), int(dpi), os.path.abspath(filename),
+                    simplify_tol_pt, rasterize_lines, tiled_png_mpx)
+        self.tiled = False
+        self.points_before = self.points_after = None
+        self.file_size = None
+        self.status = "queued"          # queued | running | done | failed | cancelled
+        self.progress = 0               # percent
+        self.stage = ""
+        self.error = None
+        self.elapsed = None
+        self._cancel = threading.Event()
+
+    @property
+    def name(self):
+        return os.path.basename(self.filename)
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == "queued":
+            self.status = "cancelled"
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise ExportCancelled()
+
+    def describe(self):
+        return f"{self.w_in * 25.4:.0f}×{self.h_in * 25.4:.0f} mm @ {int(self.dpi)} DPI"
+
+    def result_summary(self):
+        """'1.2 MB, 5,120,000 → 38,400 points' style summary of a finished export."""
+        parts = []
+        if self.file_size is not None:
+            parts.append(_format_bytes(self.file_size))
+        if self.points_before is not None and self.points_after != self.points_before:
+            parts.append(f"{self.points_before:,} → {self.points_after:,} points")
+        if self.rasterize_lines and self.fmt in VECTOR_FORMATS:
+            parts.append("lines rasterised")
+        if self.tiled:
+            parts.append("tiled")
+        return ", ".join(parts)
+
+def _linecollection_threshold():
+    return int(safe_float(app.preferences.get("linecollection_threshold", "100"), 100))
+
+def _render_export(job, report):
+    """Build the figure from the job's snapshot and write it (worker thread)."""
+    snap = job.snapshot
+    lines = snap['lines']
+    if lines is None:
+        report(job, "Reading full-resolution data", 5)
+        src = snap['source']
+        lines, problems = load_traces(src['sources'], src['settings'].load_unit,
+                                      *src['settings'].x_range(src['coupled']), cache=SPECTRUM_CACHE)
+        if len(lines) != len(src['sources']):
+            # the colours belong to the plotted traces; a missing one would shift them all
+            raise ValueError(f"Re-read {len(lines)} of the {len(src['sources'])} plotted spectra"
+                             + (f" ({problems[0]})" if problems else "") + "; plot again and re-export.")
+        job.check_cancelled()
+        transform_lines_for(lines, src['settings'], normalize=src['normalize'])
+    report(job, "Building figure", 10)
+    fig = build_export_figure(snap['settings'], lines, job.w_in, job.h_in, job.dpi,
+                              colors=snap['colors'], linecollection_threshold=_linecollection_threshold(),
+                              cache=RESAMPLE_CACHE,
+                              data_key=snap['data_key'] if snap['lines'] is not None else None,
+                              peaks=snap['peaks'], peak_labels=_peak_labels(),
+                              integral_regions=snap['integrals'][0], integral_curves=snap['integrals'][1])
+    # WYSIWYG exports keep the on-screen zoom and pan
+    for ax, (xlim, ylim) in zip(fig.axes, snap['view_limits'] or ()):
+        ax.set_xlim(xlim)
+        ax.set_ylim(ylim)
+    job.check_cancelled()
+
+    def on_progress(stage, pct):
+        job.check_cancelled()
+        report(job, stage, pct)
+
+    result = write_figure(fig, job.filename, job.fmt, job.dpi,
+                          simplify_tol_pt=job.simplify_tol_pt,
+                          rasterize_lines=job.rasterize_lines,
+                          tiled_png_mpx=job.tiled_png_mpx,
+                          on_progress=on_progress)
+    job.points_before, job.points_after = result["points_before"], result["points_after"]
+    job.tiled, job.file_size = result["tiled"], result["file_size"]
+
+class ExportQueue:
+    """FIFO of ExportJobs rendered on background threads; UI callbacks go through app.after.
+
+    Each job builds its own pyplot-free Figure, so up to the "export_threads"
+    preference of them are rendered at the same time.
+    """
+
+    KEEP_FINISHED = 200
+
+    def __init__(self):
+        self.jobs: list[ExportJob] = []
+        self._pending: queue.Queue = queue.Queue()
+        self._listeners = []
+        self._workers: list[threading.Thread] = []
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def _notify(self, job):
+        def _fire():
+            for fn in list(self._listeners):
+                try:
+                    fn(job)
+                except Exception:
+                    pass
+        app.after(0, _fire)
+
+    def pending_count(self):
+        return sum(1 for j in self.jobs if j.status in ("queued", "running"))
+
+    def snapshot_nbytes(self):
+        """Bytes of traces copied into queued and running jobs."""
+        return sum(lines_nbytes(j.snapshot['lines']) for j in list(self.jobs)
+                   if j.snapshot is not None and j.snapshot['lines'] is not None)
+
+    def submit(self, job):
+        """Queue *job*; returns False (and queues nothing) if the same export is already pending."""
+        if any(j.key == job.key and j.status in ("queued", "running") for j in self.jobs):
+            set_plot_status(f"Export of {job.name} is already in the queue", 4000)
+            return False
+        # keep the history of finished jobs bounded in long sessions
+        finished = [j for j in self.jobs if j.status not in ("queued", "running")]
+        for old in finished[:max(0, len(finished) - self.KEEP_FINISHED)]:
+            self.jobs.remove(old)
+        self.jobs.append(job)
+        self._pending.put(job)
+        n_threads = max(1, int(safe_float(app.preferences.get("export_threads", "2"), 2)))
+        self._workers = [w for w in self._workers if w.is_alive()]
+        if len(self._workers) < min(n_threads, self.pending_count()):
+            worker = threading.Thread(target=self._run, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        n = self.pending_count()
+        set_plot_status(f"⏳ Queued export {job.name} ({n} in queue)")
+        self._notify(job)
+        return True
+
+    def cancel(self, job):
+        job.cancel()
+        self._notify(job)
+
+    def _report(self, job, stage, progress):
+        job.stage, job.progress = stage, progress
+        self._notify(job)
+
+    def _run(self):
+        while True:
+            job = self._pending.get()
+            if job.status == "cancelled":
+                continue
+            job.status = "running"
+            t0 = time.perf_counter()
+            try:
+                job.check_cancelled()
+                _render_export(job, self._report)
+                job.status, job.progress, job.stage = "done", 100, ""
+            except ExportCancelled:
+                job.status, job.stage = "cancelled", ""
+            except Exception as e:
+                job.status, job.stage, job.error = "failed", "", str(e)
+            job.elapsed = time.perf_counter() - t0
+            job.snapshot = None        # release the copied traces
+            self._notify(job)
+            app.after(0, lambda j=job: self._announce(j))
+
+    def _announce(self, job):
+        _enforce_memory_budget()
+        left = self.pending_count()
+        tail = f" — {left} more in queue" if left else ""
+        if job.status == "done":
+            summary = job.result_summary()
+            summary = f" ({summary})" if summary else ""
+            set_plot_status(f"✅ Saved {job.name}{summary} in {job.elapsed:.1f}s{tail}", 6000)
+        elif job.status == "cancelled":
+            set_plot_status(f"Export of {job.name} cancelled{tail}", 4000)
+        else:
+            set_plot_status(f"❌ Export of {job.name} failed: {job.error}{tail}", 8000)
+
+EXPORT_QUEUE = ExportQueue()
+
+class ExportQueueDialog(tk.Toplevel):
+    """Lists queued/running/finished exports with progress and cancellation."""
+
+    def __init__(self, master, export_queue):
+        super().__init__(master)
+        self.transient(master)
+        self.title("Exports")
+        self.export_queue = export_queue
+
+        self.tree = ttk.Treeview(self, columns=("size", "status", "progress"), show="tree headings", height=8)
+        self.tree.heading("#0", text="File")
+        self.tree.heading("size", text="Size")
+        self.tree.heading("status", text="Status")
+        self.tree.heading("progress", text="Progress")
+        self.tree.column("#0", width=220)
+        self.tree.column("size", width=170)
+        self.tree.column("status", width=300)
+        self.tree.column("progress", width=70, anchor="e")
+        self.tree.grid(row=0, column=0, columnspan=2, sticky="nsew", padx=10, pady=(10, 5))
+
+        self.progress = ttk.Progressbar(self, mode="determinate", maximum=100)
+        self.progress.grid(row=1, column=0, columnspan=2, sticky="ew", padx=10, pady=5)
+
+        ttk.Button(self, text="Cancel selected", command=self.cancel_selected).grid(
+            row=2, column=0, sticky="w", padx=10, pady=(5, 10))
+        ttk.Button(self, text="Close", command=self.close).grid(
+            row=2, column=1, sticky="e", padx=10, pady=(5, 10))
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.export_queue.add_listener(self._on_job)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def _on_job(self, job):
+        if self.winfo_exists():
+            self.refresh()
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        running = None
+        for job in reversed(self.export_queue.jobs):
+            status = job.stage if job.status == "running" and job.stage else job.status
+            if job.status == "failed" and job.error:
+                status = f"failed: {job.error}"
+            elif job.status == "done" and job.result_summary():
+                status = f"done: {job.result_summary()}"
+            self.tree.insert("", "end", iid=str(job.id), text=job.name,
+                             values=(job.describe(), status, f"{job.progress}%"))
+            if job.status == "running":
+                running = job
+        self.progress["value"] = running.progress if running else 0
+
+    def cancel_selected(self):
+        ids = {int(i) for i in self.tree.selection()}
+        for job in self.export_queue.jobs:
+            if job.id in ids and job.status in ("queued", "running"):
+                self.export_queue.cancel(job)
+        self.refresh()
+
+    def close(self):
+        self.export_queue.remove_listener(self._on_job)
+        self.destroy()
+
+_SPARK = " ▁▂▃▄▅▆▇█"
+
+def _sparkline(counts):
+    top = max(counts) or 1
+    return "".join(_SPARK[-(-c * (len(_SPARK) - 1) // top)] for c in counts)
+
+class PerformanceDialog(tk.Toplevel):
+    """Rolling per-stage timings from nmrplot.perf, refreshed while open."""
+    REFRESH_MS = 1000
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.transient(master)
+        self.title("Performance")
+
+        self.enabled_var = tk.IntVar(value=int(perf.is_enabled()))
+        ttk.Checkbutton(self, text="Record stage timings (scan, cache, load, mask, transform, draw, export)",
+                        variable=self.enabled_var, command=self.toggle).grid(
+                        row=0, column=0, columnspan=3, sticky="w", padx=10, pady=(10, 5))
+
+        columns = ("count", "mean", "p50", "p90", "p99", "max", "hist")
+        self.tree = ttk.Treeview(self, columns=columns, show="tree headings", height=12)
+        self.tree.heading("#0", text="Stage")
+        self.tree.column("#0", width=150)
+        for col, text in zip(columns, ("Count", "Mean ms", "p50", "p90", "p99", "Max", "")):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=70, anchor="e")
+        edges = ", ".join(f"{e:g}" for e in perf.HISTOGRAM_EDGES_MS[:-1])
+        self.tree.heading("hist", text="Histogram (ms buckets)")
+        self.tree.column("hist", width=170, anchor="w")
+        self.tree.grid(row=1, column=0, columnspan=3, sticky="nsew", padx=10, pady=5)
+        ttk.Label(self, text=f"Histogram buckets end at {edges} ms and above; "
+                             f"statistics cover the last {perf.ROLLING_WINDOW} calls of each stage.",
+                  foreground="#555").grid(row=2, column=0, columnspan=3, sticky="w", padx=10)
+
+        ttk.Button(self, text="Reset", command=self.reset).grid(
+            row=3, column=0, sticky="w", padx=10, pady=(5, 10))
+        ttk.Button(self, text="Export Chrome trace…", command=self.export_trace).grid(
+            row=3, column=1, sticky="w", padx=10, pady=(5, 10))
+        ttk.Button(self, text="Close", command=self.close).grid(
+            row=3, column=2, sticky="e", padx=10, pady=(5, 10))
+
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(2, weight=1)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self._job = None
+        self.refresh()
+
+    def toggle(self):
+        on = bool(self.enabled_var.get())
+        perf.enable(on)
+        app.preferences["perf_instrumentation"] = "1" if on else "0"
+        save_preferences(app.preferences)
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        for row in perf.summary():
+            self.tree.insert("", "end", text=row["stage"], values=(
+                row["count"], f"{row['mean']:.2f}", f"{row['p50']:.2f}", f"{row['p90']:.2f}",
+                f"{row['p99']:.2f}", f"{row['max']:.2f}", _sparkline(perf.histogram(row["stage"]))))
+        self._job = self.after(self.REFRESH_MS, self.refresh)
+
+    def reset(self):
+        perf.reset()
+        if self._job:
+            self.after_cancel(self._job)
+        self.refresh()
+
+    def export_trace(self):
         filename = filedialog.asksaveasfilename(
-            title="Save the figure",
-            defaultextension=".pdf",
-            filetypes=filetypes,
-            initialdir=default_dir
-        )
+            title="Export Chrome trace", defaultextension=".json",
+            filetypes=[("Trace event JSON", "*.json")],
+            initialfile="nmrplotter-trace.json")
         if not filename:
             return
+        try:
+            n = perf.export_chrome_trace(filename)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write the trace: {e}")
+            return
+        set_plot_status(f"Wrote {n:,} spans to {os.path.basename(filename)} "
+                        "(open in chrome://tracing or ui.perfetto.dev)", 6000)
 
-        ext = os.path.splitext(filename)[1].lower()
-        use_fixed = app.preferences.get("export_use_fixed_size", "1") == "1"
+    def close(self):
+        if self._job:
+            self.after_cancel(self._job)
+        self.destroy()
 
-        # Keep text selectable; avoid transparency → fewer masks in AI
-        rc = {
-            "pdf.fonttype": 42,        # embed TrueType; text stays text
-            "ps.fonttype": 42,
-            "svg.fonttype": "none",    # keep <text> in SVG
-            "savefig.transparent": False
-        }
+class IntegralsDialog(tk.Toplevel):
+    """Integral regions: shaded on the plot, and integrated over every workspace trace.
 
-        with mpl.rc_context(rc):
-            if use_fixed:
-                unit = (state.get('fig_size_unit') and state['fig_size_unit'].get()) or "mm"
-                w_ui = safe_float(state['fig_w_var'].get(), 85 if unit == "mm" else 3.35)
-                h_ui = safe_float(state['fig_h_var'].get(), 60 if unit == "mm" else 2.36)
-                dpi  = int(safe_float(state['fig_dpi_var'].get(), 300))
-
-                # convert to inches for matplotlib
-                if unit == "mm":
-                    w_in, h_in = w_ui / 25.4, h_ui / 25.4
-                elif unit == "px":
-                    w_in, h_in = w_ui / dpi, h_ui / dpi
+    Each spectrum's cumulative integral is cached (INTEGRAL_CACHE), so changing
+    the regions only costs two lookups per region and trace.
+    """
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.transient(master)
+        self.title("Integrals")
+        load_plotting_modules()
+        prefs = app.preferences
+
+        self.regions_var = tk.StringVar(value=prefs.get("integral_regions", ""))
+        self.unit_var = tk.StringVar(value=prefs.get("integral_unit") or "ppm")
+        self.show_var = tk.BooleanVar(value=prefs.get("integral_show", "1") == "1")
+        self.curves_var = tk.BooleanVar(value=prefs.get("integral_curves", "0") == "1")
+        self.relative_var = tk.BooleanVar(value=True)
+
+        ttk.Label(self, text="Regions").grid(row=0, column=0, sticky="w", padx=(10, 5), pady=(10, 5))
+        entry = ttk.Entry(self, textvariable=self.regions_var, width=48)
+        entry.grid(row=0, column=1, columnspan=2, sticky="ew", pady=(10, 5))
+        entry.bind("<Return>", lambda _e: self.apply())
+        ttk.Combobox(self, textvariable=self.unit_var, values=integrals.REGION_UNITS,
+                     state="readonly", width=5).grid(row=0, column=3, sticky="w", padx=(5, 10), pady=(10, 5))
+
+        options = ttk.Frame(self)
+        options.grid(row=1, column=0, columnspan=4, sticky="w", padx=10)
+        ttk.Checkbutton(options, text="Shade regions on the plot", variable=self.show_var).pack(side="left")
+        ttk.Checkbutton(options, text="Draw integral curves", variable=self.curves_var).pack(side="left", padx=10)
+        ttk.Checkbutton(options, text="Relative to the first region", variable=self.relative_var,
+                        command=self.show_rows).pack(side="left")
+
+        self.tree = ttk.Treeview(self, show="tree headings", height=12)
+        self.tree.grid(row=2, column=0, columnspan=4, sticky="nsew", padx=10, pady=5)
+        self.status_var = tk.StringVar(value="Regions are separated by commas, e.g. 7.4-7.2, 3.3-3.1")
+        ttk.Label(self, textvariable=self.status_var, foreground="#555").grid(
+            row=3, column=0, columnspan=4, sticky="w", padx=10)
+
+        ttk.Button(self, text="Apply", command=self.apply).grid(
+            row=4, column=0, sticky="w", padx=10, pady=(5, 10))
+        ttk.Button(self, text="Export CSV…", command=self.export_csv).grid(
+            row=4, column=1, sticky="w", pady=(5, 10))
+        ttk.Button(self, text="Close", command=self.destroy).grid(
+            row=4, column=3, sticky="e", padx=10, pady=(5, 10))
+
+        self.grid_rowconfigure(2, weight=1)
+        self.grid_columnconfigure(2, weight=1)
+        self.unit, self.regions, self.rows = "ppm", [], []
+        self._generation = itertools.count(1)
+        self._current = 0
+        if self.regions_var.get().strip():
+            self.apply()
+
+    def apply(self):
+        """Save the regions and options, replot, and integrate over the workspace traces."""
+        try:
+            regions = integrals.parse_regions(self.regions_var.get())
+        except ValueError as e:
+            messagebox.showerror("Integrals", str(e), parent=self)
+            return
+        prefs = app.preferences
+        prefs.update({"integral_regions": self.regions_var.get().strip(), "integral_unit": self.unit_var.get(),
+                      "integral_show": "1" if self.show_var.get() else "0",
+                      "integral_curves": "1" if self.curves_var.get() else "0"})
+        save_preferences(prefs)
+        if state.get('lines'):
+            plot_graph(state)
+        tree = state['workspace_tree']
+        items = tree.get_children()
+        if not regions or not items:
+            self.unit, self.regions, self.rows = self.unit_var.get(), regions, []
+            self.show_rows()
+            self.status_var.set("Add regions and workspace traces to see their integrals.")
+            return
+        names = {tree.item(i)["values"][0]: tree.item(i, "text") for i in items}
+        generation = self._current = next(self._generation)
+        self.status_var.set(f"Integrating {len(names)} traces…")
+        threading.Thread(target=self._worker, daemon=True,
+                         args=(generation, names, self.unit_var.get(), regions)).start()
+
+    def _worker(self, generation, names, unit, regions):
+        t0 = time.perf_counter()
+        try:
+            rows, problems = integrals.integral_table(
+                list(names), unit, regions, lambda p, u: load_dataset(p, u, SPECTRUM_CACHE), INTEGRAL_CACHE)
+            result = ([(names[path], path, values) for path, values in rows], problems)
+        except Exception as e:
+            result = e
+        app.after(0, lambda: self._finish(generation, unit, regions, result, time.perf_counter() - t0))
+
+    def _finish(self, generation, unit, regions, result, elapsed):
+        if generation != self._current or not self.winfo_exists():
+            return
+        if isinstance(result, Exception):
+            self.status_var.set(f"❌ Integration failed: {result}")
+            return
+        self.unit, self.regions, (self.rows, problems) = unit, regions, result
+        self.show_rows()
+        text = f"{len(self.rows)} traces × {len(regions)} regions in {elapsed * 1e3:.0f} ms"
+        if problems:
+            text += f" · skipped {len(problems)}: {problems[-1]}"
+        self.status_var.set(text)
+        _enforce_memory_budget()
+
+    def show_rows(self):
+        columns = [f"r{k}" for k in range(len(self.regions))]
+        self.tree.delete(*self.tree.get_children())
+        self.tree.configure(columns=columns)
+        self.tree.heading("#0", text="Dataset")
+        self.tree.column("#0", width=220)
+        for col, region in zip(columns, self.regions):
+            self.tree.heading(col, text=integrals.format_region(region, self.unit))
+            self.tree.column(col, width=110, anchor="e")
+        relative = self.relative_var.get()
+        for name, _path, values in self.rows:
+            shown = integrals.relative_integrals(values) if relative else values
+            self.tree.insert("", "end", text=name,
+                             values=[f"{v:.4f}" if relative else f"{v:.5g}" for v in shown])
+
+    def export_csv(self):
+        if not self.rows:
+            messagebox.showinfo("Integrals", "Apply some regions to the workspace traces first.", parent=self)
+            return
+        filename = filedialog.asksaveasfilename(
+            title="Export integrals", defaultextension=".csv", filetypes=[("CSV", "*.csv")],
+            initialfile="integrals.csv", parent=self)
+        if not filename:
+            return
+        try:
+            integrals.write_integrals_csv(filename, self.unit, self.regions, self.rows)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write the table: {e}", parent=self)
+            return
+        set_plot_status(f"Wrote integrals of {len(self.rows)} traces to {os.path.basename(filename)}", 5000)
+
+# ---------------------------------------------------------------------------
+#  Custom toolbar so “Save” starts in preferences["figure_save_dir"]
+# ---------------------------------------------------------------------------
+def _make_navigation_toolbar(NavigationToolbar2Tk):
+    """The toolbar class; built by load_plotting_modules() once the Tk backend is imported."""
+    class CustomNavigationToolbar(NavigationToolbar2Tk):
+        # Hide “Configure subplots” and “Customize” buttons (see section 4)
+        toolitems = [t for t in NavigationToolbar2Tk.toolitems
+                     if t and t[0] not in {"Subplots", "Customize","Pan"}]
+
+        def press_zoom(self, event):
+            # turn off constrained while zooming to avoid the zero-size warning
+            self._had_constrained = self.canvas.figure.get_constrained_layout()
+            if self._had_constrained:
+                self.canvas.figure.set_constrained_layout(False)
+            super().press_zoom(event)
+
+        def release_zoom(self, event):
+            super().release_zoom(event)
+            fig = self.canvas.figure
+            # re-pad so labels are visible post-zoom
+            try:
+                # If constrained_layout is active, subplots_adjust is incompatible and will be skipped.
+                if getattr(fig, "get_constrained_layout", lambda: False)():
+                    # constrained_layout will handle spacing automatically; do nothing here.
+                    pass
                 else:
-                    w_in, h_in = w_ui, h_ui
-
-                fig = plt.Figure(figsize=(w_in, h_in), dpi=dpi, layout="constrained")
-                ax  = fig.add_subplot(111)
-                ok  = _draw_plot_on(ax, state)
-                if ok:
-                    # Illustrator-friendly background and no clipping on lines
-                    fig.patch.set_facecolor("white")
-                    ax.set_facecolor("white")
-                    for ln in ax.lines:
-                        ln.set_clip_on(True)
-
-                    if ext == ".pdf":
-                        fig.savefig(filename, format="pdf", dpi=dpi, bbox_inches='tight', pad_inches=0.02)
-                    elif ext == ".svg":
-                        fig.savefig(filename, format="svg", dpi=dpi, bbox_inches='tight', pad_inches=0.02)
-                    else:
-                        fig.savefig(filename, dpi=dpi, bbox_inches='tight', pad_inches=0.02)
-                plt.close(fig)
+                    fig.subplots_adjust(left=0.06, right=0.94, top=0.94, bottom=0.12)
+            except Exception:
+                # Be defensive — if anything goes wrong, at least don't crash the GUI.
+                pass
+            self.canvas.draw_idle()
+    
+        def save_figure(self, *args):  # overrides the stock method
+            default_dir = app.preferences.get("figure_save_dir", ".")
+            filetypes = [('PDF', '*.pdf'),
+                         ('PNG', '*.png'),
+                         ('SVG', '*.svg')
+                         # ('PostScript', '*.ps'),  # currently disabled, suboptimal export characteristics
+                         # ('EPS', '*.eps'),        # currently disabled, suboptimal export characteristics
+                         ]
+            filename = filedialog.asksaveasfilename(
+                title="Save the figure",
+                defaultextension=".pdf",
+                filetypes=filetypes,
+                initialdir=default_dir
+            )
+            if not filename:
+                return
 
+            ext = os.path.splitext(filename)[1].lower()
+            use_fixed = app.preferences.get("export_use_fixed_size", "1") == "1"
+
+            # Snapshot on the Tk thread; the worker never touches widgets
+            try:
+                snapshot = _snapshot_plot_state(state)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+
+            if use_fixed:
+                w_in, h_in, dpi = snapshot['settings'].figure_size()
             else:
-                # WYSIWYG export of the on-screen figure, but still AI-friendly
+                # WYSIWYG: same size/DPI and toolbar zoom as the on-screen figure, rebuilt off-screen
                 fig = self.canvas.figure
-                fig.patch.set_facecolor("white")
-                for ax in fig.axes:
-                    ax.set_facecolor("white")
-                    for ln in ax.lines:
-                        ln.set_clip_on(True)
-
-                if ext == ".pdf":
-                    fig.savefig(filename, format="pdf", dpi=fig.dpi, bbox_inches='tight', pad_inches=0.02)
-                elif ext == ".svg":
-                    fig.savefig(filename, format="svg", dpi=fig.dpi, bbox_inches='tight', pad_inches=0.02)
-                else:
-                    fig.savefig(filename, dpi=fig.dpi, bbox_inches='tight', pad_inches=0.02)
+                w_in, h_in = fig.get_size_inches()
+                dpi = fig.dpi
+                snapshot['view_limits'] = [(ax.get_xlim(), ax.get_ylim()) for ax in fig.axes]
+
+            simplify = app.preferences.get("export_simplify", "0") == "1"
+            job = ExportJob(
+                filename, ext.lstrip(".") or "png", w_in, h_in, dpi, snapshot,
+                simplify_tol_pt=(safe_float(app.preferences.get("export_simplify_tol_pt"), 0.1) or 0.1)
+                                if simplify else None,
+                rasterize_lines=app.preferences.get("export_rasterize_lines", "0") == "1",
+                tiled_png_mpx=safe_float(app.preferences.get("export_tiled_png_mpx"), None),
+            )
+            EXPORT_QUEUE.submit(job)
+
+    return CustomNavigationToolbar
 
 # ---------------------------------------------------------------------------
 # Main GUI class 
 # ---------------------------------------------------------------------------
 class NMRPlotterApp(tk.Tk):
     def __init__(self):
+        t0 = time.perf_counter()
         super().__init__()
         self.preferences = load_preferences()
+        perf.enable(self.preferences.get("perf_instrumentation") == "1")
         self.pref_window = None  # Track if a PreferencesDialog is already open
         self.title("NMR Plotter")
         self._init_styles()
         # one place to keep spectra and widget handles
-        self.existing_data: dict[str, pd.DataFrame] = {}
+        self.existing_data: dict = {}
         self.widgets: dict[str, tk.Widget] = {}    # widget registry 
 
+        _startup_phase("Tk root, preferences", t0)
+        t0 = time.perf_counter()
         self._build_gui()
+        _startup_phase("build widgets", t0)
 
         # ---- choose a sensible start size: 60 % of screen, but never smaller than 900×600 ----
         self.update_idletasks()                      # finish geometry calculations
@@ -642,11 +1197,32 @@ class NMRPlotterApp(tk.Tk):
         h = max(600, int(scr_h * 0.60))
         self.geometry(f"{w}x{h}")
 
+        t0 = time.perf_counter()
         default_template = self.preferences.get("default_template")
         if default_template and os.path.isfile(default_template):
             load_template_file(default_template)
-        
+        _startup_phase("default template", t0)
+
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.bind("<Map>", self._on_first_map, add="+")
+        # idle callbacks run after the pending redraws, i.e. once the window is drawn
+        self.after_idle(self._start_warm_up)
+        self._configure_watchdog()
+
+    def _on_first_map(self, event):
+        if event.widget is self:
+            self.unbind("<Map>")
+            _startup_phases.append(("first window (since launch)", time.perf_counter() - _STARTUP_T0))
+
+    def _start_warm_up(self):
+        # warm up with what the first plot will most likely use: the startup template
+        try:
+            settings = _plot_settings(state)
+        except ValueError:
+            settings = PlotSettings()
+        resizable = bool(state.get('resizable_mode_var') and state['resizable_mode_var'].get())
+        dpi = 100 if resizable else settings.figure_size()[2]
+        threading.Thread(target=_warm_up_plotting_modules, args=(settings, dpi), daemon=True).start()
 
     def _init_styles(self):
             style = ttk.Style(self)
@@ -672,17 +1248,66 @@ class NMRPlotterApp(tk.Tk):
         self.preferences = updated_prefs
         save_preferences(updated_prefs)
         self._apply_coupled_limits() 
+        self._configure_watchdog()
+        _enforce_memory_budget()
+
+    WATCHDOG_TICK_MS = 50
+
+    def _configure_watchdog(self):
+        """Start, restart or stop the main-loop stall watchdog to match the preferences."""
+        old = getattr(self, "watchdog", None)
+        if old is not None:
+            old.stop()
+            self.after_cancel(self._watchdog_job)
+            self.watchdog = None
+        if self.preferences.get("stall_watchdog") != "1":
+            return
+        threshold = safe_float(self.preferences.get("stall_threshold_ms"), 250) or 250
+        self.watchdog = StallWatchdog(threshold, self.WATCHDOG_TICK_MS, STALL_LOG)
+        if old is not None:
+            self.watchdog.offenders = old.offenders     # keep the session's summary
+        self.watchdog.start()
+        self._watchdog_job = self.after(self.WATCHDOG_TICK_MS, self._watchdog_tick)
+
+    def _watchdog_tick(self):
+        self.watchdog.tick()
+        self._watchdog_job = self.after(self.WATCHDOG_TICK_MS, self._watchdog_tick)
     
     def open_preferences(self):
         if self.pref_window is None or not self.pref_window.winfo_exists():
             self.pref_window = PreferencesDialog(self, self.preferences, self.apply_preferences)
 
+    def open_exports(self):
+        if getattr(self, "exports_window", None) is None or not self.exports_window.winfo_exists():
+            self.exports_window = ExportQueueDialog(self, EXPORT_QUEUE)
+        else:
+            self.exports_window.lift()
+
+    def open_performance(self):
+        if getattr(self, "performance_window", None) is None or not self.performance_window.winfo_exists():
+            self.performance_window = PerformanceDialog(self)
+        else:
+            self.performance_window.lift()
+
+    def open_integrals(self):
+        if getattr(self, "integrals_window", None) is None or not self.integrals_window.winfo_exists():
+            self.integrals_window = IntegralsDialog(self)
+        else:
+            self.integrals_window.lift()
+
     def on_closing(self):
         """Close child dialogs, stop timers, release figures and exit cleanly."""
         # Close the Preferences dialog if it is still open
         if getattr(self, "pref_window", None) and self.pref_window.winfo_exists():
             self.pref_window.destroy()
 
+        # Exports run on a daemon thread; quitting now would abandon them
+        pending = EXPORT_QUEUE.pending_count()
+        if pending and not messagebox.askyesno(
+                "Exports in progress",
+                f"{pending} figure export{'s are' if pending != 1 else ' is'} still queued or running.\n\nQuit anyway?"):
+            return
+
         # Cancel the delayed-call that updates the status bar (if scheduled)
         global _status_clear_job
         try:
@@ -692,8 +1317,16 @@ class NMRPlotterApp(tk.Tk):
             pass
         _status_clear_job = None
 
-        # Close all matplotlib figures that live outside Tk’s control
-        plt.close('all')
+        if getattr(self, "watchdog", None) is not None:
+            self.watchdog.stop()                              # closing may block; not a stall
+
+        if _index_cancel is not None:
+            _index_cancel.set()
+        if STATS_INDEX is not None:
+            try:
+                STATS_INDEX.save()
+            except OSError as e:
+                print(f"Could not save the statistics index: {e}", file=sys.stderr)
 
         # Destroy the Tk application and leave Python
         self.destroy()
@@ -736,9 +1369,13 @@ class NMRPlotterApp(tk.Tk):
         data_frame = ttk.LabelFrame(self, text="Data Import")
         data_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10, rowspan=2, columnspan=2)
 
-        data_tree = ttk.Treeview(data_frame, show="tree")
+        # values are (path, SNR text); only the SNR is shown, filled from STATS_INDEX
+        data_tree = ttk.Treeview(data_frame, show="tree", columns=("path", "snr"), displaycolumns=("snr",))
         data_tree.column("#0", width=300, stretch=True, anchor='w')
+        data_tree.column("snr", width=90, stretch=False, anchor='e')
         data_tree.grid(row=0, column=0, sticky="nsew", padx=5, columnspan=5)
+        data_tree.bind("<<TreeviewSelect>>", _on_data_tree_select, add="+")
+        data_tree.bind("<<TreeviewSelect>>", _request_preview, add="+")
         
         add_dir_btn = ttk.Button(data_frame ,text="Add New Dir", command=lambda: add_dirs(data_tree))
         add_dir_btn.grid(row=1, column=0, sticky="", padx=5, pady=5)
@@ -761,6 +1398,15 @@ class NMRPlotterApp(tk.Tk):
         add_workspace_btn = ttk.Button(data_frame, text="Add to Plot Workspace", command=lambda: add_to_workspace(data_tree, workspace_tree))
         add_workspace_btn.grid(row=1, column=4, sticky="", padx=5, pady=5, ipady=5)
 
+        # fixed height, so the tree does not jump when the first preview arrives
+        preview_frame = ttk.Frame(data_frame, height=PREVIEW_H + 6)
+        preview_frame.grid(row=2, column=0, columnspan=5, sticky="ew", padx=5)
+        preview_frame.grid_propagate(False)
+        preview_label = ttk.Label(preview_frame, text="Select a dataset to preview it here",
+                                  compound="left", anchor="w", foreground="#555")
+        preview_label.grid(row=0, column=0, sticky="w", pady=3)
+        state['preview_label'] = preview_label
+
         _init_status_bar(data_frame)
         
         # WORKSPACE FRAME
@@ -788,11 +1434,26 @@ class NMRPlotterApp(tk.Tk):
                                 command=lambda: plot_graph(state),
                                 state='disabled',
                                 style="Plot.TButton")
-        plot_data_btn.grid(row=2, column=0, columnspan=4, sticky="nsew", padx=5, pady=(15,5), ipady=5)
+        derive_btn = ttk.Menubutton(workspace_frame, text="New derived trace from selection ▾")
+        derive_menu = tk.Menu(derive_btn, tearoff=False)
+        for label, op in (("Mean", "mean"), ("Sum", "sum"), ("Difference A − B", "difference"),
+                          ("Scaled difference A − k × B…", "scaled difference")):
+            derive_menu.add_command(label=label, command=lambda op=op: add_derived_trace(workspace_tree, op))
+        derive_btn["menu"] = derive_menu
+        derive_btn.grid(row=2, column=0, columnspan=3, sticky="nsew", padx=5, pady=(0, 5))
+
+        sort_btn = ttk.Menubutton(workspace_frame, text="Sort ▾")
+        sort_menu = tk.Menu(sort_btn, tearoff=False)
+        for label, key in WORKSPACE_SORTS:
+            sort_menu.add_command(label=label, command=lambda key=key: sort_workspace(workspace_tree, key))
+        sort_btn["menu"] = sort_menu
+        sort_btn.grid(row=2, column=3, sticky="nsew", padx=5, pady=(0, 5))
+
+        plot_data_btn.grid(row=3, column=0, columnspan=4, sticky="nsew", padx=5, pady=(15,5), ipady=5)
         self.widgets['plot_data_btn'] = plot_data_btn
         state['plot_data_btn']        = plot_data_btn
 
-        workspace_frame.grid_rowconfigure(2, weight=1)   # give the new row stretch
+        workspace_frame.grid_rowconfigure(3, weight=1)   # give the new row stretch
 
         # ACTION FRAME
         action_frame = ttk.LabelFrame(self, text="Templates and Preferences")
@@ -807,6 +1468,15 @@ class NMRPlotterApp(tk.Tk):
         preferences_btn = ttk.Button(action_frame, text="Preferences", command=self.open_preferences)
         preferences_btn.grid(row=0, column=2, sticky="nsew", padx=5, pady=5)
 
+        exports_btn = ttk.Button(action_frame, text="Exports…", command=self.open_exports)
+        exports_btn.grid(row=0, column=3, sticky="nsew", padx=5, pady=5)
+
+        performance_btn = ttk.Button(action_frame, text="Performance…", command=self.open_performance)
+        performance_btn.grid(row=0, column=4, sticky="nsew", padx=5, pady=5)
+
+        integrals_btn = ttk.Button(action_frame, text="Integrals…", command=self.open_integrals)
+        integrals_btn.grid(row=0, column=5, sticky="nsew", padx=5, pady=5)
+
         _init_tpl_status_bar(action_frame)
 
         # CANVAS FRAME
@@ -918,17 +1588,23 @@ class NMRPlotterApp(tk.Tk):
         color_scheme_label = ttk.Label(customization_frame, text="Color Scheme:").grid(row=3, column=4, sticky="w", padx=10, pady=5)
         color_scheme_var = tk.StringVar()
 
-        # use non-reversed colormaps; add a single-color choice at the top
-        _cmaps = [name for name in mpl.colormaps if not name.endswith("_r")]
-        _cmaps.sort()
-        color_scheme_values = ["Single color — user specified"] + _cmaps
+        def _fill_color_schemes():
+            # colormap names need matplotlib, so the list is filled when first opened;
+            # use non-reversed colormaps; add a single-color choice at the top
+            if len(color_scheme_combobox["values"]) > 1:
+                return
+            load_plotting_modules()
+            _cmaps = [name for name in mpl.colormaps if not name.endswith("_r")]
+            _cmaps.sort()
+            color_scheme_combobox["values"] = ["Single color — user specified"] + _cmaps
 
         color_scheme_combobox = ttk.Combobox(
             customization_frame,
-            values=color_scheme_values,
+            values=["Single color — user specified"],
             textvariable=color_scheme_var,
             width=18,  # slightly wider so full names like 'viridis' fit
-            state="readonly"
+            state="readonly",
+            postcommand=_fill_color_schemes
         )
         color_scheme_combobox.grid(row=3, column=5, sticky="w", padx=8, pady=5)
         color_scheme_combobox.current(0)  # default to single color (acts like your old "Custom")
@@ -952,7 +1628,7 @@ class NMRPlotterApp(tk.Tk):
 
         mode_label = ttk.Label(customization_frame, text="Mode:").grid(row=2, column=6, sticky="w", padx=10, pady=5)
         mode_var = tk.StringVar()
-        mode_combobox = ttk.Combobox(customization_frame, values=["stack", "overlay"], textvariable=mode_var, width=5, state="readonly")
+        mode_combobox = ttk.Combobox(customization_frame, values=["stack", "overlay", "heatmap", "waterfall"], textvariable=mode_var, width=9, state="readonly")
         mode_combobox.grid(row=2, column=7, sticky="w", padx=8, pady=5)
         mode_combobox.current(0)
 
@@ -1032,6 +1708,11 @@ class NMRPlotterApp(tk.Tk):
         )
         resizable_chk.grid(row=0, column=0, sticky="w", padx=(0,8), pady=0)
 
+        state['show_peaks_var'] = tk.BooleanVar(value=False)
+        ttk.Checkbutton(tick_tools, text="Label peaks", variable=state['show_peaks_var']).grid(
+            row=1, column=0, sticky="w", padx=(0, 8), pady=(3, 0))
+        state['show_peaks_var'].trace_add('write', lambda *_: state.get('lines') and plot_graph(state))
+
         grab_btn = ttk.Button(
             tick_tools,
             text="Get current plot size",
@@ -1081,12 +1762,13 @@ class NMRPlotterApp(tk.Tk):
 
         workspace_frame.grid_rowconfigure(0, weight=1)  # Allow the workspace tree to expand
         workspace_frame.grid_rowconfigure(1, weight=0)   # ↑/↓/Remove/Clear buttons
-        workspace_frame.grid_rowconfigure(2, weight=0)   # Plot Spectrum button (stays visible)
+        workspace_frame.grid_rowconfigure(2, weight=0)   # derived-trace menu
+        workspace_frame.grid_rowconfigure(3, weight=0)   # Plot Spectrum button (stays visible)
         for col in range(4):
             workspace_frame.grid_columnconfigure(col, weight=1)  # Allow the buttons to expand
 
         action_frame.grid_rowconfigure(0, weight=0)  # Allow the action buttons to expand
-        for col in range(4):
+        for col in range(6):
             action_frame.grid_columnconfigure(col, weight=1)  # Allow the buttons to expand
         
         canvas_frame.grid_rowconfigure(0, weight=1)  # Allow the canvas to expand
@@ -1142,202 +1824,6 @@ class NMRPlotterApp(tk.Tk):
         self._apply_coupled_limits() 
     
 
-def safe_float(text, default=None):
-    # Utility: safe float conversion (blank or non-numeric → default)
-    try:
-        return float(text)
-    except (TypeError, ValueError):
-        return default
-
-def is_bruker_pdata_dir(path: str) -> bool:
-    """Return True if *path* looks like a Bruker processed directory (pdata/<proc>)."""
-    if not os.path.isdir(path):
-        return False
-    procs = os.path.join(path, "procs")
-    one_r = os.path.join(path, "1r")
-    two_rr = os.path.join(path, "2rr")
-    return os.path.isfile(procs) and (os.path.isfile(one_r) or os.path.isfile(two_rr))
-
-def find_pdata_dir(path: str) -> str | None:
-    """
-    Given anything inside a Bruker dataset, find the nearest pdata/<proc> dir
-    that contains procs + 1r/2rr. If *path* itself is such a dir, return it.
-    """
-    if is_bruker_pdata_dir(path):
-        return path
-    # walk up at most 5 levels just to be safe
-    cur = os.path.abspath(path)
-    for _ in range(5):
-        parent = os.path.dirname(cur)
-        if parent == cur:
-            break
-        # common layout: .../<expt>/pdata/<proc>/
-        if os.path.basename(parent).lower() == "pdata":
-            # check all children
-            for child in os.listdir(parent):
-                cand = os.path.join(parent, child)
-                if is_bruker_pdata_dir(cand):
-                    return cand
-        if is_bruker_pdata_dir(parent):
-            return parent
-        cur = parent
-    # brute-force search below original root as a last resort
-    if os.path.isdir(path):
-        for root, dirs, files in os.walk(path):
-            if is_bruker_pdata_dir(root):
-                return root
-    return None
-
-def _quick_validate_bruker_top(
-    selected_dir: str,
-    *,
-    expected_depth: int = 4,   # relative parts: sample/expt/pdata/proc
-    max_visits: int = 600,     # hard cap on how many dirs we’ll look at
-    max_depth: int = 6         # never look deeper than this from selected_dir
-) -> tuple[bool, str | None]:
-    """
-    Fast, bounded validator. Returns (True, None) only when we find a valid
-    Bruker proc dir (procs + 1r or ascii-spec.txt) at exactly:
-        <sel>/<sample>/<expt>/pdata/<proc>  (depth == expected_depth)
-
-    Returns (False, reason) when:
-      - The user is too LOW (sel/pdata exists)
-      - The first valid dataset we spot is deeper than expected → TOO HIGH
-      - We hit the visit/depth limits or see no valid layout quickly
-    """
-    sel = Path(selected_dir)
-    if not sel.exists() or not sel.is_dir():
-        return False, "Selected path does not exist or is not a directory."
-
-    # Too LOW: they clicked directly into an experiment (has 'pdata' here)
-    if (sel / "pdata").exists():
-        return False, "Selected folder looks like an experiment-level folder (too LOW)."
-
-    # Bounded breadth-first search using os.scandir (fast, avoids stat-ing all children)
-    q = deque([(str(sel), 0)])
-    visits = 0
-
-    def _is_proc_dir(path: str) -> bool:
-        # Accept pdata/<proc> that has 'procs' AND (1r or ascii-spec.txt)
-        procs = os.path.join(path, "procs")
-        one_r = os.path.join(path, "1r")
-        ascsp = os.path.join(path, "ascii-spec.txt")
-        return os.path.isfile(procs) and (os.path.isfile(one_r) or os.path.isfile(ascsp))
-
-    while q:
-        cur, depth = q.popleft()
-        if depth > max_depth:
-            continue
-
-        try:
-            with os.scandir(cur) as it:
-                for entry in it:
-                    if not entry.is_dir(follow_symlinks=False):
-                        continue
-
-                    visits += 1
-                    if visits > max_visits:
-                        # We refuse to scan a huge tree from too high up
-                        return False, "Selected folder appears to be too high (quick check limit reached)."
-
-                    # Fast path: if this directory itself is a valid proc folder, measure its depth.
-                    if _is_proc_dir(entry.path):
-                        rel_depth = len(Path(entry.path).relative_to(sel).parts)
-                        if rel_depth == expected_depth:
-                            return True, None
-                        if rel_depth > expected_depth:
-                            return False, "Selected folder appears to be too high in the directory tree."
-                        # If somehow shallower, keep going (very unusual)
-
-                    # Cheap pruning: if we already hit 'pdata' at this level, don’t recurse past proc level
-                    if entry.name.lower() == "pdata":
-                        # Only look one level into pdata (proc folders)
-                        try:
-                            with os.scandir(entry.path) as procs:
-                                for p in procs:
-                                    if p.is_dir(follow_symlinks=False) and _is_proc_dir(p.path):
-                                        rel_depth = len(Path(p.path).relative_to(sel).parts)
-                                        if rel_depth == expected_depth:
-                                            return True, None
-                                        if rel_depth > expected_depth:
-                                            return False, "Selected folder appears to be too high in the directory tree."
-                        except PermissionError:
-                            pass
-                        # Don’t queue deeper past pdata
-                        continue
-
-                    # Otherwise, queue this child for a shallow look
-                    q.append((entry.path, depth + 1))
-
-        except PermissionError:
-            # Skip unreadable branches silently
-            continue
-
-    return False, "Could not detect Bruker ascii/pdata layout under the selected folder."
-
-def scan_bruker_structure(selected_dir):
-    """
-    Validate a Bruker directory tree where the user selects the folder that
-    directly contains sample folders.  Expected relative layout is:
-
-        selected_dir/
-            └── <sample_name>/          (any string)
-                └── <expt#>/            (numeric)
-                    └── pdata/
-                        └── <proc#>/    (numeric)
-                            └── ascii-spec.txt
-
-    On success returns (ascii_paths, True, set()).
-    On mismatch returns (partial_paths, False, {"reason", ...}).
-    """
-    ascii_paths     = []
-    structure_ok    = False
-    bad_reasons     = set()
-    expected_depth  = 4          # <sample> / <expt#> / pdata / <proc#>
-
-    for root, dirs, files in os.walk(selected_dir):
-        rel_parts = Path(root).relative_to(selected_dir).parts
-
-        # We never need to look deeper than the proc folder
-        if len(rel_parts) > expected_depth:
-            dirs.clear()
-            continue
-
-        if "ascii-spec.txt" in files:
-            depth = len(rel_parts)
-
-            # Flag selections that are too high / low
-            if depth != expected_depth:
-                if depth > expected_depth:
-                    bad_reasons.add(
-                        f"Directory too HIGH – ascii-spec.txt is {depth - expected_depth} "
-                        f"level(s) deeper (e.g., {root})"
-                    )
-                else:
-                    bad_reasons.add(
-                        f"Directory too LOW – you chose inside a sample/experiment folder (e.g., {root})"
-                    )
-                continue
-
-            # depth == expected_depth → detailed sanity checks
-            sample, expt, pdata_dir, proc = rel_parts
-
-            if not expt.isdigit():
-                bad_reasons.add(f"Experiment folder '{expt}' is not numeric");   continue
-            if pdata_dir != "pdata":
-                bad_reasons.add(f"Expected 'pdata', found '{pdata_dir}' in {root}");   continue
-            if not proc.isdigit():
-                bad_reasons.add(f"Proc folder '{proc}' is not numeric");   continue
-
-            ascii_paths.append(os.path.join(root, "ascii-spec.txt"))
-            structure_ok = True        # at least one valid dataset found
-
-        # Optional early test: stop descending into non-numeric experiment dirs
-        if len(rel_parts) == 2 and not rel_parts[1].isdigit():
-            dirs.clear()
-
-    return ascii_paths, structure_ok, bad_reasons
-
 def add_dirs(tree):
     """Directory selection + validation + loading based on import_mode."""
     global existing_data
@@ -1361,7 +1847,7 @@ def add_dirs(tree):
         pass
 
     # --- QUICK VALIDATION: abort early for 'too high' / 'too low' cases ---
-    ok, reason = _quick_validate_bruker_top(selected_dir)
+    ok, reason = quick_validate_bruker_top(selected_dir)
     if not ok:
         set_status("❌ Import aborted - folder level appears incorrect.")
         return
@@ -1396,7 +1882,8 @@ def add_dirs(tree):
                 for _, label_map in samples.items():
                     ascii_paths.extend(label_map.values())
 
-            _save_dir_cache(selected_dir, ascii_paths)
+            save_scan_cache(CACHE_FILE_ASCII, selected_dir, ascii_paths, "ascii")
+            index_datasets(tree, ascii_paths)
             dt = time.perf_counter() - t0
             set_status(f"✅ Loaded {n} ascii-spec.txt dataset{'s' if n != 1 else ''} in {dt:.1f}s")
 
@@ -1424,7 +1911,8 @@ def add_dirs(tree):
                 for _, label_map in samples.items():
                     pdata_dirs.extend(label_map.values())
 
-            _save_dir_cache_pdata(selected_dir, pdata_dirs)
+            save_scan_cache(CACHE_FILE_PDATA, selected_dir, pdata_dirs, "pdata")
+            index_datasets(tree, pdata_dirs)
             dt = time.perf_counter() - t0
             set_status(f"✅ Loaded {n} Bruker pdata dataset{'s' if n != 1 else ''} in {dt:.1f}s")
 
@@ -1436,52 +1924,16 @@ def add_dirs(tree):
     ).start()
 
 def load_cached_dir_tree(tree):
-    blocks = _load_dir_cache()
+    blocks = read_scan_cache(CACHE_FILE_ASCII)
     if not blocks:
         set_status("No cached scan found.")
         return
 
     tree.delete(*tree.get_children())
-    tree_dict: dict[str, dict[str, dict[str,str]]] = {}
-    skipped_lines = False  # track if we hit malformed entries
-
-    for top_dir, ascii_files in blocks:
-        samples: dict[str, dict[str, str]] = defaultdict(dict)
-
-        for f in ascii_files:
-            try:
-                parts = Path(f).relative_to(top_dir).parts
-            except Exception:
-                skipped_lines = True
-                continue
-
-            if len(parts) < 5 or parts[-1].lower() != "ascii-spec.txt" or parts[-3].lower() != "pdata":
-                skipped_lines = True
-                continue
-            if not (parts[-4].isdigit() and parts[-2].isdigit()):
-                skipped_lines = True
-                continue
-
-            sample = parts[0]
-            expt   = parts[-4]
-            proc   = parts[-2]
-            label = f"Expt {expt}, proc {proc}"
-            samples[sample][label] = f
-
-        for samp, sub in samples.items():
-            samples[samp] = dict(sorted(
-                sub.items(),
-                key=lambda kv: (int(kv[0].split()[1].rstrip(',')),
-                                int(kv[0].split()[3]))
-            ))
-        parts_top = Path(top_dir).parts
-        if len(parts_top) >= 2:
-            label_top = f"{parts_top[-2]}/{parts_top[-1]}"
-        else:
-            label_top = parts_top[-1]  # fallback if somehow only one part
-        tree_dict[label_top] = samples
+    tree_dict, skipped_lines = cached_tree(blocks, "ascii")
 
     populate_treeview(tree, tree_dict, type_hint="ascii")
+    index_datasets(tree, _tree_leaves(tree))
     global existing_data
     existing_data.clear()
     existing_data.update(tree_dict)
@@ -1492,53 +1944,16 @@ def load_cached_dir_tree(tree):
     set_status(msg)
 
 def load_cached_dir_tree_pdata(tree):
-    blocks = _load_dir_cache_pdata()
+    blocks = read_scan_cache(CACHE_FILE_PDATA)
     if not blocks:
         set_status("No cached pdata scan found.")
         return
 
     tree.delete(*tree.get_children())
-    tree_dict: dict[str, dict[str, dict[str, str]]] = {}
-    skipped_lines = False  # track if we hit malformed entries
-
-    for top_dir, pdata_dirs in blocks:
-        samples: dict[str, dict[str, str]] = defaultdict(dict)
-
-        for d in pdata_dirs:
-            try:
-                parts = Path(d).relative_to(top_dir).parts
-            except Exception:
-                skipped_lines = True
-                continue
-
-            # Expect: <sample>/<expt>/pdata/<proc>
-            if len(parts) < 4 or parts[-2].lower() != "pdata":
-                skipped_lines = True
-                continue
-            if not (parts[-3].isdigit() and parts[-1].isdigit()):
-                skipped_lines = True
-                continue
-
-            sample = parts[0]
-            expt   = parts[-3]
-            proc   = parts[-1]
-            label = f"Expt {expt}, proc {proc}"
-            samples[sample][label] = d
-
-        for samp, sub in samples.items():
-            samples[samp] = dict(sorted(
-                sub.items(),
-                key=lambda kv: (int(kv[0].split()[1].rstrip(',')),
-                                int(kv[0].split()[3]))
-            ))
-        parts_top = Path(top_dir).parts
-        if len(parts_top) >= 2:
-            label_top = f"{parts_top[-2]}/{parts_top[-1]}"
-        else:
-            label_top = parts_top[-1]  # fallback if somehow only one part
-        tree_dict[label_top] = samples
+    tree_dict, skipped_lines = cached_tree(blocks, "pdata")
 
     populate_treeview(tree, tree_dict, type_hint="pdata")
+    index_datasets(tree, _tree_leaves(tree))
     global existing_data
     existing_data = tree_dict
 
@@ -1547,132 +1962,6 @@ def load_cached_dir_tree_pdata(tree):
         msg += " — Some cache entries were invalid. You may need to clear the cache."
     set_status(msg)
 
-def _is_valid_ascii_layout(top_dir: str, f: str) -> bool:
-    try:
-        parts = Path(f).relative_to(top_dir).parts
-    except Exception:
-        return False
-    return (
-        len(parts) >= 5
-        and parts[-1].lower() == "ascii-spec.txt"
-        and parts[-3].lower() == "pdata"
-        and parts[-4].isdigit()
-        and parts[-2].isdigit()
-    )
-
-def _is_valid_pdata_layout(top_dir: str, d: str) -> bool:
-    try:
-        parts = Path(d).relative_to(top_dir).parts
-    except Exception:
-        return False
-    return (
-        len(parts) >= 4
-        and parts[-2].lower() == "pdata"
-        and parts[-3].isdigit()
-        and parts[-1].isdigit()
-    )
-
-
-def traverse_directory_ascii(root_dir: str) -> dict:
-    """
-    {basename(root_dir): {sample: {"Expt N, proc M": <ascii-path>}}}
-    Only include .../pdata/<proc>/ascii-spec.txt files.
-    """
-    top_label = os.path.basename(root_dir)
-    samples: dict[str, dict[str, str]] = defaultdict(dict)
-
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
-        filenames = [f for f in filenames if not f.startswith('.')]
-
-        if "ascii-spec.txt" in filenames:
-            ascii_path = os.path.join(dirpath, "ascii-spec.txt")
-            # sample = folder immediately under root_dir
-            rel = Path(dirpath).relative_to(root_dir)
-            sample = rel.parts[0] if rel.parts else os.path.basename(root_dir)
-            label = _label_for(ascii_path)
-            samples[sample][label] = ascii_path
-
-    # numeric-ish sort
-    def _k(lbl: str):
-        try:
-            parts = lbl.split()
-            return (int(parts[1].rstrip(',')), int(parts[3]))
-        except Exception:
-            return (10**9, 10**9)
-
-    for samp in list(samples.keys()):
-        samples[samp] = dict(sorted(samples[samp].items(), key=lambda kv: _k(kv[0])))
-
-    return {top_label: dict(samples)}
-
-
-def traverse_directory_pdata(root_dir: str) -> dict:
-    """
-    {basename(root_dir): {sample: {"Expt N, proc M": <pdata-dir>}}}
-    Only include pdata/<proc> dirs with procs + 1r (ignore 2rr).
-    """
-    top_label = os.path.basename(root_dir)
-    samples: dict[str, dict[str, str]] = defaultdict(dict)
-
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
-        filenames = [f for f in filenames if not f.startswith('.')]
-
-        if _is_valid_pdata_dir(dirpath):
-            rel = Path(dirpath).relative_to(root_dir)
-            sample = rel.parts[0] if rel.parts else os.path.basename(root_dir)
-            label = _label_for(dirpath)
-            samples[sample][label] = dirpath
-
-    def _k(lbl: str):
-        try:
-            parts = lbl.split()
-            return (int(parts[1].rstrip(',')), int(parts[3]))
-        except Exception:
-            return (10**9, 10**9)
-
-    for samp in list(samples.keys()):
-        samples[samp] = dict(sorted(samples[samp].items(), key=lambda kv: _k(kv[0])))
-
-    return {top_label: dict(samples)}
-
-def extract_experiment_number(dir_path):
-    """Return the Bruker experiment number folder
-
-    Falls back to None if the path is too shallow instead of raising IndexError.
-    """
-    parts = dir_path.split(os.sep)
-    return parts[-3] if len(parts) >= 3 else None
-
-
-def extract_proc_number(dir_path):
-    """Extract the proc number from a directory path."""
-    parts = dir_path.split(os.sep)
-    return parts[-1]
-
-def _guess_leaf_type(path_str: str) -> str:
-    """Return 'ascii', 'pdata', or 'unknown' using only string/path parts."""
-    if not isinstance(path_str, str):
-        return "unknown"
-    low = path_str.lower()
-    if low.endswith("ascii-spec.txt"):
-        return "ascii"
-    # Heuristic: any path with .../pdata/<proc#> is pdata
-    try:
-        parts = [p.lower() for p in Path(path_str).parts]
-        if "pdata" in parts:
-            # last part is usually the proc number
-            last = Path(path_str).name
-            if last.isdigit():
-                return "pdata"
-            # allow pdata/<proc>/ wherever proc is numeric
-            # if not numeric, still probably pdata but mark unknown to be safe
-            return "unknown"
-    except Exception:
-        pass
-    return "unknown"
-
 def populate_treeview(tree, data, type_hint: str | None = None):
     """Populate a Treeview with {top: {sample: {label: path}}}.
        Adds (ascii)/(pdata) on top-level labels when mixed.
@@ -1694,7 +1983,7 @@ def populate_treeview(tree, data, type_hint: str | None = None):
                 elif type_hint == "pdata":
                     has_p = True
                 else:
-                    t = _guess_leaf_type(val)
+                    t = guess_leaf_type(val)
                     if t == "ascii": has_a = True
                     elif t == "pdata": has_p = True
 
@@ -1721,6 +2010,122 @@ def populate_treeview(tree, data, type_hint: str | None = None):
     tree.delete(*tree.get_children(""))
     insert_items("", data)
 
+
+# ---------------------------------------------------------------------------
+#  Dataset statistics: SNR in the Data Import tree, workspace sorting
+# ---------------------------------------------------------------------------
+# STATS_INDEX keeps each dataset's maximum, noise, SNR and total integral, keyed
+# by its data file's mtime and saved in stats_index.txt. Every spectrum read for
+# a plot or a prefetch updates it. After a scan, a background pass reads the
+# datasets the index lacks (preference "index_stats_on_scan"), one at a time and
+# outside SPECTRUM_CACHE, so the tree can show SNR without loading anything.
+_index_cancel = None            # threading.Event of the pass in flight
+INDEX_REFRESH_S = 0.5           # the pass updates the tree at most this often
+WORKSPACE_SORTS = (("By SNR, highest first", "snr"), ("By maximum, highest first", "max"),
+                   ("By total integral, largest first", "integral"), ("By name", "name"))
+
+def _tree_leaves(tree, parent=""):
+    """{dataset path: item} of the leaves under *parent*."""
+    leaves = {}
+    for item in tree.get_children(parent):
+        if tree.get_children(item):
+            leaves.update(_tree_leaves(tree, item))
+        else:
+            values = tree.item(item)["values"]
+            if values:
+                leaves[str(values[0])] = item
+    return leaves
+
+def _format_snr(stats):
+    if stats is None:
+        return ""
+    return "SNR ∞" if stats.noise <= 0 else f"SNR {stats.snr:,.0f}"
+
+def show_dataset_stats(tree, paths=None):
+    """Fill the SNR column of the Data Import tree from STATS_INDEX (Tk thread; no disk access)."""
+    if STATS_INDEX is None or not tree.winfo_exists():
+        return
+    for path, item in _tree_leaves(tree).items():
+        if paths is None or path in paths:
+            tree.set(item, "snr", _format_snr(STATS_INDEX.get(path, check=False)))
+
+def index_datasets(tree, paths):
+    """Show the indexed statistics of the tree, then compute those of *paths* it lacks (background)."""
+    global _index_cancel
+    if _index_cancel is not None:
+        _index_cancel.set()
+    _index_cancel = cancel = threading.Event()
+    try:
+        x_unit = _plot_settings(state).load_unit
+    except ValueError:
+        x_unit = "ppm"
+    compute = app.preferences.get("index_stats_on_scan", "1") == "1"
+    threading.Thread(target=_index_worker, args=(tree, list(paths), x_unit, compute, cancel),
+                     daemon=True).start()
+
+def _index_worker(tree, paths, x_unit, compute, cancel):
+    load_plotting_modules()
+    app.after(0, lambda: show_dataset_stats(tree))
+    if not compute:
+        return
+    missing = STATS_INDEX.missing(paths, x_unit)     # the integral depends on the unit
+    done, last = set(), time.perf_counter()
+    for path in missing:
+        if cancel.is_set():
+            break
+        try:
+            STATS_INDEX.record(path, x_unit, *load_spectrum(path, x_unit))
+        except (OSError, ValueError, ImportError):
+            continue            # the plot reports unreadable datasets when they are used
+        done.add(path)
+        if time.perf_counter() - last > INDEX_REFRESH_S:
+            app.after(0, lambda batch=done: show_dataset_stats(tree, batch))
+            done, last = set(), time.perf_counter()
+    if not missing:
+        return
+    app.after(0, lambda: show_dataset_stats(tree, done))
+    try:
+        STATS_INDEX.save()
+    except OSError as e:
+        msg = f"⚠️ Could not save the statistics index: {e}"
+        app.after(0, lambda: set_status(msg, 6000))
+
+def sort_workspace(tree, key):
+    """Reorder the workspace by an indexed statistic (largest first) or by name; no data is read."""
+    items = list(tree.get_children())
+    unknown = []
+    if key == "name":
+        ordered = sorted(items, key=lambda item: tree.item(item, "text").lower())
+    else:
+        if STATS_INDEX is None:
+            set_status("Dataset statistics are not loaded yet.", 4000)
+            return
+        # integrals are only comparable in one x unit: the plot's; the other statistics in any
+        x_unit = None
+        if key == "integral":
+            try:
+                x_unit = _plot_settings(state).load_unit
+            except ValueError:
+                x_unit = "ppm"
+        stats = {item: STATS_INDEX.get(str(tree.item(item)["values"][0]), x_unit, check=False)
+                 for item in items}
+        unknown = [item for item in items if stats[item] is None]
+        ordered = sorted((item for item in items if stats[item] is not None),
+                         key=lambda item: getattr(stats[item], key), reverse=True) + unknown
+    for index, item in enumerate(ordered):
+        tree.move(item, "", index)
+    if unknown:
+        set_status(f"{len(unknown)} entr{'ies' if len(unknown) > 1 else 'y'} without statistics"
+                   + (f" in {x_unit}" if x_unit else "") + " (derived, or not read yet) placed last", 5000)
+
+# Adding to the workspace: the Tk thread only checks names; a worker checks the
+# files (stat calls can be slow on network shares), the valid datasets are added
+# on the Tk thread, and they are read into SPECTRUM_CACHE in the background so
+# Plot finds them in memory.
+PREFETCH_WORKSPACE = 0          # Prefetcher priority of workspace datasets
+PREFETCH_NEIGHBOURS = 1         # ... of the Data Import selection and the experiments next to it
+NEIGHBOUR_RADIUS = 2            # experiments read ahead on each side of the selection
+
 def add_to_workspace(data_tree, workspace_tree):
     selected_items = data_tree.selection()
     if not selected_items:
@@ -1728,7 +2133,7 @@ def add_to_workspace(data_tree, workspace_tree):
         return
 
     import_mode = app.preferences.get("import_mode", "ascii")
-    added = 0
+    candidates = []
 
     for s in selected_items:
         # still forbid folders (only leaves)
@@ -1738,39 +2143,159 @@ def add_to_workspace(data_tree, workspace_tree):
 
         full_path = data_tree.item(s)['values'][0]
 
-        if import_mode == "ascii":
-            # must be .../ascii-spec.txt
-            if not full_path.endswith("ascii-spec.txt"):
-                set_status(f"⚠️  '{data_tree.item(s)['text']}' is not a valid dataset.", 5000)
-                continue
+        # must be .../ascii-spec.txt
+        if import_mode == "ascii" and not full_path.endswith("ascii-spec.txt"):
+            set_status(f"⚠️  '{data_tree.item(s)['text']}' is not a valid dataset.", 5000)
+            continue
+        candidates.append((data_tree.item(s)['text'], full_path))
 
+    if not candidates:
+        return
+    try:
+        x_unit = _plot_settings(state).load_unit
+    except ValueError:
+        x_unit = "ppm"
+    set_status(f"Checking {len(candidates)} dataset{'s' if len(candidates) > 1 else ''}…")
+    threading.Thread(target=_validate_for_workspace,
+                     args=(candidates, import_mode, x_unit, workspace_tree), daemon=True).start()
+
+def _validate_for_workspace(candidates, import_mode, x_unit, workspace_tree):
+    """Worker thread: check the candidates on disk, add the valid ones, then prefetch them."""
+    valid, invalid = [], []
+    for text, full_path in candidates:
+        if import_mode == "ascii":
+            ok = os.path.isfile(full_path)
+        else:
+            # must be a pdata/<proc> dir with procs + 1r
+            ok = is_valid_pdata_dir(full_path)
+        (valid if ok else invalid).append((text, full_path))
+    app.after(0, lambda: _add_validated(valid, invalid, import_mode, workspace_tree))
+    if valid:
+        load_plotting_modules()
+        PREFETCHER.submit([path for _, path in valid], x_unit, PREFETCH_WORKSPACE)
+
+def _add_validated(valid, invalid, import_mode, workspace_tree):
+    for text, full_path in valid:
+        if import_mode == "ascii":
             proc_folder   = extract_proc_number(os.path.dirname(full_path))
             expt_folder   = extract_experiment_number(os.path.dirname(full_path))
             sample_folder = os.path.basename(
                 os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(full_path))))
             )
-            display_name = f"{sample_folder} / expt {expt_folder} / proc {proc_folder}"
-
         else:  # pdata mode
-            # must be a pdata/<proc> dir with procs + 1r
-            if not _is_valid_pdata_dir(full_path):
-                set_status(f"⚠️  '{data_tree.item(s)['text']}' is not a valid pdata dataset (need procs + 1r).", 5000)
-                continue
-
-            expt_folder, proc_folder = _parse_expt_proc_from_any(full_path)
+            expt_folder, proc_folder = parse_expt_proc(full_path)
             sample_folder = os.path.basename(
                 os.path.dirname(os.path.dirname(os.path.dirname(full_path)))
             )
-            display_name = f"{sample_folder} / expt {expt_folder} / proc {proc_folder}"
-
+        display_name = f"{sample_folder} / expt {expt_folder} / proc {proc_folder}"
         workspace_tree.insert("", "end", text=display_name, values=(full_path,))
-        added += 1
 
+    added = len(valid)
     if added and 'plot_data_btn' in state:
         state['plot_data_btn'].config(state='normal')
 
-    if added:
-        set_status(f"✅  Added {added} dataset{'s' if added > 1 else ''} to workspace", 4000)
+    if invalid:
+        need = " (need procs + 1r)" if import_mode == "pdata" else ""
+        set_status(f"⚠️  '{invalid[-1][0]}' is not a valid {'pdata ' if need else ''}dataset{need}."
+                   + (f" (+{len(invalid) - 1} more)" if len(invalid) > 1 else ""), 5000)
+    elif added:
+        set_status(f"✅  Added {added} dataset{'s' if added > 1 else ''} to workspace; reading in the background", 4000)
+
+def _prefetch_done(path, x_unit, error):
+    """Prefetch worker: refresh the memory line and the tree's SNR once the queued reads are done."""
+    if PREFETCHER.pending() == 0:
+        app.after(0, _enforce_memory_budget)
+        if 'data_tree' in state:
+            app.after(0, lambda: show_dataset_stats(state['data_tree']))
+
+def _on_data_tree_select(event):
+    """Read the selected dataset and its neighbours in the same sample ahead, at low priority."""
+    tree = event.widget
+    if PREFETCHER is None:
+        return                  # plotting modules still importing; nothing to read with yet
+    leaves = [item for item in tree.selection() if not tree.get_children(item)]
+    if not leaves:
+        return
+    item = leaves[-1]
+    siblings = tree.get_children(tree.parent(item))
+    i = siblings.index(item)
+    # nearest first: the selection, then i+1, i-1, i+2, i-2, ...
+    order = [item] + [siblings[j] for d in range(1, NEIGHBOUR_RADIUS + 1)
+                      for j in (i + d, i - d) if 0 <= j < len(siblings)]
+    try:
+        x_unit = _plot_settings(state).load_unit
+    except ValueError:
+        x_unit = "ppm"
+    PREFETCHER.cancel(priority=PREFETCH_NEIGHBOURS)       # the old neighbourhood
+    PREFETCHER.submit([tree.item(k)['values'][0] for k in order], x_unit, PREFETCH_NEIGHBOURS)
+
+# ---------------------------------------------------------------------------
+#  Preview of the Data Import selection
+# ---------------------------------------------------------------------------
+# TopSpin's thumb.png when there is one, otherwise a min/max sparkline of the
+# spectrum (PREVIEW_CACHE). One worker thread always takes the newest request,
+# so requests overtaken by the moving selection are never started, and a
+# result that is no longer current is not shown.
+PREVIEW_W, PREVIEW_H = 240, 120         # thumb.png is 160×120
+_preview_cond = threading.Condition()
+_preview_request = None                 # (generation, path) waiting for the worker
+_preview_generation = 0
+_preview_thread = None
+
+def _request_preview(event):
+    global _preview_request, _preview_generation, _preview_thread
+    tree = event.widget
+    leaves = [item for item in tree.selection() if not tree.get_children(item)]
+    if not leaves or 'preview_label' not in state:
+        return
+    path = tree.item(leaves[-1])['values'][0]
+    with _preview_cond:
+        _preview_generation += 1
+        _preview_request = (_preview_generation, path)
+        _preview_cond.notify()
+    if _preview_thread is None:
+        _preview_thread = threading.Thread(target=_preview_worker, daemon=True)
+        _preview_thread.start()
+
+def _preview_worker():
+    global _preview_request
+    while True:
+        with _preview_cond:
+            while _preview_request is None:
+                _preview_cond.wait()
+            generation, path = _preview_request
+            _preview_request = None
+        try:
+            load_plotting_modules()
+            thumb = find_thumb(path)
+            if thumb:
+                with open(thumb, "rb") as fh:
+                    preview = ("png", base64.b64encode(fh.read()), "thumb.png")
+            else:
+                lo, hi = PREVIEW_CACHE.envelope(
+                    path, PREVIEW_W,
+                    load=lambda p: SPECTRUM_CACHE.get_or_load(p, "ppm", load_spectrum))
+                if generation != _preview_generation:
+                    continue            # the selection moved on while reading
+                preview = ("ppm", sparkline_ppm(lo, hi, PREVIEW_H), "min/max of the data")
+        except Exception as e:
+            preview = (None, None, f"no preview: {e}")
+        if generation == _preview_generation:
+            app.after(0, lambda g=generation, p=path, pv=preview: _show_preview(g, p, pv))
+
+def _show_preview(generation, path, preview):
+    if generation != _preview_generation:
+        return
+    fmt, data, source = preview
+    label = state['preview_label']
+    image = tk.PhotoImage(data=data, format=fmt) if fmt else ""
+    label.config(image=image, text=f"  {sample_name(path)}\n  {label_for(path)}\n  ({source})")
+    label.image = image                 # keep a reference, or Tk drops the picture
+
+def _cancel_prefetch(paths=None):
+    """Stop reading ahead *paths* (all workspace datasets if None)."""
+    if PREFETCHER is not None:
+        PREFETCHER.cancel(paths, priority=PREFETCH_WORKSPACE)
 
 def remove_dir(data_tree):
     """Remove the selected top-level directory from the data import treeview."""
@@ -1791,11 +2316,37 @@ def clear_dirs(data_tree):
         data_tree.delete(item)
 
 
+def add_derived_trace(tree, op):
+    """Add *op* of the selected workspace entries as a new entry (A, B = top to bottom).
+
+    The trace is computed when it is plotted, and again only when an input changes.
+    """
+    selected = sorted(tree.selection(), key=tree.index)
+    paths = [tree.item(item)["values"][0] for item in selected]
+    factor = 1.0
+    if op == "scaled difference" and len(paths) == 2:
+        factor = simpledialog.askfloat("Scaled difference", "A − k × B\n\nk =", initialvalue=1.0, parent=tree)
+        if factor is None:
+            return
+    load_plotting_modules()
+    try:
+        path = derived_path(op, paths, factor)
+    except ValueError as e:
+        set_status(f"⚠️  {e} Select them in the workspace first.", 5000)
+        return
+    tree.insert("", "end", text=derived_label(path), values=(path,))
+    if 'plot_data_btn' in state:
+        state['plot_data_btn'].config(state='normal')
+    set_status(f"Added {derived_label(path)}", 4000)
+
 def remove_from_workspace(tree):
     """Remove the selected items from the workspace tree."""
     selected_items = tree.selection()
+    removed = {tree.item(item)["values"][0] for item in selected_items}
     for item in selected_items:
         tree.delete(item)
+    # the same dataset may be in the workspace more than once
+    _cancel_prefetch(removed - {tree.item(child)["values"][0] for child in tree.get_children()})
     # Disable Plot button if workspace is now empty
     if not tree.get_children():
         if 'plot_data_btn' in state:
@@ -1806,6 +2357,7 @@ def clear_workspace(tree):
     """Remove all items from the workspace tree."""
     for item in tree.get_children():
         tree.delete(item)
+    _cancel_prefetch()
     if 'plot_data_btn' in state:
         state['plot_data_btn'].config(state='disabled')
 
@@ -1837,213 +2389,276 @@ def move_down(tree):
             tree.move(item, parent, index + 1)
 
 
+# ---------------------------------------------------------------------------
+#  Memory budget
+# ---------------------------------------------------------------------------
+# Loaded spectra are kept in SPECTRUM_CACHE (raw, per file) so plotting again
+# with other settings skips the disk. The budget covers the plotted traces, the
+# live figure, traces copied into queued exports and the cache; the cache gets
+# what the others leave. A plot whose traces alone would take more than
+# LIVE_SHARE of the budget is drawn min/max-decimated, and exports of it read
+# the files again at full resolution. Series resampled onto a common grid
+# (RESAMPLE_CACHE, heatmap and waterfall) may take RESAMPLED_SHARE, and cumulative
+# integrals (INTEGRAL_CACHE) INTEGRALS_SHARE.
+LIVE_SHARE = 0.5
+RESAMPLED_SHARE = 0.125
+INTEGRALS_SHARE = 0.0625
+DECIMATED_MIN_POINTS = 4096
+
+def _memory_budget():
+    return int((safe_float(app.preferences.get("memory_budget_mb"), 1024) or 1024) * 2**20)
+
+def _decimation_points(lines):
+    """Points per trace that keep the plot within its share of the budget, or None if it fits."""
+    # the live figure holds about another copy of the traces in its vertex arrays
+    allowed = _memory_budget() * LIVE_SHARE
+    if not lines or 2 * lines_nbytes(lines) <= allowed:
+        return None
+    per_trace = int(allowed / (2 * 16 * len(lines)))        # x + y float64 per point, twice
+    return max(DECIMATED_MIN_POINTS, per_trace)
+
+def _memory_usage():
+    return {
+        'data': lines_nbytes(state.get('lines')),
+        'figure': figure_nbytes(state.get('current_figure')),
+        'exports': EXPORT_QUEUE.snapshot_nbytes(),
+        'cache': SPECTRUM_CACHE.nbytes,
+        'resampled': RESAMPLE_CACHE.nbytes,
+        'integrals': INTEGRAL_CACHE.nbytes,
+    }
+
+def _enforce_memory_budget():
+    """Shrink the spectrum cache to what the budget leaves, then update the status bar (Tk thread)."""
+    if SPECTRUM_CACHE is None:
+        return
+    usage = _memory_usage()
+    RESAMPLE_CACHE.max_bytes = int(_memory_budget() * RESAMPLED_SHARE)
+    usage['resampled'] -= RESAMPLE_CACHE.evict_to(RESAMPLE_CACHE.max_bytes)
+    INTEGRAL_CACHE.max_bytes = int(_memory_budget() * INTEGRALS_SHARE)
+    usage['integrals'] -= INTEGRAL_CACHE.evict_to(INTEGRAL_CACHE.max_bytes)
+    SPECTRUM_CACHE.max_bytes = max(0, _memory_budget() - usage['data'] - usage['figure']
+                                   - usage['exports'] - usage['resampled'] - usage['integrals'])
+    usage['cache'] -= SPECTRUM_CACHE.evict_to(SPECTRUM_CACHE.max_bytes)
+    _show_memory_usage(usage)
+
+def _show_memory_usage(usage):
+    var = state.get('memory_var')
+    if var is None:
+        return
+    text = (f"Memory {_format_bytes(sum(usage.values()))} of {_format_bytes(_memory_budget())}: "
+            f"plot {_format_bytes(usage['data'])}, figure {_format_bytes(usage['figure'])}, "
+            f"cache {_format_bytes(usage['cache'])} ({len(SPECTRUM_CACHE)} spectra)")
+    if usage['exports']:
+        text += f", exports {_format_bytes(usage['exports'])}"
+    if usage['resampled']:
+        text += f", resampled {_format_bytes(usage['resampled'])}"
+    if usage['integrals']:
+        text += f", integrals {_format_bytes(usage['integrals'])}"
+    if SPECTRUM_CACHE.prefetched:
+        text += (f", read-ahead hits {SPECTRUM_CACHE.prefetch_hit_rate:.0%}"
+                 f" ({SPECTRUM_CACHE.prefetch_hits}/{SPECTRUM_CACHE.prefetched})")
+    if state.get('decimated'):
+        text += " · decimated view, exports use full resolution"
+    var.set(text)
+
+
+# Plot requests: the Tk callback snapshots the inputs, a worker thread loads and
+# transforms, and only the figure update comes back to the Tk thread. Every request
+# gets a new generation number; starting one cancels the one in flight, and a
+# result whose generation is no longer current is dropped.
+_plot_generations = itertools.count(1)
+_plot_cancel = None             # threading.Event of the request in flight
+
 def plot_graph(state):
-    """Plot the data based on the current state.
+    """Plot the workspace with the current settings, loading on a worker thread.
 
     Behavior:
-      - If resizable_mode_var is False (fixed mode), extract the W/H/DPI from the UI
-        and set state['desired_fig_spec'] (in inches + dpi). customize_graph() will
+      - If resizable_mode_var is False (fixed mode), the W/H/DPI from the UI become
+        state['desired_fig_spec'] (in inches + dpi). customize_graph() will
         create the figure using that physical size and the live view will be scaled
         down to fit the canvas if needed.
       - If resizable_mode_var is True, clear any desired_fig_spec so the live figure
         will be allowed to adapt / be resized.
+      - Plotting again while a plot is loading cancels the older request.
     """
+    global _plot_cancel
     set_tpl_status("")          # clear template messages
-    gather_data(state)
-    transform_data(state)
-
-    # Read UI-provided desired figure size
-    unit = (state.get('fig_size_unit') and state['fig_size_unit'].get()) or "mm"
-    try:
-        w_ui = float(state['fig_w_var'].get())
-    except Exception:
-        w_ui = None
     try:
-        h_ui = float(state['fig_h_var'].get())
-    except Exception:
-        h_ui = None
-    try:
-        dpi = int(safe_float(state.get('fig_dpi_var', tk.StringVar(value="100")).get(), 100))
-    except Exception:
-        dpi = 100
+        # one immutable snapshot of the widgets drives loading, transforms and drawing
+        settings = _plot_settings(state)
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        return
 
-    resizable = bool(state.get('resizable_mode_var') and state['resizable_mode_var'].get())
+    if _plot_cancel is not None:
+        _plot_cancel.set()
+    _plot_cancel = cancel = threading.Event()
+    generation = state['plot_generation'] = next(_plot_generations)
+
+    request = {
+        'generation': generation,
+        'settings': settings,
+        'file_paths': [
+            state['workspace_tree'].item(child)["values"][0]
+            for child in reversed(state['workspace_tree'].get_children())
+        ],
+        # --- X-range cropping: honor "couple x-limits to mask" preference ---
+        'coupled': app.preferences.get("couple_x_limits", "1") == "1",
+        # intensity normalization unless disabled in preferences
+        'normalize': app.preferences.get("disable_int_norm", "0") != "1",
+        'resizable': bool(state.get('resizable_mode_var') and state['resizable_mode_var'].get()),
+        'peak_params': _peak_params() if state.get('show_peaks_var') and state['show_peaks_var'].get() else None,
+        'integral_prefs': {key: app.preferences.get(key, "") for key in INTEGRAL_PREFS},
+        'started': time.perf_counter(),
+        'started_ns': time.perf_counter_ns(),
+    }
+    _set_plot_busy(True)
+    threading.Thread(target=_plot_worker, args=(request, cancel), daemon=True).start()
 
-    if not resizable and w_ui and h_ui:
-        # convert to inches
-        if unit == "mm":
-            w_in, h_in = w_ui / 25.4, h_ui / 25.4
-        elif unit == "px":
-            # pixels -> inches via dpi
-            w_in, h_in = w_ui / dpi, h_ui / dpi
-        else:  # inches
-            w_in, h_in = w_ui, h_ui
-        state['desired_fig_spec'] = (w_in, h_in, dpi)
+def _set_plot_busy(busy):
+    btn = state.get('plot_data_btn')
+    if btn is not None:
+        btn.config(text="Plotting…" if busy else "Plot Spectrum", cursor="watch" if busy else "")
+
+def _plot_worker(request, cancel):
+    """Worker thread: load and transform the request's traces, hand them to _finish_plot."""
+    try:
+        load_plotting_modules()     # normally already imported in the background
+        settings = request['settings']
+        # --- loader is decided by path, not by preferences ---
+        request['missing_nmrglue'] = not HAS_NMRGLUE and any(
+            is_valid_pdata_dir(p) for p in request['file_paths'])
+        # Skipped datasets are reported, the others still get plotted
+        sources = request['sources'] = []
+        lines, request['problems'] = load_traces(
+            request['file_paths'], settings.load_unit, *settings.x_range(request['coupled']),
+            cancelled=cancel.is_set, cache=SPECTRUM_CACHE, sources=sources)
+        if cancel.is_set():
+            return
+        if request['peak_params'] is not None:
+            # picked before normalising/offsetting, so the results are cached per dataset
+            request['peaks'] = [
+                {**PEAK_CACHE.pick(path, settings.load_unit, settings.x_range(request['coupled']),
+                                   x, y, request['peak_params']), 'x0': x[0]}
+                for path, (x, y) in zip(sources, lines)]
+        request['integrals'] = _integral_overlay(settings, request['integral_prefs'])
+        # indexed maxima spare a pass over each trace, if the mask kept all of it
+        norms = ([_indexed_norm(path, settings.load_unit, y) for path, (_, y) in zip(sources, lines)]
+                 if request['normalize'] else None)
+        transform_lines_for(lines, settings, normalize=request['normalize'], norms=norms)
+        max_points = _decimation_points(lines)
+        if max_points:
+            lines = decimate_lines(lines, max_points)
+            request['decimated'] = True
+        request['lines'] = lines
+        request['data_key'] = _traces_digest(lines)
+    except Exception as e:
+        request['error'] = e
+    if not cancel.is_set():
+        app.after(0, lambda: _finish_plot(request))
+
+def _finish_plot(request):
+    """Tk thread: show the worker's result unless a newer request has started."""
+    if request['generation'] != state.get('plot_generation'):
+        return                  # superseded; its successor owns the busy state
+    _set_plot_busy(False)
+    if 'error' in request:
+        set_status(f"❌ Plot failed: {request['error']}", 8000)
+        return
+    if request['missing_nmrglue']:
+        messagebox.showerror(
+            "Missing dependency",
+            "This dataset is Bruker pdata, but 'nmrglue' is not installed.\n\n"
+            "Install with:\n    pip install nmrglue"
+        )
+    problems = request['problems']
+    if problems:
+        set_status(f"⚠️ {problems[-1]}" + (f" (+{len(problems) - 1} more)" if len(problems) > 1 else ""), 6000)
+
+    settings = state['plot_settings'] = request['settings']
+    state['file_paths'] = request['file_paths']
+    state['lines'] = request['lines']
+    state['decimated'] = request.get('decimated', False)
+    state['data_key'] = request['data_key']
+    state['peaks'] = request.get('peaks')
+    state['integrals'] = request['integrals']
+    # what a decimated plot's export re-reads: only the datasets that were plotted
+    state['plot_source'] = {key: request[key] for key in ('sources', 'settings', 'coupled', 'normalize')}
+    resizable = request['resizable']
+
+    # Same settings and same traces as the figure on screen: nothing to redraw
+    figure_key = (settings.content_hash(), request['data_key'], resizable, _linecollection_threshold(),
+                  request['peak_params'], _peak_labels(), request['integrals'])
+    if state.get('current_figure') is not None and state.get('figure_key') == figure_key:
+        if state.get('toolbar') is not None:
+            state['toolbar'].home()         # still undo any zoom, as a redraw would
+        set_plot_status("Plot is up to date", 3000)
+        _enforce_memory_budget()
+        return
+    state['figure_key'] = None
+
+    if not resizable:
+        state['desired_fig_spec'] = settings.figure_size()
     else:
         # Resizable mode: do not force a desired_fig_spec
         if 'desired_fig_spec' in state:
             del state['desired_fig_spec']
 
     # Now create and display the figure according to mode/spec
-    customize_graph(state)
-
-def gather_data(state):
-    """Collect selected entries and load data irrespective of origin (ascii/pdata)."""
-    state['file_paths'] = [
-        state['workspace_tree'].item(child)["values"][0]
-        for child in reversed(state['workspace_tree'].get_children())
-    ]
-    state['lines'] = []
-
-    # Always plot in the unit currently selected in the UI (template sets this on startup)
-    x_unit = (state['x_axis_unit'].get() or "").strip() or "ppm"
-
-    for path in state['file_paths']:
-        try:
-            # --- decide loader by path, not by preferences ---
-            if _is_valid_pdata_dir(path):
-                # pdata/<proc> with procs + 1r
-                if not HAS_NMRGLUE:
-                    messagebox.showerror(
-                        "Missing dependency",
-                        "This dataset is Bruker pdata, but 'nmrglue' is not installed.\n\n"
-                        "Install with:\n    pip install nmrglue"
-                    )
-                    continue
-                x_data, y_data = _load_bruker_pdata(path, x_unit)
-
-            elif path.endswith("ascii-spec.txt"):
-                # ascii export
-                df = pd.read_csv(path, skiprows=1)
-                if x_unit == "ppm":
-                    x_col = 3
-                elif x_unit in ("Hz", "kHz"):
-                    x_col = 2
-                else:
-                    x_col = 3
-                x_data = df.iloc[:, x_col].to_numpy(dtype=float)
-                y_data = df.iloc[:, 1].to_numpy(dtype=float)
-                if x_unit == "kHz":
-                    x_data = x_data / 1000.0
-
-            else:
-                # Unknown: skip this item but keep plotting others
-                set_status(f"⚠️ Unrecognized dataset in workspace: {os.path.basename(path)}", 6000)
-                continue
-
-            # --- X-range cropping: honor "couple x-limits to mask" preference ---
-            coupled = app.preferences.get("couple_x_limits", "1") == "1"
-            if coupled:
-                xmin_str = state['x_min_entry'].get()
-                xmax_str = state['x_max_entry'].get()
-            else:
-                xmin_str = state['x_min_mask_entry'].get()
-                xmax_str = state['x_max_mask_entry'].get()
-
-            xmin = float(xmin_str) if xmin_str else float(np.nanmin(x_data))
-            xmax = float(xmax_str) if xmax_str else float(np.nanmax(x_data))
-            lo, hi = (xmin, xmax) if xmin <= xmax else (xmax, xmin)
-            mask = (x_data >= lo) & (x_data <= hi)
-
-            if not np.any(mask):
-                set_status(f"⚠️ No points in range [{xmin}, {xmax}] for {os.path.basename(path)}; check X limits.", 6000)
-                continue
-
-            x_data = x_data[mask]
-            y_data = y_data[mask]
-
-            # Hand off to the same plotting pipeline (normalization handled there)
-            state['lines'].append([x_data, y_data])
-
-        except Exception as e:
-            set_status(f"⚠️ Failed to load: {os.path.basename(path)}  ({e})", 6000)
-
-def transform_data(state):
-    """Transform the data based on user-defined settings (scaling, offsets, etc.)."""
-    # --- intensity normalization (if enabled in preferences) ---
-    disable_norm = app.preferences.get("disable_int_norm", "0") == "1"
-    if not disable_norm:
-        for i, line in enumerate(state['lines']):
-            y = line[1]
-            # Prefer positive max; if not present, fall back to absolute max
-            ymax = float(np.max(y)) if np.max(y) > 0 else float(np.max(np.abs(y)))
-            if ymax and np.isfinite(ymax):
-                line[1] = y / ymax
-    scaling_factor_str = state['scaling_factor_entry'].get()
-    scaling_factor = safe_float(scaling_factor_str, 1.0)
-
-    x_offset_increment = float(state['x_offset_entry'].get()) if state['x_offset_entry'].get() else 0
-    y_offset_increment = float(state['y_offset_entry'].get()) if state['y_offset_entry'].get() else 0
-    
-    cumulative_y_offset = 0  # Initialize cumulative y-offset for stacking
-
-    for idx, line in enumerate(state['lines']):
-        # Apply scaling factor to y-data
-        line[1] *= scaling_factor
-        
-        if state['mode_var'].get().lower() == "overlay":
-            # Apply x and y offsets (increases as index increases)
-            line[0] += x_offset_increment * idx
-            line[1] += y_offset_increment * idx
-        elif state['mode_var'].get().lower() == "stack":
-            if idx == 0:
-                # First line remains at base level
-                cumulative_y_offset = max(line[1]) + (y_offset_increment if len(state['lines']) > 1 else 0)
-            else:
-                # Store original max before modification
-                original_max = max(line[1])
-                # Apply cumulative offset to current line
-                line[1] += cumulative_y_offset
-                # Update cumulative offset for the *next* line only (no last spacer)
-                if idx < len(state['lines']) - 1:
-                    cumulative_y_offset += original_max + y_offset_increment
+    if customize_graph(state):
+        state['figure_key'] = figure_key
+        _enforce_memory_budget()
+        if perf.is_enabled():
+            # click to figure on screen, including the worker and the wait for the Tk loop
+            perf.record("plot.total", request['started_ns'], time.perf_counter_ns())
+        if PROFILE_STARTUP and not state.get('plotted_once'):
+            # load + transform + draw of the first plot; the renderer warm-up targets this
+            state['plotted_once'] = True
+            print(f"First plot: {(time.perf_counter() - request['started']) * 1e3:.1f} ms", file=sys.stderr)
+
+def _indexed_norm(path, x_unit, y):
+    """The normalisation divisor of *path* in *x_unit* from STATS_INDEX, if *y* is the whole indexed spectrum."""
+    stats = STATS_INDEX.get(path, x_unit)
+    return stats.norm if stats is not None and stats.points == len(y) else None
+
+def _peak_params():
+    prefs = app.preferences
+    return PeakParams(threshold_sigma=safe_float(prefs.get("peak_threshold_sigma"), 8.0),
+                      min_separation=safe_float(prefs.get("peak_min_separation"), 0.0),
+                      interpolate=prefs.get("peak_interpolate", "1") == "1")
+
+def _peak_labels():
+    return int(safe_float(app.preferences.get("peak_max_labels"), 20))
+
+# Integral regions are kept in the preferences (edited in the Integrals dialog);
+# plots shade them when they are in the plot's unit (Hz regions on kHz axes too).
+INTEGRAL_PREFS = ("integral_regions", "integral_unit", "integral_show", "integral_curves")
+INTEGRAL_UNIT_SCALE = {("ppm", "ppm"): 1.0, ("Hz", "Hz"): 1.0, ("Hz", "kHz"): 1e-3}
+
+def _integral_overlay(settings, prefs):
+    """(regions in the plot's x unit, draw curves) for draw_plot_on, or None if nothing is shown."""
+    if prefs.get("integral_show", "1") != "1":
+        return None
+    try:
+        regions = integrals.parse_regions(prefs.get("integral_regions"))
+    except ValueError:
+        return None             # the dialog refuses these; a hand-edited file just shows none
+    scale = INTEGRAL_UNIT_SCALE.get((prefs.get("integral_unit") or "ppm", settings.load_unit))
+    if not regions or scale is None:
+        return None
+    return tuple((lo * scale, hi * scale) for lo, hi in regions), prefs.get("integral_curves") == "1"
 
 def _draw_plot_on(ax, state):
-    set_axis_limits(state, ax)
-    axis_title = get_axis_title(state['nucleus_entry'].get(), state['x_axis_unit'].get())
-    set_axis_ticks(state, ax)
-    ax.set_facecolor("white")
-    ax.figure.set_facecolor("white")
-    selected_scheme = state['color_scheme_var'].get()
-
-    # How many lines do we need to color?
-    n_lines = max(1, len(state.get('lines', [])))
-
-    if selected_scheme == "Single color — user specified":
-        # Reuse your existing validator and entry
-        custom_color = state['custom_color_entry'].get()
-        if custom_color and validate_color(custom_color):
-            colors = [custom_color] * n_lines
-        else:
-            messagebox.showerror("Error", "Please enter a valid color name or hex code")
-            return False
-    else:
-        # Treat selection as a matplotlib colormap name
-        try:
-            cmap = mpl.colormaps[selected_scheme]
-            # sample evenly across the colormap
-            if n_lines == 1:
-                colors = [cmap(0.5)]
-            else:
-                colors = [cmap(i / (n_lines - 1)) for i in range(n_lines)]
-        except Exception:
-            # fallback if something odd gets loaded from a template
-            colors = ["black"] * n_lines
-
-    ax.set_xlabel(axis_title, fontdict={
-        'family': state['label_font_type_var'].get() or 'Arial',
-        'size'  : float(state['label_font_size_entry'].get()) if state['label_font_size_entry'].get() else 10
-    })
-
-    for idx, line in enumerate(state['lines']):
-        ax.plot(
-            line[0], line[1],
-            linewidth=float(state['line_thickness_entry'].get()) if state['line_thickness_entry'].get() else None,
-            color=colors[idx],
-            clip_on=True
-        )
-
-    ax.invert_xaxis()
+    regions, curves = state.get('integrals') or (None, False)
+    try:
+        draw_plot_on(ax, state['plot_settings'], state['lines'],
+                     linecollection_threshold=_linecollection_threshold(),
+                     cache=RESAMPLE_CACHE, data_key=state.get('data_key'),
+                     peaks=state.get('peaks'), peak_labels=_peak_labels(),
+                     integral_regions=regions, integral_curves=curves)
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        return False
     return True
 
 def customize_graph(state):
@@ -2051,34 +2666,30 @@ def customize_graph(state):
     for f in (state['canvas_holder'], state['toolbar_frame']):
         for child in f.winfo_children():
             child.destroy()
+    # free the old figure's artists now, even if something still references it
+    old = state.pop('current_figure', None)
+    if old is not None:
+        old.clear()
+    state.pop('matplotlib_canvas', None)
 
     # Determine whether we're in resizable (live) mode or fixed mode.
     resizable = bool(state.get('resizable_mode_var') and state['resizable_mode_var'].get())
 
     # If fixed mode, build desired spec from UI and create figure at that physical size
     if not resizable:
-        unit = (state.get('fig_size_unit') and state['fig_size_unit'].get()) or "mm"
-        w_ui = safe_float(state['fig_w_var'].get(), 85 if unit == "mm" else 3.35)
-        h_ui = safe_float(state['fig_h_var'].get(), 60 if unit == "mm" else 2.36)
-        dpi  = int(safe_float(state['fig_dpi_var'].get(), 300))
-        if unit == "mm":
-            w_in, h_in = w_ui / 25.4, h_ui / 25.4
-        elif unit == "px":
-            w_in, h_in = w_ui / dpi, h_ui / dpi
-        else:
-            w_in, h_in = w_ui, h_ui
+        w_in, h_in, dpi = state['plot_settings'].figure_size()
         desired = (w_in, h_in, dpi)
         # create figure at physical size and enable constrained layout so labels never overflow
-        fig = plt.Figure(figsize=(w_in, h_in), dpi=dpi, constrained_layout=True)
+        fig = Figure(figsize=(w_in, h_in), dpi=dpi, constrained_layout=True)
     else:
         # live/resizable fallback: create on-screen figure with constrained layout so labels
         # are always included and not clipped when it is sized to the window.
         # We use a modest default size; it will be resized to match the canvas content area.
         try:
-            fig = plt.Figure(figsize=(8, 6), dpi=100, constrained_layout=True)
+            fig = Figure(figsize=(8, 6), dpi=100, constrained_layout=True)
         except TypeError:
             # older matplotlib might not accept constrained_layout here; fall back gracefully
-            fig = plt.Figure(figsize=(8, 6), dpi=100)
+            fig = Figure(figsize=(8, 6), dpi=100)
         desired = None
 
     ax = fig.add_subplot(111)
@@ -2101,7 +2712,7 @@ def customize_graph(state):
             pass
 
     if not _draw_plot_on(ax, state):
-        return
+        return False
 
     state['current_figure'] = fig
     w_in, h_in = fig.get_size_inches()
@@ -2116,6 +2727,8 @@ def customize_graph(state):
 
     toolbar = CustomNavigationToolbar(state.get('matplotlib_canvas'), state['toolbar_frame'])
     toolbar.update()
+    state['toolbar'] = toolbar
+    return True
 
 def _apply_figure_padding(fig):
     """Apply symmetric padding unless constrained_layout is active.
@@ -2171,36 +2784,98 @@ def get_current_plot_size(state):
     state['fig_dpi_var'].set(str(int(dpi)))
     set_plot_status(f"Captured current plot size: {fmt(w)}×{fmt(h)} {unit} @ {int(dpi)} DPI", 4000)
 
+RESIZE_DEBOUNCE_MS = 150   # quiet period after the last <Configure> before a full redraw
+
 def _bind_holder_resize_once(state):
     if state.get('_resize_bound'):
         return
     holder = state['canvas_holder']
     def _on_conf(e):
         try:
-            _scale_and_place_canvas(state)
+            _on_holder_resize(state)
         except Exception:
             pass
     holder.bind("<Configure>", _on_conf)
     state['_resize_bound'] = True
 
-def _scale_and_place_canvas(state):
-    """Place & size the live figure widget into the canvas_holder.
+def _on_holder_resize(state):
+    """Coalesce <Configure> bursts: cheap bitmap preview now, one real draw when resizing stops."""
+    job = state.get('_resize_job')
+    if job:
+        app.after_cancel(job)
+    else:
+        # first event of a new resize gesture: snapshot the last full render
+        state['_resize_gesture'] = {"events": 0, "previews": 0, "redraws": 0}
+        state['_resize_snapshot'] = _grab_canvas_bitmap(state)
+
+    gesture = state['_resize_gesture']
+    gesture["events"] += 1
+    if _show_resize_preview(state):
+        gesture["previews"] += 1
+
+    state['_resize_job'] = app.after(RESIZE_DEBOUNCE_MS, lambda: _finish_resize(state))
+
+def _finish_resize(state):
+    """End of a resize gesture: drop the preview and do one full-quality draw."""
+    state['_resize_job'] = None
+    state.pop('_resize_snapshot', None)
+    preview = state.pop('_resize_preview', None)
+    if preview is not None and preview.winfo_exists():
+        preview.destroy()
+
+    gesture = state.pop('_resize_gesture', None) or {"events": 0, "previews": 0, "redraws": 0}
+    if _scale_and_place_canvas(state):
+        gesture["redraws"] += 1
+        state['last_resize_stats'] = gesture
+        msg = (f"Resized: {gesture['redraws']} redraw for {gesture['events']} resize "
+               f"event{'s' if gesture['events'] != 1 else ''} ({gesture['previews']} previews)")
+        if state.get('view_scale', 1.0) < 1.0:
+            msg += f" — view scaled to {int(state['view_scale']*100)}% to fit window"
+        set_plot_status(msg, 3000)
+
+def _grab_canvas_bitmap(state):
+    """Copy the RGB pixels of the last Agg render of the live canvas (or None)."""
+    canvas = state.get('matplotlib_canvas')
+    if canvas is None or canvas.figure is not state.get('current_figure'):
+        return None
+    try:
+        return np.asarray(canvas.buffer_rgba())[..., :3].copy()
+    except Exception:
+        return None
 
-    - In resizable (live) mode: fill the canvas_holder (minus small symmetric padding).
-    - In fixed mode: create the figure at the desired physical size and scale down
-      to fit (never scale up).
-    """
+def _show_resize_preview(state):
+    """Show the last render, nearest-neighbour scaled to the new display size, over the canvas."""
+    src = state.get('_resize_snapshot')
     fig = state.get('current_figure')
     holder = state.get('canvas_holder')
-    if not fig or not holder or not holder.winfo_exists():
-        return
+    if src is None or fig is None or not holder or not holder.winfo_exists():
+        return False
 
-    holder.update_idletasks()
     avail_w = max(1, holder.winfo_width())
     avail_h = max(1, holder.winfo_height())
+    disp_w, disp_h, _, _ = _display_size(state, fig, avail_w, avail_h)
+
+    src_h, src_w = src.shape[:2]
+    rows = (np.arange(disp_h) * src_h) // disp_h
+    cols = (np.arange(disp_w) * src_w) // disp_w
+    img = src[rows[:, None], cols[None, :]]
+
+    # binary PPM is the cheapest format Tk's PhotoImage decodes without extra packages
+    ppm = b"P6 %d %d 255\n" % (disp_w, disp_h) + img.tobytes()
+    photo = tk.PhotoImage(data=ppm, format="PPM")
+
+    preview = state.get('_resize_preview')
+    if preview is None or not preview.winfo_exists():
+        preview = tk.Label(holder, bd=0, bg="white")
+        state['_resize_preview'] = preview
+    preview.configure(image=photo)
+    preview.image = photo          # keep a reference; Tk does not
+    preview.place(relx=0.5, rely=0.5, anchor="center", width=disp_w, height=disp_h)
+    preview.lift()
+    return True
 
-     # determine symmetric padding (in pixels) with a safe fallback
-    pad_default = 6
+def _canvas_padding_px(state, pad_default=6):
+    """Symmetric padding (px) around the live figure; never less than *pad_default*."""
     pad_px = pad_default
     try:
         we = state.get('whitespace_entry', None)
@@ -2222,6 +2897,15 @@ def _scale_and_place_canvas(state):
 
     except Exception:
         pad_px = pad_default
+    return pad_px
+
+def _display_size(state, fig, avail_w, avail_h):
+    """Return (disp_w_px, disp_h_px, dpi, view_scale) for the live figure in an avail_w×avail_h holder."""
+    pad_px = _canvas_padding_px(state)
+
+    # available content area after padding
+    content_w = max(1, avail_w - 2 * pad_px)
+    content_h = max(1, avail_h - 2 * pad_px)
 
     # detect fixed vs resizable mode
     resizable = bool(state.get('resizable_mode_var') and state['resizable_mode_var'].get())
@@ -2232,34 +2916,37 @@ def _scale_and_place_canvas(state):
         des_w_px = max(1, int(round(w_in * dpi)))
         des_h_px = max(1, int(round(h_in * dpi)))
 
-        # available content area after padding
-        content_w = max(1, avail_w - 2 * pad_px)
-        content_h = max(1, avail_h - 2 * pad_px)
-
         # scale down if needed (never scale up)
         scale = min(1.0, content_w / des_w_px, content_h / des_h_px)
-        disp_w_px = max(1, int(des_w_px * scale))
-        disp_h_px = max(1, int(des_h_px * scale))
+        return max(1, int(des_w_px * scale)), max(1, int(des_h_px * scale)), dpi, scale
 
-        # set the figure's on-screen size (in inches)
-        fig.set_dpi(dpi)
-        fig.set_size_inches(disp_w_px / dpi, disp_h_px / dpi, forward=True)
-        view_scale = scale
+    # resizable / live mode: fill the holder (minus padding);
+    # we are filling the area, so there is no scaling factor to report
+    return content_w, content_h, fig.get_dpi(), 1.0
 
-    else:
-        # resizable / live mode: fill the holder (minus padding)
-        content_w = max(1, avail_w - 2 * pad_px)
-        content_h = max(1, avail_h - 2 * pad_px)
+def _scale_and_place_canvas(state):
+    """Place & size the live figure widget into the canvas_holder.
+
+    - In resizable (live) mode: fill the canvas_holder (minus small symmetric padding).
+    - In fixed mode: create the figure at the desired physical size and scale down
+      to fit (never scale up).
+
+    Returns True when the figure was (re)drawn.
+    """
+    fig = state.get('current_figure')
+    holder = state.get('canvas_holder')
+    if not fig or not holder or not holder.winfo_exists():
+        return False
 
-        # set figure size in inches to match the display area (so labels are laid out)
-        dpi = fig.get_dpi()
-        fig.set_dpi(dpi)
-        fig.set_size_inches(content_w / dpi, content_h / dpi, forward=True)
+    holder.update_idletasks()
+    avail_w = max(1, holder.winfo_width())
+    avail_h = max(1, holder.winfo_height())
+
+    disp_w_px, disp_h_px, dpi, view_scale = _display_size(state, fig, avail_w, avail_h)
 
-        # we are filling the area; no scaling factor to report (view_scale = 1.0)
-        disp_w_px = content_w
-        disp_h_px = content_h
-        view_scale = 1.0
+    # set the figure's on-screen size (in inches) so labels are laid out for the display area
+    fig.set_dpi(dpi)
+    fig.set_size_inches(disp_w_px / dpi, disp_h_px / dpi, forward=True)
 
     # Apply symmetric padding so labels and axis titles are not clipped.
     try:
@@ -2281,99 +2968,15 @@ def _scale_and_place_canvas(state):
 
     # draw
     try:
-        canvas.draw()
+        with perf.span("canvas.draw"):        # Agg render + blit into the Tk photo image
+            canvas.draw()
     except Exception:
         canvas.draw_idle()
 
     state['view_scale'] = view_scale
     if view_scale < 1.0:
         set_plot_status(f"View scaled to {int(view_scale*100)}% to fit window", 3000)
-
-def set_axis_limits(state, ax):
-    """Set the axis limits based on user input."""
-    x_min = float(state['x_min_entry'].get()) if state['x_min_entry'].get() else min(state['lines'][-1][0])
-    x_max = float(state['x_max_entry'].get()) if state['x_max_entry'].get() else max(state['lines'][0][0])
-
-    ax.set_xlim(x_min, x_max)
-    
-    y_min = float(state['y_min_entry'].get()) if state['y_min_entry'].get() else 0
-    y_max = float(state['y_max_entry'].get()) if state['y_max_entry'].get() else 1
-
-    if state['mode_var'].get() == "stack" and state['y_max_entry'].get() == '':
-        y_max = max(state['lines'][-1][1])
-    elif state['mode_var'].get() == "overlay" and state['y_max_entry'].get() == '':
-        y_max = max(state['lines'][-1][1])
-
-    # Retrieve the whitespace value entered by the user
-    whitespace_value = float(state['whitespace_entry'].get()) if state['whitespace_entry'].get() else 0.1
-
-    ax.set_ylim(y_min - whitespace_value, y_max + whitespace_value)
-
-def get_axis_title(nucleus, x_axis_unit):
-    """Generate the axis title based on the nucleus and x-axis unit."""
-    if not nucleus:
-        return
-
-    if x_axis_unit == "ppm":
-        unit_string = "Chemical Shift (ppm)"
-    elif x_axis_unit == "Hz":
-        unit_string = "Frequency (Hz)"
-    elif x_axis_unit == "kHz":
-        unit_string = "Frequency (kHz)"
-    else:
-        print("Invalid x-axis unit selection")
-        return
-
-    numeric_part = ""
-    element_name = ""
-    
-    for i in range(0, len(nucleus)):
-        if nucleus[i].isdigit():
-            numeric_part += nucleus[i]
-        else:
-            element_name += nucleus[i]
-
-    # Use LaTeX syntax for font styling
-    title_with_superscript = r"$\mathregular{^{%s}}$%s %s" % (numeric_part, element_name, unit_string)
-
-    return title_with_superscript
-
-def set_axis_ticks(state, ax):
-    """Set the axis ticks based on user input."""
-    x_ticks_spacing = safe_float(state['major_ticks_freq_entry'].get()) if state['major_ticks_freq_entry'].get() else None
-    x_minor_ticks_spacing = safe_float(state['minor_ticks_freq_entry'].get()) if state['minor_ticks_freq_entry'].get() else None
-
-    if x_ticks_spacing is not None:
-        ax.xaxis.set_major_locator(ticker.MultipleLocator(x_ticks_spacing))
-
-    if x_minor_ticks_spacing is not None:
-        ax.xaxis.set_minor_locator(ticker.MultipleLocator(x_minor_ticks_spacing))
-
-    # Set font properties directly on the x-axis tick labels
-    font_properties = {
-        # use Axis-font combobox; default to Arial if blank
-        'family': state['axis_font_type_var'].get() if state['axis_font_type_var'].get() else 'Arial',
-        'size'  : float(state['axis_font_size_entry'].get()) if state['axis_font_size_entry'].get() else 10
-    }
-
-    # Hide y-axis ticks and labels
-    ax.yaxis.set_major_locator(ticker.NullLocator())
-    ax.yaxis.set_minor_locator(ticker.NullLocator())
-
-    # Additional customization
-
-    major_len = safe_float(state['major_ticks_len_entry'].get()) or 4.0
-    minor_len = safe_float(state['minor_ticks_len_entry'].get()) or 2.0
-
-    # length & size
-    ax.tick_params(axis='x',
-                   which='major', length=major_len, labelsize=font_properties['size'])
-    ax.tick_params(axis='x',
-                   which='minor', length=minor_len, labelsize=font_properties['size'])
-
-    # family
-    for lbl in ax.get_xticklabels():
-        lbl.set_family(font_properties['family'])
+    return True
 
 def show_empty_plot(state):
     # clear any old children
@@ -2388,22 +2991,13 @@ def show_empty_plot(state):
                    text="Add spectra to the plot workspace and click 'Plot Spectrum'")
 
 
-def validate_color(color):
-    """Validate if the color is a valid name or hex code."""
-    try:
-        plt.plot([], color=color)
-        return True
-    except ValueError:
-        return False
-
-
 def export_plot_template(state):
     file = filedialog.asksaveasfilename(
         initialdir=app.preferences["template_dir"], defaultextension='.txt')
     if not file:
         return
     with open(file, 'w', encoding='utf-8') as f:
-        EXCLUDE = {"status_var", "tpl_status_var"} 
+        EXCLUDE = {"status_var", "tpl_status_var", "memory_var"}
         for key, widget in state.items():
             if key in EXCLUDE:
                 continue
@@ -2428,35 +3022,22 @@ def import_plot_template(state, initial_dir=None, file_path=None):
         return
     # ------------------------------------------------------------------ #
     try:
-        # 2) open the file
-        with open(template_path, "r", encoding="utf-8") as fh:
-            for line_number, line in enumerate(fh, 1):
-                if not line.strip():
-                    continue
-
-                if ':' not in line:
-                    print(f"Warning: Line {line_number} is malformed (missing colon): {line.strip()}")
-                    continue
-
-                key, value = line.strip().split(":", 1)
-                if not key:                         # allow empty values
-                    print(f"Warning: Line {line_number} has empty key: {line.strip()}")
-                    continue
-
-                if key in state:
-                    if isinstance(state[key], tk.Entry):
-                        state[key].delete(0, tk.END)
-                        state[key].insert(0, value)
-                    elif isinstance(state[key], tk.StringVar):
-                        state[key].set(value)
-                    elif key not in ['data_tree', 'workspace_tree', 'placeholder_canvas',
-                                     'canvas_frame', 'color_schemes']:
-                        try:
-                            state[key] = value
-                        except Exception as e:
-                            print(f"Warning: Could not import value for {key}: {str(e)}")
-                else:
-                    print(f"Warning: Unknown key in settings file: {key}")
+        # 2) read the file
+        for key, value in read_template(template_path).items():
+            if key in state:
+                if isinstance(state[key], tk.Entry):
+                    state[key].delete(0, tk.END)
+                    state[key].insert(0, value)
+                elif isinstance(state[key], tk.StringVar):
+                    state[key].set(value)
+                elif key not in ['data_tree', 'workspace_tree', 'placeholder_canvas',
+                                 'canvas_frame', 'color_schemes']:
+                    try:
+                        state[key] = value
+                    except Exception as e:
+                        print(f"Warning: Could not import value for {key}: {str(e)}")
+            else:
+                print(f"Warning: Unknown key in settings file: {key}")
 
         set_tpl_status(f"✅  Template loaded ({os.path.basename(template_path)})")
 
@@ -0,0 +1,76 @@
+"""First-plot latency with and without the background renderer warm-up.
+
+    python benchmarks/bench_first_plot.py [--template FILE] [--repeat N]
+
+Each trial runs in a fresh interpreter with the plotting modules already
+imported, as in the GUI once its background import is done. "cold" draws the
+first figure straight away; "warm" first runs nmrplot.render.warm_up() on a
+background thread, as the GUI does after startup, and then draws. Both report
+the first draw and a second, steady-state draw of the same figure.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time, json, threading
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from nmrplot.settings import PlotSettings
+from nmrplot.render import build_export_figure, transform_lines_for, warm_up
+
+settings = PlotSettings.from_template({template!r})
+w_in, h_in, dpi = settings.figure_size()
+if {warm!r}:
+    t = threading.Thread(target=warm_up, args=(settings, dpi))
+    t.start()
+    t.join()
+
+def draw():
+    x = np.linspace(settings.x_max or 10.0, settings.x_min or 0.0, 16384)
+    lines = [[x.copy(), np.abs(np.sin(x * (i + 1))) + 0.01] for i in range(5)]
+    transform_lines_for(lines, settings)
+    t0 = time.perf_counter()
+    fig = build_export_figure(settings, lines, w_in, h_in, dpi, colors=["black"] * 5)
+    FigureCanvasAgg(fig).draw()
+    return time.perf_counter() - t0
+
+first = draw()
+second = draw()
+print(json.dumps({{"first": first, "second": second}}))
+"""
+
+
+def measure(template, warm, repeat):
+    firsts, seconds = [], []
+    env = dict(os.environ, PYTHONPATH=REPO, MPLBACKEND="Agg")
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(template=template, warm=warm)],
+                             capture_output=True, text=True, env=env, cwd=REPO, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        firsts.append(result["first"])
+        seconds.append(result["second"])
+    return statistics.median(firsts), statistics.median(seconds)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--template", default=os.path.join(REPO, "plot_templates", "default.txt"),
+                   help="plot template whose fonts/size are used (default: plot_templates/default.txt)")
+    p.add_argument("--repeat", type=int, default=5, help="fresh interpreters per mode (default 5)")
+    args = p.parse_args(argv)
+
+    print(f"{'mode':<8}{'first ms':>10}{'second ms':>11}  (medians of {args.repeat})")
+    for mode in ("cold", "warm"):
+        first, second = measure(os.path.abspath(args.template), mode == "warm", args.repeat)
+        print(f"{mode:<8}{first * 1e3:>10.1f}{second * 1e3:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
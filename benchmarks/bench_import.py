@@ -0,0 +1,87 @@
+"""Import time of the nmrplot core, each module measured in a fresh interpreter.
+
+    python benchmarks/bench_import.py [--repeat N] [--check]
+
+Reports the best and median wall time of ``import <module>`` and which heavy
+dependencies it pulled in. With --check, exits non-zero if a module imports a
+dependency it must not (e.g. tkinter anywhere in the core, or numpy from the
+stdlib-only scanner).
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("tkinter", "numpy", "pandas", "matplotlib", "matplotlib.pyplot", "nmrglue")
+
+# module -> heavy dependencies it may load
+MODULES = {
+    "nmrplot": (),
+    "nmrplot.preferences": (),
+    "nmrplot.templates": (),
+    "nmrplot.settings": (),
+    "nmrplot.perf": (),
+    "nmrplot.watchdog": (),
+    "nmrplot.scan": (),
+    "nmrplot.loaders": ("numpy",),
+    "nmrplot.memory": ("numpy",),
+    "nmrplot.prefetch": (),
+    "nmrplot.preview": ("numpy",),
+    "nmrplot.resample": ("numpy",),
+    "nmrplot.arithmetic": ("numpy",),
+    "nmrplot.peaks": ("numpy",),
+    "nmrplot.integrals": ("numpy",),
+    "nmrplot.stats": ("numpy",),
+    "nmrplot.render": ("numpy", "matplotlib"),
+    "nmrplot.export": ("numpy", "matplotlib"),
+    "nmrplot.batch": ("numpy", "matplotlib"),
+    "nmrplot.cli": ("numpy", "matplotlib"),
+}
+
+PROBE = """
+import sys, time, json
+t0 = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t0
+print(json.dumps({{"seconds": dt, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, repeat):
+    times, loaded = [], []
+    env = dict(os.environ, PYTHONPATH=REPO, MPLBACKEND="Agg")
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+                             capture_output=True, text=True, env=env, cwd=REPO, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        loaded = result["loaded"]
+    return min(times), statistics.median(times), loaded
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module (default 5)")
+    p.add_argument("--check", action="store_true", help="fail if a module loads a forbidden dependency")
+    args = p.parse_args(argv)
+
+    failures = []
+    print(f"{'module':<22}{'best ms':>9}{'median ms':>11}  heavy imports")
+    for module, allowed in MODULES.items():
+        best, median, loaded = measure(module, args.repeat)
+        print(f"{module:<22}{best * 1e3:>9.1f}{median * 1e3:>11.1f}  {', '.join(loaded) or '-'}")
+        extra = [m for m in loaded if m not in allowed]
+        if extra:
+            failures.append(f"{module} imports {', '.join(extra)}")
+
+    for msg in failures:
+        print(f"FAIL: {msg}", file=sys.stderr)
+    return 1 if (args.check and failures) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Benchmark suite for the nmrplot core on a synthetic Bruker tree.
+
+    python benchmarks/bench_suite.py [--out results.json] [--compare baseline.json]
+                                     [--samples N --expnos N --procs N --points N]
+                                     [--repeat N] [--only PREFIX ...] [--tolerance 0.15]
+    python benchmarks/bench_suite.py --load results.json --compare baseline.json
+
+Generates a tree with synth_bruker (or uses --data DIR), then times scanning,
+the scan cache, the ascii and pdata loaders, masking, transforms, resampling,
+peak picking (also on one 1M-point spectrum), region integrals (the cumulative
+integral of a 1M-point spectrum, and 1000 regions looked up in it), dataset
+statistics (also on the 1M-point spectrum), drawing and every export format. Each case runs once to warm up and then
+--repeat times; the median is what counts. Results go to --out as JSON. With --compare, each
+case's median is checked against the baseline's, and the exit status is 1 if
+any case is more than --tolerance slower (and at least --min-delta-ms slower,
+so sub-millisecond noise is not reported).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+from synth_bruker import make_tree, synthetic_spectrum               # noqa: E402
+from nmrplot import scan, loaders                                     # noqa: E402
+from nmrplot.settings import PlotSettings                             # noqa: E402
+from nmrplot.render import transform_lines_for, build_export_figure   # noqa: E402
+from nmrplot.export import write_figure                               # noqa: E402
+from nmrplot.batch import EXPORT_FORMATS                              # noqa: E402
+from nmrplot.resample import common_grid, resample                   # noqa: E402
+from nmrplot.peaks import PeakParams, pick_peaks                      # noqa: E402
+from nmrplot.integrals import cumulative_integral, integrate          # noqa: E402
+from nmrplot.stats import compute_stats                               # noqa: E402
+
+
+def cases(root, work, tree):
+    """[(name, setup, run)]: run(setup()) is timed, setup() is not."""
+    settings = PlotSettings.from_template(os.path.join(REPO, "plot_templates", "default.txt"),
+                                          {"x_min_entry": "", "x_max_entry": ""})
+    w_in, h_in, dpi = settings.figure_size()
+    ascii_paths, pdata_dirs = tree["ascii"], tree["pdata"]
+    cache = os.path.join(work, "scan_cache.txt")
+
+    def loaded():
+        lines, _ = loaders.load_traces(ascii_paths, "ppm")
+        return lines
+
+    lines = loaded()
+    import numpy as np
+    million = synthetic_spectrum(1 << 20, np.random.default_rng(0))
+    picking = PeakParams(min_separation=0.02)
+    cum = cumulative_integral(*million)
+    starts = np.linspace(million[0].min(), million[0].max(), 1001)[:-1]
+    regions = np.column_stack((starts, starts + 0.5 * (starts[1] - starts[0])))
+    copies = lambda: [[x.copy(), y.copy()] for x, y in lines]          # noqa: E731
+    transformed = transform_lines_for(copies(), settings)
+    figure = lambda: build_export_figure(settings, transformed, w_in, h_in, dpi)   # noqa: E731
+
+    def save_cache(_):
+        if os.path.exists(cache):
+            os.remove(cache)
+        scan.save_scan_cache(cache, root, ascii_paths, "ascii")
+
+    def draw(fig):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        FigureCanvasAgg(fig).draw()
+
+    out = [
+        ("scan.validate", None, lambda _: scan.quick_validate_bruker_top(root)),
+        ("scan.ascii", None, lambda _: scan.traverse_directory_ascii(root)),
+        ("scan.pdata", None, lambda _: scan.traverse_directory_pdata(root)),
+        ("cache.save", None, save_cache),
+        ("cache.read", lambda: save_cache(None), lambda _: scan.read_scan_cache(cache)),
+        ("load.ascii", None, lambda _: [loaders.load_spectrum(p, "ppm") for p in ascii_paths]),
+        ("mask", None, lambda _: [loaders.crop_x_range(x, y, 2.0, 8.0) for x, y in lines]),
+        ("transform", copies, lambda ls: transform_lines_for(ls, settings)),
+        ("resample", None, lambda _: resample(lines, common_grid(lines))),
+        ("peaks", None, lambda _: [pick_peaks(x, y, picking) for x, y in lines]),
+        ("peaks.1M", None, lambda _: pick_peaks(*million, picking)),
+        ("integrals.cum", None, lambda _: cumulative_integral(*million)),
+        ("integrals.lookup", None, lambda _: integrate(cum, regions)),
+        ("stats", None, lambda _: [compute_stats(x, y, "ppm") for x, y in lines]),
+        ("stats.1M", None, lambda _: compute_stats(*million, "ppm")),
+        ("draw", None, lambda _: draw(figure())),
+    ]
+    if loaders.HAS_NMRGLUE:
+        out.insert(6, ("load.pdata", None, lambda _: [loaders.load_spectrum(p, "ppm") for p in pdata_dirs]))
+    for fmt in EXPORT_FORMATS:
+        target = os.path.join(work, f"bench.{fmt}")
+        out.append((f"export.{fmt}", figure, lambda fig, t=target, f=fmt: write_figure(fig, t, f, dpi)))
+    return out
+
+def run(name, setup, fn, repeat):
+    fn(setup() if setup else None)                     # warm-up (caches, fonts, imports)
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t0)
+    return {"median_s": statistics.median(times), "min_s": min(times), "runs_s": times}
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Print new vs baseline medians; return the names that regressed."""
+    regressed = []
+    print(f"\n{'case':<16}{'baseline ms':>13}{'now ms':>10}{'change':>9}")
+    for name, now in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<16}{'-':>13}{now['median_s'] * 1e3:>10.1f}      new")
+            continue
+        b, n = base["median_s"] * 1e3, now["median_s"] * 1e3
+        change = (n - b) / b if b else 0.0
+        flag = change > tolerance and n - b >= min_delta_ms
+        if flag:
+            regressed.append(name)
+        print(f"{name:<16}{b:>13.1f}{n:>10.1f}{change:>+9.0%}{'  REGRESSION' if flag else ''}")
+    return regressed
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--data", help="existing tree to use instead of generating one (made if missing)")
+    p.add_argument("--samples", type=int, default=4)
+    p.add_argument("--expnos", type=int, default=5)
+    p.add_argument("--procs", type=int, default=1)
+    p.add_argument("--points", type=int, default=65536)
+    p.add_argument("--repeat", type=int, default=5, help="timed runs per case (default 5)")
+    p.add_argument("--only", nargs="*", default=(), help="run only cases starting with these prefixes")
+    p.add_argument("--out", help="write the results here as JSON")
+    p.add_argument("--load", help="compare these saved results instead of running")
+    p.add_argument("--compare", help="baseline results JSON to check for regressions")
+    p.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown (default 0.15 = 15%%)")
+    p.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = p.parse_args(argv)
+
+    if args.load:
+        with open(args.load, encoding="utf-8") as fh:
+            results = json.load(fh)
+    else:
+        import numpy as np
+        import matplotlib as mpl
+        params = {k: getattr(args, k) for k in ("samples", "expnos", "procs", "points", "repeat")}
+        work = tempfile.mkdtemp(prefix="nmrplot-bench-")
+        root = args.data or os.path.join(work, "tree")
+        try:
+            if not os.path.isdir(root):
+                t0 = time.perf_counter()
+                make_tree(root, args.samples, args.expnos, args.procs, args.points)
+                print(f"Generated {args.samples * args.expnos * args.procs} spectra of "
+                      f"{args.points:,} points in {time.perf_counter() - t0:.1f}s")
+            tree = {"ascii": [], "pdata": []}
+            for block in scan.traverse_directory_ascii(root).values():
+                tree["ascii"] += [p for sample in block.values() for p in sample.values()]
+            for block in scan.traverse_directory_pdata(root).values():
+                tree["pdata"] += [p for sample in block.values() for p in sample.values()]
+
+            results = {"meta": {"python": platform.python_version(), "numpy": np.__version__,
+                                "matplotlib": mpl.__version__, "platform": platform.platform(),
+                                "date": time.strftime("%Y-%m-%d %H:%M:%S"), "params": params},
+                       "results": {}}
+            print(f"{'case':<16}{'median ms':>11}{'min ms':>10}")
+            for name, setup, fn in cases(root, work, tree):
+                if args.only and not name.startswith(tuple(args.only)):
+                    continue
+                r = results["results"][name] = run(name, setup, fn, args.repeat)
+                print(f"{name:<16}{r['median_s'] * 1e3:>11.1f}{r['min_s'] * 1e3:>10.1f}")
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if baseline.get("meta", {}).get("params") != results.get("meta", {}).get("params"):
+            print("warning: baseline was run with different parameters", file=sys.stderr)
+        regressed = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressed:
+            print(f"\n{len(regressed)} regression(s): {', '.join(regressed)}")
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
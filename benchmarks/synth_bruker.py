@@ -0,0 +1,103 @@
+"""Synthetic Bruker data trees for benchmarks.
+
+    python benchmarks/synth_bruker.py OUT_DIR [--samples N] [--expnos N] [--procs N]
+                                      [--points N] [--no-ascii] [--no-pdata] [--seed N]
+
+Writes OUT_DIR/<sample>/<expno>/pdata/<procno>/ with a JCAMP ``procs``, a
+little-endian int32 ``1r`` and a TopSpin convbin2asc ``ascii-spec.txt``
+(index, intensity, Hz, ppm), plus ``acqus`` in each experiment folder, so
+both import modes, the scanners and the loaders see a realistic layout. The
+spectra are Lorentzian peaks on noise, reproducible for a given --seed.
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+
+SF_MHZ = 400.13
+OFFSET_PPM = 12.0
+SW_PPM = 14.0
+
+
+def _jcamp(title, params):
+    lines = [f"##TITLE= {title}", "##JCAMPDX= 5.0", "##DATATYPE= Parameter Values",
+             "##ORIGIN= synth_bruker", "##OWNER= bench"]
+    lines += [f"##${key}= {value}" for key, value in params.items()]
+    lines.append("##END=")
+    return "\n".join(lines) + "\n"
+
+def synthetic_spectrum(points, rng, n_peaks=12):
+    """(ppm, intensity) of *points* samples from OFFSET_PPM downwards, as int32-ready floats."""
+    ppm = OFFSET_PPM - np.arange(points) * (SW_PPM / (points - 1))
+    y = rng.normal(0.0, 2e3, points)
+    for centre, height, width in zip(rng.uniform(0.5, 11.0, n_peaks),
+                                     rng.uniform(1e5, 2e6, n_peaks),
+                                     rng.uniform(0.002, 0.02, n_peaks)):
+        y += height / (1.0 + ((ppm - centre) / width) ** 2)
+    return ppm, np.rint(y)
+
+def write_proc(proc_dir, points, rng, ascii=True, pdata=True, title="synthetic"):
+    os.makedirs(proc_dir, exist_ok=True)
+    ppm, y = synthetic_spectrum(points, rng)
+    sw_hz = SW_PPM * SF_MHZ
+    with open(os.path.join(proc_dir, "procs"), "w") as fh:
+        fh.write(_jcamp("Parameter file", {
+            "SI": points, "OFFSET": OFFSET_PPM, "SW_p": sw_hz, "SF": SF_MHZ,
+            "XDIM": points, "BYTORDP": 0, "DTYPP": 0, "NC_proc": 0, "FTSIZE": points,
+        }))
+    if pdata:
+        y.astype("<i4").tofile(os.path.join(proc_dir, "1r"))
+    else:
+        # scanners look for 1r; keep the layout valid without the data
+        open(os.path.join(proc_dir, "1r"), "wb").close()
+    if ascii:
+        idx = np.arange(1, points + 1)
+        table = np.column_stack((idx, y, ppm * SF_MHZ, ppm))
+        with open(os.path.join(proc_dir, "ascii-spec.txt"), "w") as fh:
+            # TopSpin puts the title in the first line's index field
+            fh.write(f"{title}, {y[0]:.0f}, {ppm[0] * SF_MHZ:.4f}, {ppm[0]:.6f}\n")
+            np.savetxt(fh, table[1:], fmt=("%d", "%.0f", "%.4f", "%.6f"), delimiter=", ")
+
+def make_tree(root, samples=2, expnos=3, procs=1, points=65536, ascii=True, pdata=True, seed=0):
+    """Write the tree under *root*; returns {"ascii": [files], "pdata": [proc dirs]}."""
+    rng = np.random.default_rng(seed)
+    made = {"ascii": [], "pdata": []}
+    for s in range(1, samples + 1):
+        sample = f"sample_{s:03d}"
+        for e in range(10, 10 + expnos):
+            expt_dir = os.path.join(root, sample, str(e))
+            os.makedirs(expt_dir, exist_ok=True)
+            with open(os.path.join(expt_dir, "acqus"), "w") as fh:
+                fh.write(_jcamp("Parameter file", {
+                    "TD": 2 * points, "SW_h": SW_PPM * SF_MHZ, "SFO1": SF_MHZ,
+                    "BYTORDA": 0, "DTYPA": 0, "NUC1": "<1H>",
+                }))
+            for p in range(1, procs + 1):
+                proc_dir = os.path.join(expt_dir, "pdata", str(p))
+                write_proc(proc_dir, points, rng, ascii, pdata, title=f"{sample} {e}/{p}")
+                made["pdata"].append(proc_dir)
+                if ascii:
+                    made["ascii"].append(os.path.join(proc_dir, "ascii-spec.txt"))
+    return made
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("out", help="directory to create the tree in (the 'Add Directory' level)")
+    p.add_argument("--samples", type=int, default=2)
+    p.add_argument("--expnos", type=int, default=3, help="experiments per sample")
+    p.add_argument("--procs", type=int, default=1, help="processings per experiment")
+    p.add_argument("--points", type=int, default=65536, help="points per spectrum (up to millions)")
+    p.add_argument("--no-ascii", action="store_true", help="skip ascii-spec.txt")
+    p.add_argument("--no-pdata", action="store_true", help="write an empty 1r (layout only)")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    made = make_tree(args.out, args.samples, args.expnos, args.procs, args.points,
+                     ascii=not args.no_ascii, pdata=not args.no_pdata, seed=args.seed)
+    print(f"{len(made['pdata'])} spectra of {args.points:,} points under {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
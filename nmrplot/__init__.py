@@ -0,0 +1,23 @@
+"""Tk-free plotting core of NMR_Plotter, shared by the GUI and the headless batch renderer.
+
+    scan         Bruker layout checks, directory scans and scan caches (stdlib only)
+    loaders      read ascii-spec.txt / Bruker pdata spectra, crop to an x-range
+    memory       memory accounting, the spectrum load cache, min/max decimation
+    prefetch     background reads into the spectrum cache, by priority, cancellable
+    preview      thumb.png lookup and min/max sparklines for the Data Import tree
+    arithmetic   derived traces (mean, sum, differences) named by path-like strings
+    peaks        noise-thresholded peak picking with parabolic refinement, cached
+    integrals    region integrals looked up in cached cumulative integrals, CSV tables
+    stats        per-dataset maximum, noise, SNR and integral, in an mtime-keyed index file
+    resample     common x-grids and resampling of traces onto them
+    render       normalise, scale, offset/stack, and draw onto a Matplotlib Axes
+    export       export rc settings, trace simplification, tiled PNG, write_figure()
+    settings     PlotSettings: immutable, hashable snapshot of the plotting fields
+    templates    plot template files (key:value text)
+    perf         optional stage timings, rolling statistics, Chrome trace export
+    watchdog     main-loop stall detection with main-thread stack samples
+    preferences  preferences.txt defaults and reading
+    batch, cli   ``python NMR_Plotter.py render ...``
+
+Submodules are not imported here, so ``import nmrplot.scan`` stays cheap.
+"""
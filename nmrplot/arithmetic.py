@@ -0,0 +1,99 @@
+"""Derived traces: mean, sum and differences of spectra, on a common x-grid.
+
+Needs numpy only. A derived trace is named by a path-like string, so it goes
+through the workspace, load_traces(), the spectrum cache and exports like any
+dataset:
+
+    path = derived_path("difference", [sample_path, blank_path], factor=0.5)
+    x, y = compute_derived(path, "ppm", load_spectrum)
+
+Its inputs are resampled onto one grid spanning the range they share, at the
+finest spacing among them, and combined in one vectorised step.
+"""
+import json
+
+import numpy as np
+
+from .resample import resample
+from .scan import sample_name, parse_expt_proc
+
+DERIVED_PREFIX = "derived:"
+OPERATIONS = ("mean", "sum", "difference", "scaled difference")
+
+
+def derived_path(op, inputs, factor=1.0):
+    """Path-like name of *op* applied to the dataset paths *inputs* (A, B for the differences)."""
+    if op not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {op}")
+    inputs = list(inputs)
+    if op in ("difference", "scaled difference") and len(inputs) != 2:
+        raise ValueError("A difference needs exactly two spectra (A − B).")
+    if len(inputs) < 2:
+        raise ValueError(f"A {op} needs at least two spectra.")
+    factor = float(factor) if op == "scaled difference" else 1.0
+    return DERIVED_PREFIX + json.dumps([op, factor, inputs], ensure_ascii=False)
+
+def is_derived(path):
+    return isinstance(path, str) and path.startswith(DERIVED_PREFIX)
+
+def parse_derived(path):
+    """(op, factor, inputs) of a derived path; ValueError if it is malformed."""
+    try:
+        op, factor, inputs = json.loads(path[len(DERIVED_PREFIX):])
+    except (ValueError, TypeError):
+        raise ValueError(f"Malformed derived trace: {path[:60]}") from None
+    return op, float(factor), inputs
+
+def _short(path):
+    if is_derived(path):
+        return f"({derived_label(path)})"
+    expno, procno = parse_expt_proc(path)
+    return f"{sample_name(path)} {expno}/{procno}"
+
+def derived_label(path):
+    """Display name, e.g. 'mean of 3: s1 10/1, s1 11/1, s1 12/1' or 's1 10/1 − 0.5 × blank 10/1'."""
+    try:
+        op, factor, inputs = parse_derived(path)
+    except ValueError:
+        return "malformed derived trace"
+    names = [_short(p) for p in inputs]
+    if op == "difference":
+        return f"{names[0]} − {names[1]}"
+    if op == "scaled difference":
+        return f"{names[0]} − {factor:g} × {names[1]}"
+    return f"{op} of {len(names)}: {', '.join(names)}"
+
+def overlap_grid(lines):
+    """Ascending grid over the x-range every trace covers, at the finest spacing among them."""
+    lo = max(min(x[0], x[-1]) for x, _ in lines)
+    hi = min(max(x[0], x[-1]) for x, _ in lines)
+    if hi <= lo:
+        raise ValueError(f"The spectra share no x-range (the overlap would be {lo:g} to {hi:g}).")
+    step = min(abs(x[-1] - x[0]) / (len(x) - 1) for x, _ in lines if len(x) > 1)
+    return np.linspace(lo, hi, max(2, int(round((hi - lo) / step)) + 1))
+
+def combine(op, rows, factor=1.0):
+    """Apply *op* across the first axis of a (traces, points) array."""
+    if op == "mean":
+        return rows.mean(axis=0)
+    if op == "sum":
+        return rows.sum(axis=0)
+    if op == "difference":
+        return rows[0] - rows[1]
+    if op == "scaled difference":
+        return rows[0] - factor * rows[1]
+    raise ValueError(f"Unknown operation: {op}")
+
+def compute_derived(path, x_unit, load):
+    """(x, y) of a derived path; *load(path, x_unit)* reads each input as (x, y).
+
+    x runs in the direction of the first input, so ppm axes stay high → low.
+    """
+    op, factor, inputs = parse_derived(path)
+    lines = [load(p, x_unit) for p in inputs]
+    grid = overlap_grid(lines)
+    y = combine(op, resample(lines, grid), factor)
+    x0 = lines[0][0]
+    if x0[0] > x0[-1]:
+        grid, y = grid[::-1], y[::-1]
+    return grid.copy(), np.ascontiguousarray(y)
@@ -0,0 +1,113 @@
+"""Batch rendering without Tk: dataset resolution, grouping and one-figure render tasks.
+
+A task is a plain dict, so it can be sent to worker processes:
+    {"settings": PlotSettings, "datasets": [path, ...], "outputs": [path, ...],
+     "normalize": bool, "couple_x_limits": bool, "linecollection_threshold": int,
+     "export": {keyword arguments for export.write_figure}}
+"""
+import os
+import re
+import glob
+import time
+
+from .scan import is_valid_pdata_dir, parse_expt_proc, sample_name
+from .loaders import load_traces
+from .render import transform_lines_for, build_export_figure
+from .export import write_figure
+
+EXPORT_FORMATS = ("pdf", "svg", "png", "ps", "eps")
+
+
+def _natural_key(path):
+    return [int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", path)]
+
+def _datasets_under(path, import_mode):
+    """Spectra at or below *path*: an ascii-spec.txt, a pdata/<proc> dir, or a folder to scan."""
+    if os.path.isfile(path):
+        return [path] if os.path.basename(path) == "ascii-spec.txt" else []
+    if not os.path.isdir(path):
+        return []
+    ascii_path = os.path.join(path, "ascii-spec.txt")
+    if is_valid_pdata_dir(path):
+        if import_mode == "ascii" and os.path.isfile(ascii_path):
+            return [ascii_path]
+        return [path]
+    if os.path.isfile(ascii_path):
+        return [ascii_path]
+    # any other folder: scan it like "Add Directory" does for the import mode
+    found = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted((d for d in dirnames if not d.startswith('.')), key=_natural_key)
+        if import_mode == "pdata":
+            if is_valid_pdata_dir(dirpath):
+                found.append(dirpath)
+        elif "ascii-spec.txt" in filenames:
+            found.append(os.path.join(dirpath, "ascii-spec.txt"))
+    return found
+
+def resolve_datasets(patterns, import_mode="ascii"):
+    """Expand paths/globs into dataset paths, in the order given; also returns unmatched patterns."""
+    found, unmatched = [], []
+    for pattern in patterns:
+        if any(ch in pattern for ch in "*?["):
+            matches = sorted(glob.glob(pattern, recursive=True), key=_natural_key)
+        else:
+            matches = [pattern]
+        hits = [ds for m in matches for ds in _datasets_under(m, import_mode)]
+        if not hits:
+            unmatched.append(pattern)
+        found.extend(hits)
+    # keep the first occurrence of each dataset
+    return list(dict.fromkeys(os.path.normpath(p) for p in found)), unmatched
+
+def group_datasets(datasets, group_by="all"):
+    """Split datasets into figures: "all" (one figure), "each" (one per dataset) or "sample"."""
+    if group_by == "each":
+        return [[ds] for ds in datasets]
+    if group_by == "sample":
+        groups = {}
+        for ds in datasets:
+            groups.setdefault(sample_name(ds), []).append(ds)
+        return list(groups.values())
+    return [list(datasets)] if datasets else []
+
+def output_names(patterns, group, index):
+    """Fill {sample}, {expno}, {procno} (of the group's first dataset) and {index} (1-based)."""
+    expno, procno = parse_expt_proc(group[0])
+    fields = {"sample": sample_name(group[0]), "expno": expno, "procno": procno, "index": index}
+    return [pattern.format(**fields) for pattern in patterns]
+
+def export_format(filename):
+    fmt = os.path.splitext(filename)[1].lstrip(".").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"{filename}: unsupported format (use {', '.join(EXPORT_FORMATS)})")
+    return fmt
+
+def render_task(task):
+    """Load, transform, draw and write one figure; returns {"outputs", "warnings", "elapsed"}.
+
+    Datasets are plotted as if added to the GUI workspace in the order given.
+    Raises ValueError if none of them could be plotted.
+    """
+    t0 = time.perf_counter()
+    settings = task["settings"]
+    x_range = settings.x_range(coupled=task.get("couple_x_limits", True))
+
+    lines, warnings = load_traces(list(reversed(task["datasets"])), settings.load_unit, *x_range)
+    if not lines:
+        raise ValueError("; ".join(["nothing to plot"] + warnings))
+
+    transform_lines_for(lines, settings, normalize=task.get("normalize", True))
+    w_in, h_in, dpi = settings.figure_size()
+
+    outputs = []
+    for filename in task["outputs"]:
+        folder = os.path.dirname(filename)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # a fresh figure per file: simplification/rasterisation edit the artists
+        fig = build_export_figure(settings, lines, w_in, h_in, dpi,
+                                  linecollection_threshold=task.get("linecollection_threshold", 100))
+        outputs.append((filename, write_figure(fig, filename, export_format(filename), dpi,
+                                               **task.get("export", {}))))
+    return {"outputs": outputs, "warnings": warnings, "elapsed": time.perf_counter() - t0}
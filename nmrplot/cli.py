@@ -0,0 +1,156 @@
+"""Headless batch renderer: ``python NMR_Plotter.py render TEMPLATE -d DATA... -o OUT...``
+
+Renders with the Agg backend and never imports tkinter; figures are rendered in
+parallel worker processes.
+"""
+import os
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .preferences import APP_DIR, PREF_FILENAME, DEFAULT_PREFERENCES, read_preferences, safe_float
+from .templates import read_template
+from .settings import PlotSettings
+from .export import format_bytes
+from . import batch
+
+
+def build_parser():
+    p = argparse.ArgumentParser(
+        prog="NMR_Plotter.py render",
+        description="Render figures from a plot template without opening the GUI.",
+        epilog="Output names may use {sample}, {expno}, {procno} and {index} "
+               "(e.g. 'figures/{sample}_{expno}.pdf', '{index:03d}.png'); the format "
+               "is taken from the extension (pdf, svg, png, ps, eps).",
+    )
+    p.add_argument("template", help="template file (key:value lines, as written by Export Template)")
+    p.add_argument("-d", "--data", nargs="+", action="extend", required=True, metavar="PATH",
+                   help="ascii-spec.txt files, pdata/<proc> folders or folders to scan; globs allowed")
+    p.add_argument("-o", "--output", nargs="+", action="extend", required=True, metavar="FILE",
+                   help="output file(s) written for every figure")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("--each", dest="group_by", action="store_const", const="each",
+                       help="one figure per dataset")
+    group.add_argument("--by-sample", dest="group_by", action="store_const", const="sample",
+                       help="one figure per sample folder")
+    p.set_defaults(group_by="all")
+    p.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                   help="worker processes (default: number of CPUs)")
+    p.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                   help="override a template value, e.g. --set mode_var=overlay")
+    p.add_argument("--import-mode", choices=("ascii", "pdata"),
+                   help="read ascii-spec.txt or pdata when both exist (default: preferences)")
+    p.add_argument("--no-normalize", action="store_true", help="skip intensity normalisation")
+    p.add_argument("--simplify", type=float, metavar="PT",
+                   help="simplify traces in vector exports to this tolerance in points")
+    p.add_argument("--rasterize-lines", action="store_true",
+                   help="rasterise spectrum lines in vector exports")
+    p.add_argument("--preferences", default=os.path.join(APP_DIR, PREF_FILENAME), metavar="FILE",
+                   help="preferences file supplying the defaults (default: the app's preferences.txt)")
+    return p
+
+
+def build_tasks(args, prefs):
+    """Template, datasets and outputs → list of batch render tasks. Raises ValueError."""
+    values = read_template(args.template)
+    for item in args.set:
+        key, sep, value = item.partition("=")
+        if not sep or not key:
+            raise ValueError(f"--set expects KEY=VALUE, got {item!r}")
+        values[key] = value
+    settings = PlotSettings.from_values(values)
+
+    import_mode = args.import_mode or prefs["import_mode"]
+    datasets, unmatched = batch.resolve_datasets(args.data, import_mode)
+    for pattern in unmatched:
+        print(f"Warning: no datasets found for {pattern}", file=sys.stderr)
+    groups = batch.group_datasets(datasets, args.group_by)
+    if not groups:
+        raise ValueError("no datasets to plot")
+
+    export = {
+        "simplify_tol_pt": args.simplify if args.simplify is not None else (
+            safe_float(prefs["export_simplify_tol_pt"], 0.1) if prefs["export_simplify"] == "1" else None),
+        "rasterize_lines": args.rasterize_lines or prefs["export_rasterize_lines"] == "1",
+        "tiled_png_mpx": safe_float(prefs["export_tiled_png_mpx"], None),
+    }
+    tasks, seen = [], set()
+    for index, group in enumerate(groups, 1):
+        outputs = batch.output_names(args.output, group, index)
+        for name in outputs:
+            batch.export_format(name)
+            if name in seen:
+                raise ValueError(f"several figures would be written to {name}; "
+                                 "add a placeholder such as {sample} or {index} to the output name")
+            seen.add(name)
+        tasks.append({
+            "settings": settings,
+            "datasets": group,
+            "outputs": outputs,
+            "normalize": not args.no_normalize and prefs["disable_int_norm"] != "1",
+            "couple_x_limits": prefs["couple_x_limits"] == "1",
+            "linecollection_threshold": int(safe_float(prefs["linecollection_threshold"], 100)),
+            "export": export,
+        })
+    return tasks
+
+
+def _report(done, total, task, result):
+    for w in result["warnings"]:
+        print(f"Warning: {w}", file=sys.stderr)
+    files = ", ".join(f"{name} ({format_bytes(info['file_size'])})" for name, info in result["outputs"])
+    print(f"[{done}/{total}] {files}  {len(task['datasets'])} spectra, {result['elapsed']:.2f}s")
+
+
+def run(tasks, jobs):
+    """Render all tasks (in a process pool if jobs > 1); returns the number of failures."""
+    failures = 0
+    total = len(tasks)
+    jobs = max(1, min(jobs, total))
+    if jobs == 1:
+        for done, task in enumerate(tasks, 1):
+            try:
+                _report(done, total, task, batch.render_task(task))
+            except Exception as e:
+                failures += 1
+                print(f"[{done}/{total}] FAILED {', '.join(task['outputs'])}: {e}", file=sys.stderr)
+        return failures
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(batch.render_task, task): task for task in tasks}
+        for done, fut in enumerate(as_completed(futures), 1):
+            task = futures[fut]
+            try:
+                _report(done, total, task, fut.result())
+            except Exception as e:
+                failures += 1
+                print(f"[{done}/{total}] FAILED {', '.join(task['outputs'])}: {e}", file=sys.stderr)
+    return failures
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        prefs = read_preferences(args.preferences, DEFAULT_PREFERENCES)
+    except OSError:
+        prefs = dict(DEFAULT_PREFERENCES)
+    try:
+        tasks = build_tasks(args, prefs)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    t0 = time.perf_counter()
+    jobs = max(1, min(args.jobs, len(tasks)))
+    failures = run(tasks, jobs)
+    n_files = sum(len(t["outputs"]) for t in tasks)
+    print(f"Rendered {len(tasks) - failures}/{len(tasks)} figures ({n_files} files requested) "
+          f"in {time.perf_counter() - t0:.1f}s using {jobs} process{'es' if jobs > 1 else ''}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
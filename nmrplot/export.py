@@ -0,0 +1,307 @@
+"""Figure export: Illustrator-friendly rc settings, vector trace simplification and tiled PNG."""
+import os
+import struct
+import zlib
+
+import numpy as np
+import matplotlib as mpl
+from matplotlib.collections import LineCollection
+
+from . import perf
+
+# Keep text selectable in vector exports. These keys are only read by the PDF/PS/SVG
+# backends, so write_figure() sets them process-wide instead of in an rc_context:
+# rc_context swaps the global rcParams and would race with figures drawn or saved
+# on other threads. (Transparency is turned off per savefig call → fewer masks in AI.)
+EXPORT_RC = {
+    "pdf.fonttype": 42,        # embed TrueType; text stays text
+    "ps.fonttype": 42,
+    "svg.fonttype": "none",    # keep <text> in SVG
+}
+
+def apply_export_rc():
+    for key, value in EXPORT_RC.items():
+        if mpl.rcParams[key] != value:
+            mpl.rcParams[key] = value
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024.0
+
+VECTOR_FORMATS = ("pdf", "svg", "ps", "eps")
+
+def trace_artists(ax):
+    """The spectrum artists of *ax*: Line2D traces and batched LineCollections."""
+    return [*ax.lines, *(c for c in ax.collections if isinstance(c, LineCollection))]
+
+def count_trace_points(ax):
+    n = sum(len(ln.get_xdata()) for ln in ax.lines)
+    for coll in ax.collections:
+        if isinstance(coll, LineCollection):
+            n += sum(len(seg) for seg in coll.get_segments())
+    return n
+
+def disable_path_simplification(ax):
+    """Render every vertex of the traces of *ax* (per path, not via rcParams).
+
+    Agg's path simplifier depends on where a path is clipped, so leaving it on
+    would make tiled and single-buffer PNGs differ slightly.
+    """
+    for ln in ax.lines:
+        ln.get_path().should_simplify = False
+    for coll in ax.collections:
+        for path in coll.get_paths():
+            path.should_simplify = False
+
+def simplify_xy(x, y, to_points, x_lo, x_hi, tol_pt):
+    """Min/max decimation of one trace in page space.
+
+    Points are binned along x in *tol_pt*-wide columns (points, 1/72 in) and each
+    column keeps its first, last, lowest and highest sample, so the drawn envelope
+    moves by less than *tol_pt*. Samples outside [x_lo, x_hi] (data units) are
+    dropped except the one bordering the view, which keeps the clip edge exact.
+    Non-monotonic traces are returned unchanged.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    if n < 4:
+        return x, y
+    dx = np.diff(x)
+    if not (np.all(dx >= 0) or np.all(dx <= 0)):
+        return x, y
+
+    # crop to the visible x-range plus one neighbour on either side
+    vis = np.flatnonzero((x >= x_lo) & (x <= x_hi))
+    if vis.size == 0:
+        return x[:0], y[:0]
+    i0, i1 = max(vis[0] - 1, 0), min(vis[-1] + 1, n - 1)
+    x, y = x[i0:i1 + 1], y[i0:i1 + 1]
+
+    page = to_points(np.column_stack((x, y)))
+    col = np.floor(page[:, 0] / tol_pt).astype(np.int64)
+    if col[0] > col[-1]:
+        col = -col                   # descending page x (inverted axis) → ascending bins
+    starts = np.flatnonzero(np.r_[True, col[1:] != col[:-1]])
+    ends = np.r_[starts[1:] - 1, col.size - 1]
+
+    # per-column argmin/argmax in O(n): first sample equal to the column's extreme
+    py = page[:, 1]
+    seg = np.repeat(np.arange(starts.size), ends - starts + 1)
+
+    def first_where(hit):
+        idx = np.flatnonzero(hit)
+        s_ = seg[idx]
+        return idx[np.r_[True, s_[1:] != s_[:-1]]] if idx.size else idx
+
+    lo_idx = first_where(py == np.minimum.reduceat(py, starts)[seg])
+    hi_idx = first_where(py == np.maximum.reduceat(py, starts)[seg])
+
+    keep = np.unique(np.concatenate((starts, ends, lo_idx, hi_idx)))
+    return x[keep], y[keep]
+
+def simplify_traces(ax, tol_pt):
+    """Simplify every trace artist of a laid-out *ax* for the figure's physical size."""
+    fig = ax.figure
+    pt_per_px = 72.0 / fig.dpi
+    trans = ax.transData
+
+    def to_points(xy):
+        return trans.transform(xy) * pt_per_px
+
+    x_lo, x_hi = sorted(ax.get_xlim())
+    for ln in ax.lines:
+        ln.set_data(*simplify_xy(ln.get_xdata(), ln.get_ydata(), to_points, x_lo, x_hi, tol_pt))
+    for coll in ax.collections:
+        if isinstance(coll, LineCollection):
+            segs = []
+            for seg in coll.get_segments():
+                sx, sy = simplify_xy(seg[:, 0], seg[:, 1], to_points, x_lo, x_hi, tol_pt)
+                segs.append(np.column_stack((sx, sy)))
+            coll.set_segments(segs)
+
+PNG_STRIP_BUDGET_BYTES = 32 * 1024 ** 2   # RGBA bytes rendered per strip in tiled PNG export
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+def _layout_without_full_buffer(fig, dpi):
+    """Run the layout engine and return the tight bbox (inches) using a 1×1 Agg renderer.
+
+    Agg text metrics depend on the DPI only, so this gives the same layout as a
+    full-size draw without allocating a full-size pixel buffer. The layout is
+    then frozen so later partial renders don't redo it against a cropped figure.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg, RendererAgg
+
+    class _MeasureCanvas(FigureCanvasAgg):
+        def get_renderer(self):
+            if getattr(self, "_measure", None) is None:
+                self._measure = RendererAgg(1, 1, self.figure.dpi)
+            return self._measure
+
+    fig.set_dpi(dpi)
+    canvas = _MeasureCanvas(fig)
+    renderer = canvas.get_renderer()
+    engine = fig.get_layout_engine()
+    if engine is not None:
+        engine.execute(fig)
+        fig.set_layout_engine(None)       # no engine at all: savefig then skips its full-size probe draw
+    with renderer._draw_disabled():
+        fig.draw(renderer)             # updates tick positions/labels for the final limits
+    bbox = fig.get_tightbbox(renderer)
+    FigureCanvasAgg(fig)               # back to a normal canvas for the real renders
+    return bbox
+
+class _BufferSink:
+    """File-like target for savefig(format='rgba') that keeps the renderer's buffer without copying it."""
+    view = None
+
+    def write(self, data):
+        self.view = data
+
+    def seek(self, *args):         # matplotlib only accepts seekable file objects
+        return 0
+
+def _strip_overlap_px(fig, dpi):
+    """Rows rendered above/below each strip and thrown away.
+
+    Agg cuts strokes at the buffer edge (changing caps/joins nearby) and culls
+    tick markers whose anchor lies outside it, so every strip is rendered with a
+    margin wider than the largest tick or line extent.
+    """
+    extents_pt = [1.0]
+    for ax in fig.axes:
+        for axis in (ax.xaxis, ax.yaxis):
+            for tick in axis.get_major_ticks()[:1] + axis.get_minor_ticks()[:1]:
+                extents_pt.append(tick.tick1line.get_markersize() + tick.tick1line.get_markeredgewidth())
+        extents_pt += [ln.get_linewidth() for ln in ax.lines]
+        extents_pt += [float(np.max(c.get_linewidth())) for c in ax.collections if np.size(c.get_linewidth())]
+        extents_pt += [sp.get_linewidth() for sp in ax.spines.values()]
+    return int(np.ceil(max(extents_pt) * dpi / 72.0)) + 4
+
+def save_png_tiled(fig, filename, dpi, pad_inches=0.02, on_strip=None,
+                   strip_budget=PNG_STRIP_BUDGET_BYTES):
+    """Write *fig* as an RGBA PNG (bbox_inches='tight') rendered in horizontal strips.
+
+    Each strip is rendered on its own Agg buffer of at most *strip_budget* bytes
+    and streamed through zlib into IDAT chunks, so peak memory is bounded
+    whatever the output size. Strip origins sit an integer number of pixels
+    apart, so the pixels are identical to a single fig.savefig(..., bbox_inches=
+    'tight') render. *on_strip(done, total)* is called after every strip and may
+    raise to abort.
+    """
+    from matplotlib.transforms import Bbox
+
+    bbox = _layout_without_full_buffer(fig, dpi).padded(pad_inches)
+
+    # the same integer pixel grid savefig would use for this bbox
+    x0_px, y0_px = bbox.x0 * dpi, bbox.y0 * dpi
+    width = int(bbox.width * dpi)
+    height = int(bbox.height * dpi)
+    overlap = _strip_overlap_px(fig, dpi)
+    rows_per_strip = max(overlap, min(height, strip_budget // max(1, width * 4) - 2 * overlap))
+    n_strips = -(-height // rows_per_strip)
+    eps = 1e-6                          # guard against float truncation of the strip height
+
+    compressor = zlib.compressobj(6)
+    prev_row = np.zeros(width * 4, dtype=np.uint8)
+
+    with open(filename, "wb") as fh:
+        fh.write(b"\x89PNG\r\n\x1a\n")
+        fh.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+        ppm = int(round(dpi / 0.0254))
+        fh.write(_png_chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1)))
+        fh.write(_png_chunk(b"tEXt", b"Software\0" +
+                            f"Matplotlib version{mpl.__version__}, https://matplotlib.org/".encode("latin-1")))
+
+        for k in range(n_strips):
+            r0 = k * rows_per_strip
+            r1 = min(height, r0 + rows_per_strip)
+            # render rows [e0, e1) (strip plus overlap), keep rows [r0, r1);
+            # image row r covers figure pixels [y0 + height - r - 1, y0 + height - r]
+            e0, e1 = max(0, r0 - overlap), min(height, r1 + overlap)
+            bottom = y0_px + height - e1
+            strip = Bbox.from_extents(x0_px / dpi, bottom / dpi,
+                                      (x0_px + width + eps) / dpi, (bottom + (e1 - e0) + eps) / dpi)
+            sink = _BufferSink()
+            fig.savefig(sink, format="rgba", dpi=dpi, bbox_inches=strip, transparent=False)
+            rgba = np.frombuffer(sink.view, dtype=np.uint8).reshape(e1 - e0, width * 4)
+            rgba = rgba[r0 - e0:r1 - e0]
+
+            # PNG "Up" filter (type 2): byte minus the byte above, mod 256;
+            # filtered in small row blocks so only one extra block is ever alive
+            for b0 in range(0, r1 - r0, 64):
+                block = rgba[b0:b0 + 64]
+                raw = np.empty((block.shape[0], width * 4 + 1), dtype=np.uint8)
+                raw[:, 0] = 2
+                np.subtract(block[0], prev_row, out=raw[0, 1:])
+                np.subtract(block[1:], block[:-1], out=raw[1:, 1:])
+                prev_row = block[-1].copy()
+                data = compressor.compress(raw)
+                if data:
+                    fh.write(_png_chunk(b"IDAT", data))
+            del sink, rgba, raw
+            if on_strip:
+                on_strip(k + 1, n_strips)
+
+        fh.write(_png_chunk(b"IDAT", compressor.flush()))
+        fh.write(_png_chunk(b"IEND", b""))
+    return width, height
+
+@perf.timed("export.write")
+def write_figure(fig, filename, fmt, dpi, simplify_tol_pt=None, rasterize_lines=False,
+                 tiled_png_mpx=None, on_progress=None):
+    """Write a drawn *fig* to *filename* with the export rc settings.
+
+    Vector formats can have their traces simplified to *simplify_tol_pt* and/or
+    rasterised; PNGs of at least *tiled_png_mpx* megapixels are written in strips.
+    The file is written next to *filename* first and moved into place at the end,
+    so a failed or aborted export never clobbers an existing figure.
+    *on_progress(stage, percent)* is called between steps and may raise to abort.
+    Returns {"points_before", "points_after", "tiled", "file_size"}.
+    """
+    def progress(stage, pct):
+        if on_progress:
+            on_progress(stage, pct)
+
+    ax = fig.axes[0]
+    result = {"tiled": False, "file_size": None}
+    result["points_before"] = result["points_after"] = count_trace_points(ax)
+    if fmt in VECTOR_FORMATS and (simplify_tol_pt or rasterize_lines):
+        tol_pt = simplify_tol_pt
+        if rasterize_lines:
+            # rasterised lines cannot show detail finer than half a device pixel
+            tol_pt = max(tol_pt or 0.0, 0.5 * 72.0 / dpi)
+            for art in trace_artists(ax):
+                art.set_rasterized(True)
+        progress("Simplifying traces", 25)
+        fig.draw_without_rendering()      # final layout, so data→page transforms are exact
+        simplify_traces(ax, tol_pt)
+        result["points_after"] = count_trace_points(ax)
+
+    progress("Rendering and writing", 40)
+    tmp = filename + ".part"
+    w_in, h_in = fig.get_size_inches()
+    mpx = w_in * h_in * dpi ** 2 / 1e6
+    result["tiled"] = (fmt == "png" and tiled_png_mpx is not None and mpx >= tiled_png_mpx)
+    apply_export_rc()
+    if fmt == "png":
+        disable_path_simplification(ax)
+    try:
+        if result["tiled"]:
+            def on_strip(done, total):
+                progress(f"Writing strip {done}/{total}", 40 + int(60 * done / total))
+            save_png_tiled(fig, tmp, dpi, pad_inches=0.02, on_strip=on_strip)
+        else:
+            fig.savefig(tmp, format=fmt, dpi=dpi, bbox_inches='tight', pad_inches=0.02,
+                        transparent=False)
+        progress("Finishing", 100)
+        result["file_size"] = os.path.getsize(tmp)
+        os.replace(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return result
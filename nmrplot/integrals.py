@@ -0,0 +1,189 @@
+"""Region integrals from a cumulative integral: any region is two lookups.
+
+Needs numpy only. The trapezoid cumulative integral of a spectrum is computed
+once per dataset and unit and cached; a region's integral is then the
+difference of the cumulative integral at its two ends, each found with
+searchsorted and interpolated within its sample interval:
+
+    regions = parse_regions("7.4-7.2, 3.3-3.1")
+    cum = cache.cumulative(path, "ppm", x, y)      # or cumulative_integral(x, y)
+    values = integrate(cum, regions)
+    rows, problems = integral_table(paths, "ppm", regions, load, cache)
+
+Integrals are taken over ascending x, so positive peaks integrate positive on
+ppm axes (which run high → low) too.
+"""
+import csv
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .memory import _data_mtime
+
+REGION_UNITS = ("ppm", "Hz")
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_REGION = re.compile(rf"^\s*({_NUMBER})\s*(?:\.\.|to|–|-|:)\s*({_NUMBER})\s*$")
+
+
+def parse_regions(text):
+    """[(lo, hi), ...] from e.g. '7.4-7.2, 3.3 to 3.1; -0.5..-1' (either end first).
+
+    Raises ValueError naming the first item that is not a range.
+    """
+    regions = []
+    for item in re.split(r"[,;\n]", text or ""):
+        if not item.strip():
+            continue
+        m = _REGION.match(item)
+        if m is None:
+            raise ValueError(f"Not a region: '{item.strip()}' (write e.g. 7.4-7.2)")
+        a, b = float(m.group(1)), float(m.group(2))
+        if a == b:
+            raise ValueError(f"Empty region: '{item.strip()}'")
+        regions.append((min(a, b), max(a, b)))
+    return regions
+
+def format_region(region, unit):
+    lo, hi = region
+    return f"{hi:g}–{lo:g} {unit}"
+
+def _ascending(x, y):
+    """x and y as float arrays with x ascending: views of the inputs where possible."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(x) > 1 and x[0] > x[-1]:
+        x, y = x[::-1], y[::-1]
+    return x, y
+
+def cumulative_integral(x, y):
+    """(x, y, c) with x ascending and c[i] the trapezoid integral of y from x[0] to x[i].
+
+    x and y are views of the inputs when those already are float arrays, reversed if x descends.
+    """
+    x, y = _ascending(x, y)
+    c = np.empty(len(x))
+    c[:1] = 0.0
+    np.cumsum(0.5 * (y[1:] + y[:-1]) * np.diff(x), out=c[1:])
+    return x, y, c
+
+def cumulative_at(cum, at):
+    """The cumulative integral at the points *at*, interpolating y linearly inside a sample interval.
+
+    Points outside the trace are clipped to its ends.
+    """
+    x, y, c = cum
+    at = np.clip(np.asarray(at, dtype=float), x[0], x[-1])
+    i = np.clip(np.searchsorted(x, at, side="right") - 1, 0, len(x) - 2)
+    dx = at - x[i]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(x[i + 1] > x[i], (y[i + 1] - y[i]) / (x[i + 1] - x[i]), 0.0)
+    return c[i] + dx * (y[i] + 0.5 * slope * dx)
+
+def integrate(cum, regions):
+    """Integral over each (lo, hi) of *regions*, as an array; 0 where a region misses the trace."""
+    if len(regions) == 0 or len(cum[0]) < 2:
+        return np.zeros(len(regions))
+    ends = np.asarray(regions, dtype=float)
+    return cumulative_at(cum, ends[:, 1]) - cumulative_at(cum, ends[:, 0])
+
+def integral_table(paths, x_unit, regions, load, cache=None, cancelled=None):
+    """([(path, integrals)], problems) for each of *paths*, loaded by *load(path, x_unit)* -> (x, y).
+
+    A dataset that cannot be loaded is reported in *problems* and left out.
+    *cancelled()*, if given, is checked between datasets.
+    """
+    rows, problems = [], []
+    for path in paths:
+        if cancelled and cancelled():
+            break
+        try:
+            x, y = load(path, x_unit)
+        except (OSError, ValueError, ImportError) as e:
+            problems.append(f"{path}: {e}")
+            continue
+        cum = cache.cumulative(path, x_unit, x, y) if cache is not None else cumulative_integral(x, y)
+        rows.append((path, integrate(cum, regions)))
+    return rows, problems
+
+def relative_integrals(values):
+    """*values* divided by the first region's integral (NaN where that is 0)."""
+    values = np.asarray(values, dtype=float)
+    ref = values[0] if len(values) else 0.0
+    return values / ref if ref else np.full(len(values), np.nan)
+
+def write_integrals_csv(filename, x_unit, regions, rows):
+    """Write one line per (name, path, integrals) of *rows*: absolute, then relative to the first region."""
+    names = [format_region(r, x_unit) for r in regions]
+    with open(filename, "w", newline="", encoding="utf-8") as fh:
+        out = csv.writer(fh)
+        out.writerow(["dataset", "path", *names, *(f"{n} (relative)" for n in names)])
+        for name, path, values in rows:
+            out.writerow([name, path, *(f"{v:.8g}" for v in values),
+                          *(f"{v:.6g}" for v in relative_integrals(values))])
+
+
+class IntegralCache:
+    """Thread-safe LRU of cumulative integrals keyed by (path, unit), held to a byte budget.
+
+    Only the cumulative array is kept: x and y are the caller's spectrum (as
+    held by memory.SpectrumCache), so they are neither counted twice nor kept
+    alive here. Entries are checked against the data file's mtime, like
+    memory.SpectrumCache.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()     # (path, unit) -> (mtime, c)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cumulative(self, path, x_unit, x, y):
+        """Cumulative integral (x, y, c) of the spectrum (x, y) loaded from *path* in *x_unit*."""
+        key = (path, x_unit)
+        try:
+            mtime = _data_mtime(path)
+        except OSError:
+            mtime = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime and len(entry[1]) == len(x):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return (*_ascending(x, y), entry[1])
+            self.misses += 1
+        cum = cumulative_integral(x, y)
+        c = cum[2]
+        if mtime is not None and c.nbytes <= self.max_bytes:
+            with self._lock:
+                self._drop(key)
+                self._entries[key] = (mtime, c)
+                self.nbytes += c.nbytes
+                self._evict_to(self.max_bytes)
+        return cum
+
+    def evict_to(self, max_bytes):
+        """Drop least recently used entries until at most *max_bytes* are cached; returns bytes freed."""
+        with self._lock:
+            return self._evict_to(max_bytes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1].nbytes
+
+    def _evict_to(self, max_bytes):
+        before = self.nbytes
+        while self._entries and self.nbytes > max_bytes:
+            self._drop(next(iter(self._entries)))
+        return before - self.nbytes
@@ -0,0 +1,169 @@
+"""Reading spectra: ascii-spec.txt exports and Bruker pdata/<proc> dirs, as (x, y) arrays.
+
+pandas and nmrglue are imported on first use, so importing this module stays cheap.
+"""
+import os
+import importlib.util
+
+import numpy as np
+
+from . import perf
+from .scan import is_valid_pdata_dir
+from .arithmetic import is_derived, derived_label, compute_derived
+
+HAS_NMRGLUE = importlib.util.find_spec("nmrglue") is not None
+
+
+def as_float(val):
+    """Coerce Bruker/nmrglue values (which can be arrays/strings) to a float, or None."""
+    try:
+        if isinstance(val, (list, tuple, np.ndarray)):
+            val = np.asarray(val).ravel()[0]
+        return float(val)
+    except Exception:
+        return None
+
+def load_bruker_pdata(pdata_dir: str, x_unit: str):
+    """
+    Version-proof Bruker pdata loader: returns (x, y) as 1-D float arrays.
+    X built from procs: OFFSET (ppm at leftmost point), SW (hz width), SF (MHz).
+    """
+    if not HAS_NMRGLUE:
+        raise ImportError("nmrglue is not installed; cannot read Bruker pdata.")
+    import nmrglue as ng
+
+    dic, data = ng.bruker.read_pdata(pdata_dir)  # dic contains 'procs' and 'acqus'
+    y = np.asarray(data, dtype=float).squeeze().ravel()
+    npts = y.size
+
+    procs = dic.get("procs", {})
+    acqus = dic.get("acqus", {})
+
+    offset_ppm = as_float(procs.get("OFFSET"))      # ppm at leftmost point
+    sw_hz      = as_float(procs.get("SW_p"))        # Hz in procs
+    sf_mhz     = as_float(procs.get("SF"))          # spectrometer frequency in MHz
+
+    # Fallbacks if needed
+    if sw_hz is None:
+        sw_hz = as_float(acqus.get("SW_h"))         # Hz from acqus
+    if sf_mhz in (None, 0.0):
+        # last resort: try from acqus
+        sf_mhz = as_float(acqus.get("SFO1")) or as_float(acqus.get("SF"))
+
+    npts = max(int(npts), 1)
+
+    # Build X axis
+    if (x_unit == "ppm") and (offset_ppm is not None) and (sw_hz is not None) and (sf_mhz not in (None, 0.0)) and (npts > 1):
+        sw_ppm  = sw_hz / sf_mhz            # 1 ppm = SF_MHz Hz  → ppm = Hz / SF_MHz
+        step_ppm = sw_ppm / (npts - 1)      # ensure total span == sw_ppm
+        x = offset_ppm - np.arange(npts, dtype=float) * step_ppm
+    else:
+        # Build in Hz then convert (or fall back to index if params missing)
+        if (offset_ppm is not None) and (sw_hz is not None) and (sf_mhz not in (None, 0.0)) and (npts > 1):
+            offset_hz = offset_ppm * sf_mhz
+            step_hz   = sw_hz / (npts - 1)
+            x_hz = offset_hz - np.arange(npts, dtype=float) * step_hz
+        else:
+            x_hz = np.arange(npts, dtype=float)
+
+        if x_unit == "kHz":
+            x = x_hz / 1000.0
+        elif x_unit == "Hz":
+            x = x_hz
+        else:  # asked for ppm but we lack params; safest fallback: show Hz axis
+            x = x_hz
+
+    x = np.asarray(x, dtype=float).ravel()
+    return x, y
+
+def load_ascii_spec(path: str, x_unit: str):
+    """Read a TopSpin convbin2asc export; returns (x, y) as 1-D float arrays."""
+    import pandas as pd
+
+    df = pd.read_csv(path, skiprows=1)
+    if x_unit == "ppm":
+        x_col = 3
+    elif x_unit in ("Hz", "kHz"):
+        x_col = 2
+    else:
+        x_col = 3
+    x_data = df.iloc[:, x_col].to_numpy(dtype=float)
+    y_data = df.iloc[:, 1].to_numpy(dtype=float)
+    if x_unit == "kHz":
+        x_data = x_data / 1000.0
+    return x_data, y_data
+
+@perf.timed("load")
+def load_spectrum(path: str, x_unit: str):
+    """Load a workspace entry by its path (not by preferences): pdata/<proc> dir, ascii-spec.txt
+    or a derived trace (arithmetic.derived_path).
+
+    Raises ImportError for pdata without nmrglue and ValueError for anything else.
+    """
+    if is_derived(path):
+        return compute_derived(path, x_unit, load_spectrum)
+    if is_valid_pdata_dir(path):
+        return load_bruker_pdata(path, x_unit)
+    if path.endswith("ascii-spec.txt"):
+        return load_ascii_spec(path, x_unit)
+    raise ValueError(f"Unrecognized dataset: {os.path.basename(path)}")
+
+def load_dataset(path, x_unit, cache=None):
+    """load_spectrum() through a memory.SpectrumCache, if given.
+
+    A derived trace is cached as a whole and reads its inputs through the
+    cache too, so it is recomputed only when one of its input files changes.
+    """
+    if cache is None:
+        return load_spectrum(path, x_unit)
+    if is_derived(path):
+        return cache.get_or_load(path, x_unit, lambda p, u: compute_derived(
+            p, u, lambda q, v: load_dataset(q, v, cache)))
+    return cache.get_or_load(path, x_unit, load_spectrum)
+
+@perf.timed("mask")
+def crop_x_range(x_data, y_data, xmin=None, xmax=None):
+    """Keep the points inside [xmin, xmax] (either order; None or blank = data extent).
+
+    Returns (x, y), or None if no point falls inside the range.
+    """
+    xmin = float(np.nanmin(x_data)) if xmin in (None, "") else float(xmin)
+    xmax = float(np.nanmax(x_data)) if xmax in (None, "") else float(xmax)
+    lo, hi = (xmin, xmax) if xmin <= xmax else (xmax, xmin)
+    mask = (x_data >= lo) & (x_data <= hi)
+    if not np.any(mask):
+        return None
+    return x_data[mask], y_data[mask]
+
+def load_traces(paths, x_unit, xmin=None, xmax=None, cancelled=None, cache=None, sources=None):
+    """Load and crop every dataset in *paths*, skipping the ones that fail.
+
+    Returns (lines, problems): [x, y] pairs in the order of *paths*, and one
+    message per skipped dataset. *cancelled*, if given, is called before each
+    dataset; when it returns True loading stops and the partial result is returned.
+    With a memory.SpectrumCache as *cache*, spectra are read through it. If
+    *sources* is a list, the path of each returned trace is appended to it.
+    """
+    lines, problems = [], []
+    for path in paths:
+        if cancelled is not None and cancelled():
+            break
+        name = derived_label(path) if is_derived(path) else os.path.basename(path)
+        if not (is_derived(path) or is_valid_pdata_dir(path) or path.endswith("ascii-spec.txt")):
+            problems.append(f"Unrecognized dataset: {name}")
+            continue
+        try:
+            x_data, y_data = load_dataset(path, x_unit, cache)
+            cropped = crop_x_range(x_data, y_data, xmin, xmax)
+        except Exception as e:
+            problems.append(f"Failed to load: {name}  ({e})")
+            continue
+        if cropped is None:
+            lo = "" if xmin is None else xmin
+            hi = "" if xmax is None else xmax
+            problems.append(f"No points in range [{lo}, {hi}] for {name}; check X limits.")
+            continue
+        lines.append(list(cropped))
+        if sources is not None:
+            sources.append(path)
+    return lines, problems
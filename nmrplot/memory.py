@@ -0,0 +1,208 @@
+"""Memory accounting, the spectrum load cache, and min/max decimation for a memory budget.
+
+Needs numpy only; figures are inspected through their artists, so matplotlib
+is not imported here.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .arithmetic import is_derived, parse_derived
+
+
+# ---------------------------------------------------------------------------
+#  Accounting
+# ---------------------------------------------------------------------------
+def lines_nbytes(lines):
+    """Bytes held by the arrays of [x, y] traces."""
+    return sum(np.asarray(a).nbytes for line in lines or () for a in line[:2])
+
+def figure_nbytes(fig):
+    """Bytes held by a figure's trace vertices and its Agg buffer (0 for None)."""
+    if fig is None:
+        return 0
+    n = 0
+    for ax in fig.axes:
+        for line in ax.lines:
+            n += line.get_path().vertices.nbytes
+        for coll in ax.collections:
+            n += sum(p.vertices.nbytes for p in coll.get_paths())
+        for image in ax.images:
+            n += image.get_array().nbytes
+    renderer = getattr(fig.canvas, "renderer", None)
+    if renderer is not None:
+        n += int(renderer.width) * int(renderer.height) * 4      # RGBA buffer
+    return n
+
+
+# ---------------------------------------------------------------------------
+#  Decimation
+# ---------------------------------------------------------------------------
+def decimate_minmax(x, y, max_points):
+    """At most *max_points* of (x, y), keeping each bin's lowest and highest point in x order.
+
+    Bins are equal runs of samples, so peaks and the noise envelope survive at
+    any plot width below max_points / 2 pixels. Short traces are returned as is.
+    """
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return x, y
+    bins = max_points // 2
+    width = -(-n // bins)
+    # pad the tail with its last value so the samples fold into a (bins, width) block
+    block = np.pad(y, (0, bins * width - n), mode="edge").reshape(bins, width)
+    start = np.arange(bins) * width
+    lo = np.minimum(start + block.argmin(axis=1), n - 1)
+    hi = np.minimum(start + block.argmax(axis=1), n - 1)
+    keep = np.unique(np.concatenate((lo, hi, [0, n - 1])))
+    return x[keep], y[keep]
+
+def decimate_lines(lines, max_points):
+    return [list(decimate_minmax(x, y, max_points)) for x, y in lines]
+
+
+# ---------------------------------------------------------------------------
+#  Spectrum load cache
+# ---------------------------------------------------------------------------
+def _data_mtime(path):
+    """mtime of the file that holds the data: ascii-spec.txt itself, or pdata/<proc>/1r.
+
+    For a derived trace, the mtimes of all its inputs.
+    """
+    if is_derived(path):
+        return tuple(_data_mtime(p) for p in parse_derived(path)[2])
+    target = os.path.join(path, "1r") if os.path.isdir(path) else path
+    return os.stat(target).st_mtime_ns
+
+class SpectrumCache:
+    """Thread-safe LRU of raw (x, y) spectra keyed by (path, x_unit), held to a byte budget.
+
+    Entries are checked against the data file's mtime, so an edited or
+    reprocessed spectrum is read again. Cached arrays are read-only; cropping
+    (boolean indexing) copies them before anything is modified.
+
+    *on_load(path, x_unit, x, y)*, if set, is called on the loading thread
+    after every read from disk (e.g. stats.StatsIndex.record).
+    """
+
+    def __init__(self, max_bytes=512 * 2**20, on_load=None):
+        self.max_bytes = max_bytes
+        self.on_load = on_load
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        # read-ahead bookkeeping: spectra put with prefetched=True, and how many were used
+        self.prefetched = self.prefetch_hits = 0
+        self._unused_prefetch = set()
+        self._entries = OrderedDict()     # (path, unit) -> (mtime, x, y)
+        self._loading = {}                # (path, unit) -> Event set when its load ends
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path, x_unit):
+        key = (path, x_unit)
+        try:
+            mtime = _data_mtime(path)
+        except OSError:
+            mtime = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != mtime:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if key in self._unused_prefetch:
+                self._unused_prefetch.discard(key)
+                self.prefetch_hits += 1
+            return entry[1], entry[2]
+
+    @property
+    def prefetch_hit_rate(self):
+        """Share of prefetched spectra that were asked for before being evicted (None if none yet)."""
+        return self.prefetch_hits / self.prefetched if self.prefetched else None
+
+    def put(self, path, x_unit, x, y, prefetched=False):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        size = x.nbytes + y.nbytes
+        if size > self.max_bytes:
+            return
+        try:
+            mtime = _data_mtime(path)
+        except OSError:
+            return
+        x.flags.writeable = y.flags.writeable = False
+        with self._lock:
+            self._drop((path, x_unit))
+            self._entries[(path, x_unit)] = (mtime, x, y)
+            self.nbytes += size
+            if prefetched:
+                self._unused_prefetch.add((path, x_unit))
+                self.prefetched += 1
+            self._evict_to(self.max_bytes)
+
+    def get_or_load(self, path, x_unit, loader, prefetched=False):
+        """Cached (x, y), or loader(path, x_unit) stored on the way out.
+
+        A spectrum that another thread is already loading is waited for, not
+        read twice (e.g. a plot asking for what a prefetch is reading).
+        """
+        key = (path, x_unit)
+        while True:
+            hit = self.get(path, x_unit)
+            if hit is not None:
+                return hit
+            with self._lock:
+                other = self._loading.get(key)
+                if other is None:
+                    self._loading[key] = done = threading.Event()
+                    break
+            other.wait()            # then take it from the cache (or load it, if that failed)
+        try:
+            x, y = loader(path, x_unit)
+            self.put(path, x_unit, x, y, prefetched)
+            if self.on_load is not None:
+                self.on_load(path, x_unit, x, y)
+            return x, y
+        finally:
+            with self._lock:
+                del self._loading[key]
+            done.set()
+
+    def contains(self, path, x_unit):
+        return (path, x_unit) in self._entries
+
+    def discard(self, paths):
+        """Forget every unit of each of *paths*."""
+        paths = set(paths)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] in paths]:
+                self._drop(key)
+
+    def evict_to(self, max_bytes):
+        """Drop least recently used spectra until at most *max_bytes* are cached; returns bytes freed."""
+        with self._lock:
+            return self._evict_to(max_bytes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._unused_prefetch.clear()
+            self.nbytes = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        self._unused_prefetch.discard(key)
+        if entry is not None:
+            self.nbytes -= entry[1].nbytes + entry[2].nbytes
+
+    def _evict_to(self, max_bytes):
+        before = self.nbytes
+        while self._entries and self.nbytes > max_bytes:
+            self._drop(next(iter(self._entries)))
+        return before - self.nbytes
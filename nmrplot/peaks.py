@@ -0,0 +1,121 @@
+"""Peak picking: a robust noise threshold, a minimum separation and parabolic refinement.
+
+Needs numpy only. Peaks are picked on the loaded, cropped traces (before
+normalisation and offsets), so positions do not depend on the plot layout and
+results can be cached per dataset, x-range and parameters:
+
+    params = PeakParams(threshold_sigma=8, min_separation=0.02)
+    peaks = cache.pick(path, x_unit, x_range, x, y, params)   # or pick_peaks(x, y, params)
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from .memory import _data_mtime
+
+MAD_TO_SIGMA = 1.4826       # MAD of normal noise × this = its standard deviation
+NOISE_SAMPLES = 1 << 16     # the robust statistics use an evenly strided subset of this size
+NEIGHBOURHOOD = 4           # with a minimum separation, peaks must top this many samples each side
+
+
+@dataclass(frozen=True, slots=True)
+class PeakParams:
+    threshold_sigma: float = 8.0    # peaks must rise this many noise sigmas above the median
+    min_separation: float = 0.0     # x-units; of two closer peaks only the taller is kept
+    interpolate: bool = True        # refine position and height on the parabola through 3 points
+
+
+def noise_sigma(y):
+    """Noise standard deviation from the MAD of first differences.
+
+    Differences cancel a slow baseline, and the median ignores the few large
+    steps at peaks; the difference of two noise samples has sqrt(2) times the
+    noise sigma.
+    """
+    d = np.diff(y)[::max(1, (len(y) - 1) // NOISE_SAMPLES)]
+    return MAD_TO_SIGMA * float(np.median(np.abs(d - np.median(d)))) / np.sqrt(2.0)
+
+def pick_peaks(x, y, params=PeakParams()):
+    """Peaks of one trace as {'index', 'x', 'height'} arrays in x order, plus 'sigma' and 'level'.
+
+    A peak is a local maximum above median(y) + threshold_sigma × noise.
+    Minimum separation is enforced greedily from the tallest peak down.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    sigma = noise_sigma(y) if y.size > 2 else 0.0
+    level = float(np.median(y[::max(1, len(y) // NOISE_SAMPLES)])) + params.threshold_sigma * sigma
+    n = len(y)
+    reach = 1
+    if params.min_separation > 0 and n > 1:
+        # noise on a peak's flanks makes many local maxima; ones that a taller sample
+        # within the separation beats are dropped here, before the greedy pass
+        step = abs(x[-1] - x[0]) / (n - 1)
+        reach = int(max(1, min(NEIGHBOURHOOD, params.min_separation // step if step else 1)))
+    mid = y[reach:n - reach]
+    peak = mid > level
+    for k in range(1, reach + 1):
+        peak &= (mid > y[reach - k:n - reach - k]) & (mid >= y[reach + k:n - reach + k])
+    idx = np.flatnonzero(peak) + reach
+    if idx.size > 1 and params.min_separation > 0:
+        idx = _separate(x, y, idx, params.min_separation)
+    pos, height = x[idx], y[idx]
+    if params.interpolate and idx.size:
+        a, b, c = y[idx - 1], y[idx], y[idx + 1]
+        curve = a - 2.0 * b + c
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shift = np.where(curve < 0, 0.5 * (a - c) / curve, 0.0)   # in samples, within ±0.5
+        pos = pos + shift * (x[idx + 1] - x[idx - 1]) / 2.0
+        height = b - 0.25 * (a - c) * shift
+    return {"index": idx, "x": pos, "height": height, "sigma": sigma, "level": level}
+
+def _separate(x, y, idx, min_separation):
+    """Keep the tallest of *idx*, drop candidates within *min_separation* of it, repeat."""
+    cand_x = x[idx]
+    sx = -cand_x if cand_x[0] > cand_x[-1] else cand_x   # ascending, for searchsorted
+    # each candidate's reach: [lo, hi) of the neighbours within min_separation, in one batch
+    lo = np.searchsorted(sx, sx - min_separation, side="left")
+    hi = np.searchsorted(sx, sx + min_separation, side="right")
+    alive = np.ones(idx.size, dtype=bool)
+    for i in np.argsort(y[idx], kind="stable")[::-1]:     # tallest first
+        if alive[i]:
+            alive[lo[i]:hi[i]] = False
+            alive[i] = True
+    return idx[alive]
+
+
+class PeakCache:
+    """Thread-safe LRU of pick_peaks() results keyed by (path, unit, x-range, params).
+
+    Entries are checked against the data file's mtime, like memory.SpectrumCache.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pick(self, path, x_unit, x_range, x, y, params=PeakParams()):
+        """Peaks of the trace (x, y) loaded from *path* and cropped to *x_range*."""
+        key = (path, x_unit, tuple(x_range), params)
+        try:
+            mtime = _data_mtime(path)
+        except OSError:
+            mtime = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        peaks = pick_peaks(x, y, params)
+        if mtime is not None:
+            with self._lock:
+                self._entries[key] = (mtime, peaks)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return peaks
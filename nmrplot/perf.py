@@ -0,0 +1,158 @@
+"""Stage timing: spans, rolling statistics and Chrome trace export (stdlib only).
+
+    from nmrplot import perf
+    perf.enable()
+    with perf.span("load"):
+        ...
+    @perf.timed("transform")
+    def transform(...): ...
+
+Recording is off by default. While it is off, span() returns a shared no-op
+context manager and timed() wrappers make one global check before calling the
+function, so instrumented code runs at full speed. While it is on, each stage
+keeps its last ROLLING_WINDOW durations (for summary() and histogram()), and
+the last MAX_EVENTS spans are kept for export_chrome_trace().
+"""
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+
+ROLLING_WINDOW = 500            # durations kept per stage
+MAX_EVENTS = 50_000             # spans kept for the Chrome trace
+
+_enabled = False
+_durations: dict[str, deque] = {}
+_events: deque = deque(maxlen=MAX_EVENTS)
+_lock = threading.Lock()        # guards creating per-stage deques; appends are atomic
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    with _lock:
+        _durations.clear()
+        _events.clear()
+
+
+def record(name, start_ns, end_ns):
+    """Add one span (perf_counter_ns timestamps) to the statistics and the trace."""
+    window = _durations.get(name)
+    if window is None:
+        with _lock:
+            window = _durations.setdefault(name, deque(maxlen=ROLLING_WINDOW))
+    window.append((end_ns - start_ns) / 1e6)
+    _events.append((name, start_ns, end_ns, threading.get_ident()))
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def span(name):
+    """Context manager timing its block as stage *name* (a no-op while disabled)."""
+    return _Span(name) if _enabled else _NO_SPAN
+
+def timed(name):
+    """Decorator timing every call of the function as stage *name*."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, start, time.perf_counter_ns())
+        return wrapper
+    return decorate
+
+
+def _percentile(sorted_ms, q):
+    if not sorted_ms:
+        return 0.0
+    k = min(len(sorted_ms) - 1, max(0, round(q * (len(sorted_ms) - 1))))
+    return sorted_ms[k]
+
+def summary():
+    """[{stage, count, mean, p50, p90, p99, max}] (ms) over each stage's rolling window."""
+    rows = []
+    for name, window in sorted(_durations.items()):
+        values = sorted(window)
+        if not values:
+            continue
+        rows.append({
+            "stage": name,
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": _percentile(values, 0.50),
+            "p90": _percentile(values, 0.90),
+            "p99": _percentile(values, 0.99),
+            "max": values[-1],
+        })
+    return rows
+
+# histogram bucket upper edges in ms, roughly ×2.5 apart
+HISTOGRAM_EDGES_MS = (0.1, 0.25, 1, 2.5, 10, 25, 100, 250, 1000, 2500, float("inf"))
+
+def histogram(name):
+    """Counts of the stage's rolling durations per HISTOGRAM_EDGES_MS bucket."""
+    counts = [0] * len(HISTOGRAM_EDGES_MS)
+    for ms in list(_durations.get(name, ())):
+        for i, edge in enumerate(HISTOGRAM_EDGES_MS):
+            if ms <= edge:
+                counts[i] += 1
+                break
+    return counts
+
+
+def chrome_trace():
+    """The recorded spans as a Chrome trace-event dict (load in chrome://tracing or Perfetto)."""
+    pid = os.getpid()
+    threads = {}
+    events = []
+    for name, start_ns, end_ns, ident in list(_events):
+        tid = threads.setdefault(ident, len(threads) + 1)
+        events.append({"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                       "ts": start_ns / 1e3, "dur": (end_ns - start_ns) / 1e3})
+    main = threading.main_thread().ident
+    for ident, tid in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                       "args": {"name": "main" if ident == main else f"worker {tid}"}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def export_chrome_trace(path):
+    """Write chrome_trace() to *path*; returns the number of spans written."""
+    trace = chrome_trace()
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(trace, fh)
+    return sum(1 for e in trace["traceEvents"] if e["ph"] == "X")
@@ -0,0 +1,43 @@
+"""preferences.txt (key=value lines) shared by the GUI and the batch renderer."""
+import os
+
+PREF_FILENAME = "preferences.txt"
+
+# app folder (the one holding NMR_Plotter.py and preferences.txt)
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Plotting/export preferences; the GUI adds its folder preferences on top
+DEFAULT_PREFERENCES = {
+    "couple_x_limits": "1",
+    "disable_int_norm": "0",
+    "import_mode": "ascii",
+    "export_use_fixed_size": "1",  # "1" = export uses fixed W/H/DPI; "0" = WYSIWYG
+    "linecollection_threshold": "100",  # draw traces as one LineCollection above this count
+    "export_simplify": "0",             # "1" = drop sub-tolerance detail from traces in PDF/SVG
+    "export_simplify_tol_pt": "0.1",    # simplification tolerance in points (1/72 in)
+    "export_rasterize_lines": "0",      # "1" = rasterise trace artists in PDF/SVG (axes/text stay vector)
+    "export_tiled_png_mpx": "40",       # PNG exports at/above this many megapixels are written in strips
+    "export_threads": "2",              # queued GUI exports rendered at the same time
+}
+
+
+def safe_float(text, default=None):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return default
+
+
+def read_preferences(path, defaults):
+    """Return *defaults* updated with the known keys found in the file at *path*.
+
+    Raises OSError if the file cannot be read.
+    """
+    preferences = dict(defaults)
+    with open(path, "r") as f:
+        for line in f:
+            if "=" in line:
+                key, value = line.strip().split("=", 1)
+                if key in preferences:
+                    preferences[key] = value
+    return preferences
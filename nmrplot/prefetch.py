@@ -0,0 +1,74 @@
+"""Background reads of spectra into a memory.SpectrumCache, by priority, cancellable per path.
+
+    prefetcher = Prefetcher(cache, load_spectrum)
+    prefetcher.submit(paths, "ppm")            # read ahead, in order
+    prefetcher.cancel(removed_paths)           # or cancel() for everything
+
+Lower priority numbers are read first. A request whose spectrum is already
+cached, or that was cancelled before its turn, is skipped, and nothing is read
+while the cache is at its byte budget (reading would only evict other spectra).
+"""
+import queue
+import itertools
+import threading
+
+
+class Prefetcher:
+    def __init__(self, cache, loader, threads=1, on_done=None):
+        """*loader(path, x_unit)* returns (x, y); *on_done(path, x_unit, error)* runs on the worker."""
+        self.cache = cache
+        self.loader = loader
+        self.on_done = on_done
+        self.loaded = self.failed = self.skipped = 0
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._wanted = {}                  # (path, unit) -> (priority, order) of its live request
+        self._lock = threading.Lock()
+        for _ in range(max(1, threads)):
+            threading.Thread(target=self._run, name="prefetch", daemon=True).start()
+
+    def submit(self, paths, x_unit, priority=0):
+        """Queue *paths* for reading in *x_unit*; a path already queued keeps the better priority."""
+        with self._lock:
+            for path in paths:
+                key = (path, x_unit)
+                if key in self._wanted and self._wanted[key][0] <= priority:
+                    continue
+                # a re-submitted path moves to its new place; its old queue entry goes stale
+                self._wanted[key] = request = (priority, next(self._order))
+                self._queue.put((*request, key))
+
+    def cancel(self, paths=None, priority=None):
+        """Forget queued requests for *paths* (all paths if None), optionally only of one *priority*."""
+        with self._lock:
+            paths = None if paths is None else set(paths)
+            for key, (prio, _) in list(self._wanted.items()):
+                if (paths is None or key[0] in paths) and (priority is None or prio == priority):
+                    del self._wanted[key]
+
+    def pending(self, priority=None):
+        with self._lock:
+            return sum(1 for p, _ in self._wanted.values() if priority is None or p == priority)
+
+    def _run(self):
+        while True:
+            priority, order, key = self._queue.get()
+            request = (priority, order)
+            with self._lock:
+                if self._wanted.get(key) != request:
+                    continue                # cancelled, or re-queued since
+            error = None
+            if self.cache.contains(*key) or self.cache.nbytes >= self.cache.max_bytes:
+                self.skipped += 1
+            else:
+                try:
+                    self.cache.get_or_load(key[0], key[1], self.loader, prefetched=True)
+                    self.loaded += 1
+                except Exception as e:
+                    self.failed += 1
+                    error = e
+            with self._lock:
+                if self._wanted.get(key) == request:
+                    del self._wanted[key]
+            if self.on_done is not None:
+                self.on_done(key[0], key[1], error)
@@ -0,0 +1,96 @@
+"""Dataset previews for the Data Import tree: TopSpin's thumb.png, or a min/max sparkline.
+
+Needs numpy only. A sparkline is computed from the raw ``1r`` next to the
+dataset when there is one (a single binary read, much faster than parsing
+ascii-spec.txt), otherwise from the spectrum itself, and is returned as PPM
+bytes that Tk's PhotoImage reads directly.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def proc_dir_of(path):
+    """pdata/<proc> folder of a dataset path (the folder itself, or the one holding ascii-spec.txt)."""
+    return path if os.path.isdir(path) else os.path.dirname(path)
+
+def find_thumb(path):
+    thumb = os.path.join(proc_dir_of(path), "thumb.png")
+    return thumb if os.path.isfile(thumb) else None
+
+def _procs_params(proc_dir, keys):
+    found = {}
+    with open(os.path.join(proc_dir, "procs"), encoding="latin-1") as fh:
+        for line in fh:
+            if line.startswith("##$"):
+                key, _, value = line[3:].partition("=")
+                if key in keys:
+                    found[key] = value.strip()
+    return found
+
+def read_1r(proc_dir):
+    """Raw real spectrum of a pdata/<proc> folder (int32 or float64, per procs), or None."""
+    one_r = os.path.join(proc_dir, "1r")
+    if not os.path.isfile(one_r):
+        return None
+    try:
+        params = _procs_params(proc_dir, ("BYTORDP", "DTYPP"))
+    except OSError:
+        return None
+    order = ">" if params.get("BYTORDP") == "1" else "<"
+    dtype = np.dtype(order + ("f8" if params.get("DTYPP") == "2" else "i4"))
+    y = np.fromfile(one_r, dtype=dtype)
+    return y if y.size else None
+
+def envelope(y, width):
+    """(lo, hi): the minimum and maximum of *y* in each of *width* equal runs of samples."""
+    y = np.asarray(y, dtype=float)
+    width = max(1, min(width, y.size))
+    edges = np.linspace(0, y.size, width + 1).astype(np.intp)[:-1]
+    return np.minimum.reduceat(y, edges), np.maximum.reduceat(y, edges)
+
+def sparkline_ppm(lo, hi, height, fg=(0, 0, 0), bg=(255, 255, 255)):
+    """Binary PPM (P6) of one column per envelope bin, filled between its min and max."""
+    top, bottom = float(np.nanmax(hi)), float(np.nanmin(lo))
+    span = (top - bottom) or 1.0
+    # row 0 is the top of the image
+    y_hi = np.floor((top - hi) / span * (height - 1)).astype(int)
+    y_lo = np.ceil((top - lo) / span * (height - 1)).astype(int)
+    rows = np.arange(height)[:, None]
+    ink = (rows >= y_hi[None, :]) & (rows <= y_lo[None, :])
+    rgb = np.where(ink[..., None], np.array(fg, np.uint8), np.array(bg, np.uint8)).astype(np.uint8)
+    return b"P6 %d %d 255\n" % (ink.shape[1], height) + rgb.tobytes()
+
+
+class PreviewCache:
+    """LRU of sparkline envelopes keyed by (path, data mtime, width)."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def envelope(self, path, width, load=None):
+        """Envelope of the dataset at *path*, from 1r if present, else from *load*(path) -> (x, y)."""
+        proc_dir = proc_dir_of(path)
+        source = os.path.join(proc_dir, "1r")
+        if not os.path.isfile(source):
+            source = path
+        key = (path, os.stat(source).st_mtime_ns, width)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        y = read_1r(proc_dir) if source != path else None
+        if y is None:
+            if load is None:
+                raise ValueError(f"No data to preview in {proc_dir}")
+            y = load(path)[1]
+        env = envelope(y, width)
+        with self._lock:
+            self._entries[key] = env
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return env
@@ -0,0 +1,432 @@
+"""Plot pipeline shared by the GUI and the batch renderer: transforms and drawing onto an Axes.
+
+Everything here works on plain data: *settings* is a PlotSettings snapshot and
+*lines* is a list of [x, y] float arrays in plotting order.
+"""
+import numpy as np
+import matplotlib as mpl
+from matplotlib import ticker
+from matplotlib.collections import LineCollection
+from matplotlib.colors import is_color_like
+
+from . import perf
+from .settings import SINGLE_COLOR
+from .resample import common_grid, resample, envelope_rows
+from .integrals import cumulative_at, cumulative_integral
+
+# modes drawn from one 2D array on a common x-grid instead of a line per trace
+SERIES_MODES = ("heatmap", "waterfall")
+WATERFALL_MAX_ROWS = 200     # more spectra than this are thinned to every k-th one
+WATERFALL_BINS = 1024        # min/max bins per waterfall trace
+
+
+# ---------------------------------------------------------------------------
+#  Transforms
+# ---------------------------------------------------------------------------
+@perf.timed("transform")
+def transform_lines(lines, normalize=True, scaling_factor=1.0,
+                    x_offset_increment=0.0, y_offset_increment=0.0, mode="stack", norms=None):
+    """Normalise, scale and offset *lines* ([x, y] pairs) in place, in plotting order.
+
+    The series modes (heatmap, waterfall) are normalised and scaled only; their
+    layout is done when drawing. *norms* may give each trace's normalisation
+    divisor (e.g. stats.DatasetStats.norm); None entries are computed.
+    """
+    # --- intensity normalization ---
+    if normalize:
+        for i, line in enumerate(lines):
+            y = line[1]
+            ymax = norms[i] if norms and norms[i] is not None else None
+            if ymax is None:
+                # Prefer positive max; if not present, fall back to absolute max
+                top = np.max(y)
+                ymax = float(top) if top > 0 else float(np.max(np.abs(y)))
+            if ymax and np.isfinite(ymax):
+                line[1] = y / ymax
+
+    cumulative_y_offset = 0  # Initialize cumulative y-offset for stacking
+    mode = (mode or "").lower()
+
+    for idx, line in enumerate(lines):
+        # Apply scaling factor to y-data
+        line[1] *= scaling_factor
+
+        if mode == "overlay":
+            # Apply x and y offsets (increases as index increases)
+            line[0] += x_offset_increment * idx
+            line[1] += y_offset_increment * idx
+        elif mode == "stack":
+            if idx == 0:
+                # First line remains at base level
+                cumulative_y_offset = float(np.max(line[1])) + (y_offset_increment if len(lines) > 1 else 0)
+            else:
+                # Store original max before modification
+                original_max = float(np.max(line[1]))
+                # Apply cumulative offset to current line
+                line[1] += cumulative_y_offset
+                # Update cumulative offset for the *next* line only (no last spacer)
+                if idx < len(lines) - 1:
+                    cumulative_y_offset += original_max + y_offset_increment
+    return lines
+
+def transform_lines_for(lines, settings, normalize=True, norms=None):
+    """transform_lines() with the scaling/offset/mode of *settings*."""
+    return transform_lines(
+        lines,
+        normalize=normalize,
+        scaling_factor=settings.scaling_factor,
+        x_offset_increment=settings.x_offset or 0,
+        y_offset_increment=settings.y_offset or 0,
+        mode=settings.mode,
+        norms=norms,
+    )
+
+# ---------------------------------------------------------------------------
+#  Drawing
+# ---------------------------------------------------------------------------
+def set_axis_limits(ax, settings, lines):
+    """Set the axis limits based on user input."""
+    x_min = settings.x_min if settings.x_min is not None else float(np.min(lines[-1][0]))
+    x_max = settings.x_max if settings.x_max is not None else float(np.max(lines[0][0]))
+
+    ax.set_xlim(x_min, x_max)
+
+    y_min = settings.y_min if settings.y_min is not None else 0
+    y_max = settings.y_max if settings.y_max is not None else 1
+
+    if settings.mode in ("stack", "overlay") and settings.y_max is None:
+        y_max = float(np.max(lines[-1][1]))
+
+    # whitespace entered by the user
+    whitespace_value = settings.whitespace if settings.whitespace is not None else 0.1
+
+    ax.set_ylim(y_min - whitespace_value, y_max + whitespace_value)
+
+def get_axis_title(nucleus, x_axis_unit):
+    """Generate the axis title based on the nucleus and x-axis unit."""
+    if not nucleus:
+        return
+
+    if x_axis_unit == "ppm":
+        unit_string = "Chemical Shift (ppm)"
+    elif x_axis_unit == "Hz":
+        unit_string = "Frequency (Hz)"
+    elif x_axis_unit == "kHz":
+        unit_string = "Frequency (kHz)"
+    else:
+        print("Invalid x-axis unit selection")
+        return
+
+    numeric_part = ""
+    element_name = ""
+
+    for i in range(0, len(nucleus)):
+        if nucleus[i].isdigit():
+            numeric_part += nucleus[i]
+        else:
+            element_name += nucleus[i]
+
+    # Use LaTeX syntax for font styling
+    title_with_superscript = r"$\mathregular{^{%s}}$%s %s" % (numeric_part, element_name, unit_string)
+
+    return title_with_superscript
+
+def set_axis_ticks(ax, settings):
+    """Set the axis ticks based on user input."""
+    if settings.major_tick_spacing is not None:
+        ax.xaxis.set_major_locator(ticker.MultipleLocator(settings.major_tick_spacing))
+
+    if settings.minor_tick_spacing is not None:
+        ax.xaxis.set_minor_locator(ticker.MultipleLocator(settings.minor_tick_spacing))
+
+    # Set font properties directly on the x-axis tick labels
+    font_properties = {
+        # use Axis-font combobox; default to Arial if blank
+        'family': settings.axis_font or 'Arial',
+        'size'  : settings.axis_font_size if settings.axis_font_size is not None else 10
+    }
+
+    # Hide y-axis ticks and labels
+    ax.yaxis.set_major_locator(ticker.NullLocator())
+    ax.yaxis.set_minor_locator(ticker.NullLocator())
+
+    # Additional customization
+
+    major_len = settings.major_tick_length or 4.0
+    minor_len = settings.minor_tick_length or 2.0
+
+    # length & size
+    ax.tick_params(axis='x',
+                   which='major', length=major_len, labelsize=font_properties['size'])
+    ax.tick_params(axis='x',
+                   which='minor', length=minor_len, labelsize=font_properties['size'])
+
+    # family
+    for lbl in ax.get_xticklabels():
+        lbl.set_family(font_properties['family'])
+
+def resolve_trace_colors(settings, n_lines):
+    """*n_lines* colours from the colour scheme; ValueError for an invalid custom colour."""
+    selected_scheme = settings.color_scheme
+    n_lines = max(1, n_lines)
+
+    if selected_scheme == SINGLE_COLOR:
+        custom_color = settings.custom_color
+        if custom_color and is_color_like(custom_color):
+            return [custom_color] * n_lines
+        raise ValueError("Please enter a valid color name or hex code")
+
+    # Treat selection as a matplotlib colormap name
+    try:
+        cmap = mpl.colormaps[selected_scheme]
+        # sample evenly across the colormap
+        if n_lines == 1:
+            return [cmap(0.5)]
+        return [cmap(i / (n_lines - 1)) for i in range(n_lines)]
+    except Exception:
+        # fallback if something odd gets loaded from a template
+        return ["black"] * n_lines
+
+def draw_traces_collection(ax, lines, colors, linewidth=None):
+    """Draw all traces as one LineCollection, styled to match the per-line ax.plot path."""
+    rc = mpl.rcParams
+    segments = [np.column_stack((line[0], line[1])) for line in lines]
+    coll = LineCollection(
+        segments,
+        colors=colors[:len(segments)],
+        linewidths=linewidth if linewidth is not None else rc['lines.linewidth'],
+        linestyles='solid',
+        capstyle=rc['lines.solid_capstyle'],
+        joinstyle=rc['lines.solid_joinstyle'],
+        antialiaseds=rc['lines.antialiased'],
+        zorder=2,                      # same layer as Line2D, above the axes patch
+        clip_on=True,
+    )
+    ax.add_collection(coll, autolim=True)
+    ax.autoscale_view()
+    return coll
+
+def series_colormap(settings):
+    """Colormap of the colour scheme, or viridis for a single colour."""
+    try:
+        return mpl.colormaps[settings.color_scheme]
+    except KeyError:
+        return mpl.colormaps["viridis"]
+
+def draw_series(ax, settings, lines, colors=None, cache=None, data_key=None):
+    """Heatmap or waterfall of *lines*, resampled onto one grid; one artist whatever the count.
+
+    Rows run bottom to top in plotting order. Y-Min/Y-Max set the heatmap's
+    colour limits, or the waterfall's y-limits. With a ResampleCache and a
+    *data_key* identifying the traces, the resampled array is reused.
+    """
+    grid = common_grid(lines)
+    if cache is not None and data_key is not None:
+        rows = cache.resample(data_key, lines, grid)
+    else:
+        rows = resample(lines, grid)
+    n = len(rows)
+    if settings.mode == "heatmap":
+        ax.imshow(rows, cmap=series_colormap(settings), aspect="auto", origin="lower",
+                  interpolation="nearest", extent=(grid[0], grid[-1], 0.5, n + 0.5),
+                  vmin=settings.y_min, vmax=settings.y_max)
+        ax.set_ylim(0.5, n + 0.5)
+    else:
+        keep = np.arange(0, n, -(-n // WATERFALL_MAX_ROWS))
+        x, rows = envelope_rows(grid, rows[keep], WATERFALL_BINS)
+        peak = float(np.nanmax(np.abs(rows))) or 1.0
+        step = settings.y_offset or 3.0 * peak / max(len(rows), 3)      # blank or 0: automatic
+        shift = settings.x_offset or 0.0
+        y = rows + step * np.arange(len(rows))[:, None]
+        segments = [np.column_stack((x + shift * i, yi)) for i, yi in enumerate(y)]
+        colors = colors or resolve_trace_colors(settings, len(keep))
+        if len(colors) == n:
+            colors = [colors[i] for i in keep]
+        ax.add_collection(LineCollection(segments, colors=colors, zorder=2, clip_on=True,
+                                         linewidths=settings.line_thickness or mpl.rcParams['lines.linewidth']))
+        whitespace = settings.whitespace if settings.whitespace is not None else 0.1
+        y_lo = settings.y_min if settings.y_min is not None else float(np.nanmin(y)) - whitespace
+        y_hi = settings.y_max if settings.y_max is not None else float(np.nanmax(y)) + whitespace
+        ax.set_ylim(y_lo, y_hi)
+    x_lo = settings.x_min if settings.x_min is not None else grid[0]
+    x_hi = settings.x_max if settings.x_max is not None else grid[-1]
+    ax.set_xlim(x_lo, x_hi)
+
+PEAK_DECIMALS = {"ppm": 2, "Hz": 0, "kHz": 3}
+
+def draw_peak_labels(ax, settings, lines, peaks, max_labels=20):
+    """Tick and label the tallest *max_labels* peaks of each trace above the drawn trace.
+
+    *peaks* holds one peaks.pick_peaks() result per trace (or None), picked on
+    the untransformed trace whose first x is in its 'x0'.
+    """
+    from matplotlib.transforms import offset_copy
+
+    decimals = PEAK_DECIMALS.get(settings.load_unit, 2)
+    tick_at = offset_copy(ax.transData, fig=ax.figure, y=3, units="points")
+    text_at = offset_copy(ax.transData, fig=ax.figure, y=9, units="points")
+    font = {'family': settings.axis_font or 'Arial',
+            'size': 0.6 * (settings.axis_font_size if settings.axis_font_size is not None else 10)}
+    tick_x, tick_y = [], []
+    for (x, y), found in zip(lines, peaks):
+        if not found or not len(found["x"]):
+            continue
+        top = np.argsort(found["height"])[::-1][:max_labels]
+        at = found["x"][top] + (x[0] - found["x0"])          # plus the layout's x-offset
+        if x[0] > x[-1]:
+            x, y = x[::-1], y[::-1]
+        # drawn height: the higher of the samples either side (the trace may be decimated)
+        j = np.clip(np.searchsorted(x, at), 1, len(x) - 1)
+        tip = np.maximum(y[j - 1], y[j])
+        tick_x.append(at)
+        tick_y.append(tip)
+        for px, label_x, ty in zip(found["x"][top], at, tip):
+            ax.text(label_x, ty, f"{px:.{decimals}f}", transform=text_at, rotation=90,
+                    ha="center", va="bottom", fontdict=font)
+    if tick_x:
+        ax.scatter(np.concatenate(tick_x), np.concatenate(tick_y), marker="|", s=25, c="black",
+                   linewidths=0.6, transform=tick_at, zorder=3)
+
+INTEGRAL_CURVE_HEIGHT = 0.6     # the largest region's curve rises this share of a typical trace's height
+
+def draw_integral_regions(ax, settings, lines, regions, curves=False):
+    """Shade *regions* ((lo, hi) in plot units) and, with *curves*, draw each trace's running integral.
+
+    Curves run from each region's high-x end, start at the trace's baseline
+    (its median) and share one scale, so the same area draws the same height
+    in every trace; the largest rises INTEGRAL_CURVE_HEIGHT of the median
+    trace height. The shading follows the first trace; overlay x-offsets shift
+    each trace's curves with it. All curves are one LineCollection. The series
+    modes get dashed region edges and no curves.
+    """
+    if settings.mode in SERIES_MODES:
+        # a shading under the heatmap image would not show; mark the region edges instead
+        edge = "white" if settings.mode == "heatmap" else "#1f77b4"
+        for lo, hi in regions:
+            for at in (lo, hi):
+                ax.axvline(at, color=edge, linewidth=0.6, linestyle="--", zorder=3)
+        return
+    for lo, hi in regions:
+        ax.axvspan(lo, hi, color="#1f77b4", alpha=0.08, linewidth=0, zorder=0)
+    if not curves:
+        return
+    traces = []         # (baseline, height, [(x, running integral), ...]) per trace
+    for idx, (x, y) in enumerate(lines):
+        if len(x) < 2:
+            continue
+        shift = (settings.x_offset or 0) * idx if settings.mode == "overlay" else 0.0
+        cum = cumulative_integral(x, y)
+        base = float(np.median(cum[1][::max(1, len(y) // 65536)]))
+        pieces = []
+        for lo, hi in regions:
+            inside = (cum[0] > lo + shift) & (cum[0] < hi + shift)
+            at = np.concatenate(([lo + shift], cum[0][inside], [hi + shift]))
+            at = at[(at >= cum[0][0]) & (at <= cum[0][-1])]
+            if len(at) > 1:
+                # of y above the baseline, so the curves stay flat where there is no signal
+                run = cumulative_at(cum, at) - base * at
+                pieces.append((at, run[-1] - run))
+        traces.append((base, float(np.max(y)) - base, pieces))
+    largest = max((abs(run[0]) for *_, pieces in traces for _, run in pieces), default=0.0)
+    if not largest:
+        return
+    scale = INTEGRAL_CURVE_HEIGHT * float(np.median([height for _, height, _ in traces])) / largest
+    segments = [np.column_stack((at, base + scale * run))
+                for base, _, pieces in traces for at, run in pieces]
+    ax.add_collection(LineCollection(segments, colors="#d62728", linewidths=0.8, zorder=3),
+                      autolim=False)
+
+@perf.timed("draw")
+def draw_plot_on(ax, settings, lines, colors=None, linecollection_threshold=100,
+                 cache=None, data_key=None, peaks=None, peak_labels=20,
+                 integral_regions=None, integral_curves=False):
+    """Draw *lines* with the styling in *settings* onto *ax*.
+
+    *colors* defaults to resolve_trace_colors(); raises ValueError for an invalid
+    custom colour. *cache* and *data_key* are passed on to draw_series(),
+    *peaks* with *peak_labels* to draw_peak_labels() (not in the series modes),
+    and *integral_regions* with *integral_curves* to draw_integral_regions().
+    """
+    series = settings.mode in SERIES_MODES
+    if not series:
+        set_axis_limits(ax, settings, lines)
+    axis_title = get_axis_title(settings.nucleus, settings.x_axis_unit)
+    set_axis_ticks(ax, settings)
+    ax.set_facecolor("white")
+    ax.figure.set_facecolor("white")
+    if not series:
+        colors = colors or resolve_trace_colors(settings, len(lines))
+
+    ax.set_xlabel(axis_title, fontdict={
+        'family': settings.label_font or 'Arial',
+        'size'  : settings.label_font_size if settings.label_font_size is not None else 10
+    })
+
+    linewidth = settings.line_thickness
+
+    if series:
+        draw_series(ax, settings, lines, colors, cache, data_key)
+        if settings.mode == "heatmap":
+            ax.yaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+            ax.tick_params(axis='y', labelsize=settings.axis_font_size if settings.axis_font_size is not None else 10)
+            ax.set_ylabel("Spectrum", fontdict={
+                'family': settings.label_font or 'Arial',
+                'size'  : settings.label_font_size if settings.label_font_size is not None else 10
+            })
+    # Hundreds of Line2D artists are slow to draw and export; batch them instead
+    elif len(lines) > linecollection_threshold:
+        draw_traces_collection(ax, lines, colors, linewidth)
+    else:
+        for idx, line in enumerate(lines):
+            ax.plot(
+                line[0], line[1],
+                linewidth=linewidth,
+                color=colors[idx],
+                clip_on=True
+            )
+    if peaks and not series:
+        draw_peak_labels(ax, settings, lines, peaks, peak_labels)
+    if integral_regions:
+        draw_integral_regions(ax, settings, lines, integral_regions, integral_curves)
+
+    ax.invert_xaxis()
+
+@perf.timed("export.build")
+def build_export_figure(settings, lines, w_in, h_in, dpi, colors=None, linecollection_threshold=100,
+                        cache=None, data_key=None, peaks=None, peak_labels=20,
+                        integral_regions=None, integral_curves=False):
+    """A new (pyplot-free) figure of the given size with the plot drawn on it."""
+    from matplotlib.figure import Figure     # heavy; only needed once something is drawn
+
+    fig = Figure(figsize=(w_in, h_in), dpi=dpi, layout="constrained")
+    ax = fig.add_subplot(111)
+    draw_plot_on(ax, settings, lines, colors, linecollection_threshold, cache, data_key,
+                 peaks, peak_labels, integral_regions, integral_curves)
+    # Illustrator-friendly background and no clipping on lines
+    fig.patch.set_facecolor("white")
+    ax.set_facecolor("white")
+    for ln in (*ax.lines, *ax.collections):
+        ln.set_clip_on(True)
+    return fig
+
+def warm_up(settings, dpi=100):
+    """Draw a tiny throwaway figure so the first real plot starts warm.
+
+    Resolves the label/tick fonts of *settings* (matplotlib caches the lookups,
+    including the fallback when e.g. Arial is missing), parses the mathtext
+    axis title and initialises Agg. Safe to call from a background thread: it
+    only touches its own figure.
+    """
+    from dataclasses import replace
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.font_manager import FontProperties, findfont
+
+    for family in {settings.label_font or 'Arial', settings.axis_font or 'Arial'}:
+        findfont(FontProperties(family=family))
+
+    # a nucleus and a valid unit make draw_plot_on build the same mathtext title
+    settings = replace(settings, nucleus=settings.nucleus or "1H", x_axis_unit=settings.load_unit)
+    x = np.linspace(1.0, 0.0, 64)
+    lines = [[x, np.sin(8 * x) ** 2]]
+    fig = build_export_figure(settings, lines, 3.0, 2.0, dpi, colors=["black"])
+    FigureCanvasAgg(fig).draw()
@@ -0,0 +1,164 @@
+"""Resampling of traces onto a shared x-grid, for series views and spectrum arithmetic.
+
+Needs numpy only. Traces may run in either x direction, cover different
+ranges and have different spacings (e.g. 80 and 800 MHz spectra); grid points
+outside a trace's range are NaN in its row.
+
+    grid = common_grid(lines)
+    rows = resample(lines, grid)                  # (len(lines), len(grid))
+    rows = cache.resample(data_key, lines, grid)  # the same, remembered per key
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_GRID_POINTS = 4096      # columns of a series image; finer than any screen or print width
+LINEAR_PROBES = 17          # samples checked to treat an axis as evenly spaced
+LINEAR_TOLERANCE = 0.01     # allowed deviation at a probe, in sample spacings
+
+
+def common_grid(lines, max_points=MAX_GRID_POINTS):
+    """Ascending grid spanning every trace, at the finest trace spacing up to *max_points*.
+
+    Traces are monotonic, so their ends give their ranges without a pass over the data.
+    Single points and zero-width traces have no spacing and do not set the step.
+    """
+    ends = np.array([(x[0], x[-1]) for x, _ in lines], dtype=float)
+    sizes = np.array([len(x) for x, _ in lines])
+    spans = np.abs(ends[:, 1] - ends[:, 0])
+    lo, hi = float(ends.min()), float(ends.max())
+    spaced = (sizes > 1) & (spans > 0)
+    if spaced.any():
+        step = float(np.min(spans[spaced] / (sizes[spaced] - 1)))
+        points = int(round((hi - lo) / step)) + 1
+    else:
+        points = max_points if hi > lo else 1     # no trace has a spacing: as fine as allowed
+    return np.linspace(lo, hi, max(2, min(points, max_points)))
+
+def grid_key(grid):
+    """Hashable identity of a linspace grid."""
+    return (float(grid[0]), float(grid[-1]), len(grid))
+
+def is_linear(x, probes=LINEAR_PROBES, tol=LINEAR_TOLERANCE):
+    """True if *x* is evenly spaced, judged at a few probes (Bruker axes always are)."""
+    n = len(x)
+    if n < 2 or x[0] == x[-1]:
+        return False
+    idx = np.linspace(0, n - 1, min(probes, n)).astype(np.intp)
+    step = (x[-1] - x[0]) / (n - 1)
+    return bool(np.all(np.abs(np.asarray(x)[idx] - (x[0] + idx * step)) <= tol * abs(step)))
+
+def resample(lines, grid):
+    """(len(lines), len(grid)) array of the traces linearly interpolated onto *grid*.
+
+    Evenly spaced traces (all Bruker data) are resampled together in one
+    broadcast; anything else goes through np.interp one trace at a time.
+    """
+    grid = np.asarray(grid, dtype=float)
+    out = np.full((len(lines), len(grid)), np.nan)
+    linear = [k for k, (x, _) in enumerate(lines) if is_linear(x)]
+    if linear:
+        out[linear] = _resample_linear([lines[k] for k in linear], grid)
+    for k in sorted(set(range(len(lines))) - set(linear)):
+        x, y = lines[k]
+        if x[0] > x[-1]:
+            x, y = x[::-1], y[::-1]
+        out[k] = np.interp(grid, x, y, left=np.nan, right=np.nan)
+    return out
+
+def _resample_linear(lines, grid):
+    """Evenly spaced traces: every grid point's fractional sample index in one broadcast.
+
+    Only the two samples around each grid point are read, so the cost is
+    O(len(grid)) per trace however long the traces are.
+    """
+    sizes = np.array([len(x) for x, _ in lines])
+    first = np.array([x[0] for x, _ in lines], dtype=float)
+    step = (np.array([x[-1] for x, _ in lines], dtype=float) - first) / (sizes - 1)
+    pos = grid[None, :] - first[:, None]
+    pos /= step[:, None]
+    # a grid end that meets a trace end may land a rounding error outside it
+    outside = (pos < -1e-9) | (pos > (sizes - 1)[:, None] + 1e-9)
+    i = np.floor(pos)
+    np.clip(i, 0, (sizes - 2)[:, None], out=i)
+    pos -= i                                    # now the fraction between samples i and i+1
+    i = i.astype(np.intp)
+    out, right = np.empty_like(pos), np.empty_like(pos)
+    for row, (_, y) in enumerate(lines):
+        out[row], right[row] = y[i[row]], y[i[row] + 1]
+    right -= out
+    right *= pos
+    out += right
+    out[outside] = np.nan
+    return out
+
+def envelope_rows(grid, rows, bins):
+    """Min/max envelope of every row in *bins* equal column runs: (x, rows) of 2*bins columns.
+
+    Each bin contributes its minimum and its maximum at the bin's first and
+    last grid point, so peaks survive however few bins are kept.
+    """
+    n = len(grid)
+    if n <= 2 * bins:
+        return grid, rows
+    edges = np.linspace(0, n, bins + 1).astype(np.intp)
+    starts, ends = edges[:-1], edges[1:] - 1
+    lo = np.fmin.reduceat(rows, starts, axis=1)
+    hi = np.fmax.reduceat(rows, starts, axis=1)
+    x = np.column_stack((grid[starts], grid[ends])).ravel()
+    y = np.stack((lo, hi), axis=2).reshape(len(rows), -1)
+    return x, y
+
+
+class ResampleCache:
+    """Thread-safe LRU of resampled arrays keyed by (data key, grid), held to a byte budget.
+
+    The data key must identify the traces' content (e.g. a digest of the
+    arrays); cached arrays are read-only.
+    """
+
+    def __init__(self, max_bytes=128 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def resample(self, data_key, lines, grid):
+        key = (data_key, grid_key(grid))
+        with self._lock:
+            rows = self._entries.get(key)
+            if rows is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return rows
+            self.misses += 1
+        rows = resample(lines, grid)
+        rows.flags.writeable = False
+        if rows.nbytes <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = rows
+                    self.nbytes += rows.nbytes
+                self._evict_to(self.max_bytes)
+        return rows
+
+    def evict_to(self, max_bytes):
+        """Drop least recently used arrays until at most *max_bytes* are cached; returns bytes freed."""
+        with self._lock:
+            return self._evict_to(max_bytes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _evict_to(self, max_bytes):
+        before = self.nbytes
+        while self._entries and self.nbytes > max_bytes:
+            self.nbytes -= self._entries.popitem(last=False)[1].nbytes
+        return before - self.nbytes
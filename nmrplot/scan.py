@@ -0,0 +1,465 @@
+"""Finding spectra on disk: Bruker folder layout checks, directory scans and the scan caches.
+
+Standard library only, so it is cheap to import.
+"""
+import os
+from pathlib import Path
+from collections import defaultdict, deque
+
+from . import perf
+
+
+def is_valid_pdata_dir(path: str) -> bool:
+    """Accept only pdata/<proc> dirs that include procs and 1r (2rr unsupported)."""
+    return (
+        os.path.isdir(path)
+        and os.path.isfile(os.path.join(path, "procs"))
+        and os.path.isfile(os.path.join(path, "1r"))
+    )
+
+def parse_expt_proc(path_like: str) -> tuple[str, str]:
+    """
+    Given either a pdata dir or .../pdata/<proc>/ascii-spec.txt,
+    return (expno, procno) as strings. Falls back to '?' if unclear.
+    """
+    p = Path(path_like)
+    if p.name == "ascii-spec.txt":
+        p = p.parent  # -> pdata/<proc>
+    # expect .../<expno>/pdata/<proc>
+    parts = [part for part in p.parts]
+    try:
+        i = len(parts) - 1
+        procno = parts[i]
+        if parts[i - 1].lower() == "pdata":
+            expno = parts[i - 2]
+        else:
+            expno = "?"
+    except Exception:
+        expno, procno = "?", "?"
+    return expno, procno
+
+def sample_name(path_like: str) -> str:
+    """The sample folder holding <expno>/pdata/<proc> (or the parent dir if the layout is unusual)."""
+    p = Path(path_like)
+    if p.name == "ascii-spec.txt":
+        p = p.parent
+    if len(p.parts) >= 4 and p.parent.name.lower() == "pdata":
+        return p.parents[2].name
+    return p.parent.name
+
+def label_for(path_like: str) -> str:
+    expno, procno = parse_expt_proc(path_like)
+    return f"Expt {expno}, proc {procno}"
+
+def is_bruker_pdata_dir(path: str) -> bool:
+    """Return True if *path* looks like a Bruker processed directory (pdata/<proc>)."""
+    if not os.path.isdir(path):
+        return False
+    procs = os.path.join(path, "procs")
+    one_r = os.path.join(path, "1r")
+    two_rr = os.path.join(path, "2rr")
+    return os.path.isfile(procs) and (os.path.isfile(one_r) or os.path.isfile(two_rr))
+
+def find_pdata_dir(path: str) -> str | None:
+    """
+    Given anything inside a Bruker dataset, find the nearest pdata/<proc> dir
+    that contains procs + 1r/2rr. If *path* itself is such a dir, return it.
+    """
+    if is_bruker_pdata_dir(path):
+        return path
+    # walk up at most 5 levels just to be safe
+    cur = os.path.abspath(path)
+    for _ in range(5):
+        parent = os.path.dirname(cur)
+        if parent == cur:
+            break
+        # common layout: .../<expt>/pdata/<proc>/
+        if os.path.basename(parent).lower() == "pdata":
+            # check all children
+            for child in os.listdir(parent):
+                cand = os.path.join(parent, child)
+                if is_bruker_pdata_dir(cand):
+                    return cand
+        if is_bruker_pdata_dir(parent):
+            return parent
+        cur = parent
+    # brute-force search below original root as a last resort
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            if is_bruker_pdata_dir(root):
+                return root
+    return None
+
+@perf.timed("scan.validate")
+def quick_validate_bruker_top(
+    selected_dir: str,
+    *,
+    expected_depth: int = 4,   # relative parts: sample/expt/pdata/proc
+    max_visits: int = 600,     # hard cap on how many dirs we’ll look at
+    max_depth: int = 6         # never look deeper than this from selected_dir
+) -> tuple[bool, str | None]:
+    """
+    Fast, bounded validator. Returns (True, None) only when we find a valid
+    Bruker proc dir (procs + 1r or ascii-spec.txt) at exactly:
+        <sel>/<sample>/<expt>/pdata/<proc>  (depth == expected_depth)
+
+    Returns (False, reason) when:
+      - The user is too LOW (sel/pdata exists)
+      - The first valid dataset we spot is deeper than expected → TOO HIGH
+      - We hit the visit/depth limits or see no valid layout quickly
+    """
+    sel = Path(selected_dir)
+    if not sel.exists() or not sel.is_dir():
+        return False, "Selected path does not exist or is not a directory."
+
+    # Too LOW: they clicked directly into an experiment (has 'pdata' here)
+    if (sel / "pdata").exists():
+        return False, "Selected folder looks like an experiment-level folder (too LOW)."
+
+    # Bounded breadth-first search using os.scandir (fast, avoids stat-ing all children)
+    q = deque([(str(sel), 0)])
+    visits = 0
+
+    def _is_proc_dir(path: str) -> bool:
+        # Accept pdata/<proc> that has 'procs' AND (1r or ascii-spec.txt)
+        procs = os.path.join(path, "procs")
+        one_r = os.path.join(path, "1r")
+        ascsp = os.path.join(path, "ascii-spec.txt")
+        return os.path.isfile(procs) and (os.path.isfile(one_r) or os.path.isfile(ascsp))
+
+    while q:
+        cur, depth = q.popleft()
+        if depth > max_depth:
+            continue
+
+        try:
+            with os.scandir(cur) as it:
+                for entry in it:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+
+                    visits += 1
+                    if visits > max_visits:
+                        # We refuse to scan a huge tree from too high up
+                        return False, "Selected folder appears to be too high (quick check limit reached)."
+
+                    # Fast path: if this directory itself is a valid proc folder, measure its depth.
+                    if _is_proc_dir(entry.path):
+                        rel_depth = len(Path(entry.path).relative_to(sel).parts)
+                        if rel_depth == expected_depth:
+                            return True, None
+                        if rel_depth > expected_depth:
+                            return False, "Selected folder appears to be too high in the directory tree."
+                        # If somehow shallower, keep going (very unusual)
+
+                    # Cheap pruning: if we already hit 'pdata' at this level, don’t recurse past proc level
+                    if entry.name.lower() == "pdata":
+                        # Only look one level into pdata (proc folders)
+                        try:
+                            with os.scandir(entry.path) as procs:
+                                for p in procs:
+                                    if p.is_dir(follow_symlinks=False) and _is_proc_dir(p.path):
+                                        rel_depth = len(Path(p.path).relative_to(sel).parts)
+                                        if rel_depth == expected_depth:
+                                            return True, None
+                                        if rel_depth > expected_depth:
+                                            return False, "Selected folder appears to be too high in the directory tree."
+                        except PermissionError:
+                            pass
+                        # Don’t queue deeper past pdata
+                        continue
+
+                    # Otherwise, queue this child for a shallow look
+                    q.append((entry.path, depth + 1))
+
+        except PermissionError:
+            # Skip unreadable branches silently
+            continue
+
+    return False, "Could not detect Bruker ascii/pdata layout under the selected folder."
+
+def scan_bruker_structure(selected_dir):
+    """
+    Validate a Bruker directory tree where the user selects the folder that
+    directly contains sample folders.  Expected relative layout is:
+
+        selected_dir/
+            └── <sample_name>/          (any string)
+                └── <expt#>/            (numeric)
+                    └── pdata/
+                        └── <proc#>/    (numeric)
+                            └── ascii-spec.txt
+
+    On success returns (ascii_paths, True, set()).
+    On mismatch returns (partial_paths, False, {"reason", ...}).
+    """
+    ascii_paths     = []
+    structure_ok    = False
+    bad_reasons     = set()
+    expected_depth  = 4          # <sample> / <expt#> / pdata / <proc#>
+
+    for root, dirs, files in os.walk(selected_dir):
+        rel_parts = Path(root).relative_to(selected_dir).parts
+
+        # We never need to look deeper than the proc folder
+        if len(rel_parts) > expected_depth:
+            dirs.clear()
+            continue
+
+        if "ascii-spec.txt" in files:
+            depth = len(rel_parts)
+
+            # Flag selections that are too high / low
+            if depth != expected_depth:
+                if depth > expected_depth:
+                    bad_reasons.add(
+                        f"Directory too HIGH – ascii-spec.txt is {depth - expected_depth} "
+                        f"level(s) deeper (e.g., {root})"
+                    )
+                else:
+                    bad_reasons.add(
+                        f"Directory too LOW – you chose inside a sample/experiment folder (e.g., {root})"
+                    )
+                continue
+
+            # depth == expected_depth → detailed sanity checks
+            sample, expt, pdata_dir, proc = rel_parts
+
+            if not expt.isdigit():
+                bad_reasons.add(f"Experiment folder '{expt}' is not numeric");   continue
+            if pdata_dir != "pdata":
+                bad_reasons.add(f"Expected 'pdata', found '{pdata_dir}' in {root}");   continue
+            if not proc.isdigit():
+                bad_reasons.add(f"Proc folder '{proc}' is not numeric");   continue
+
+            ascii_paths.append(os.path.join(root, "ascii-spec.txt"))
+            structure_ok = True        # at least one valid dataset found
+
+        # Optional early test: stop descending into non-numeric experiment dirs
+        if len(rel_parts) == 2 and not rel_parts[1].isdigit():
+            dirs.clear()
+
+    return ascii_paths, structure_ok, bad_reasons
+
+def is_valid_ascii_layout(top_dir: str, f: str) -> bool:
+    try:
+        parts = Path(f).relative_to(top_dir).parts
+    except Exception:
+        return False
+    return (
+        len(parts) >= 5
+        and parts[-1].lower() == "ascii-spec.txt"
+        and parts[-3].lower() == "pdata"
+        and parts[-4].isdigit()
+        and parts[-2].isdigit()
+    )
+
+def is_valid_pdata_layout(top_dir: str, d: str) -> bool:
+    try:
+        parts = Path(d).relative_to(top_dir).parts
+    except Exception:
+        return False
+    return (
+        len(parts) >= 4
+        and parts[-2].lower() == "pdata"
+        and parts[-3].isdigit()
+        and parts[-1].isdigit()
+    )
+
+
+def extract_experiment_number(dir_path):
+    """Return the Bruker experiment number folder
+
+    Falls back to None if the path is too shallow instead of raising IndexError.
+    """
+    parts = dir_path.split(os.sep)
+    return parts[-3] if len(parts) >= 3 else None
+
+
+def extract_proc_number(dir_path):
+    """Extract the proc number from a directory path."""
+    parts = dir_path.split(os.sep)
+    return parts[-1]
+
+def guess_leaf_type(path_str: str) -> str:
+    """Return 'ascii', 'pdata', or 'unknown' using only string/path parts."""
+    if not isinstance(path_str, str):
+        return "unknown"
+    low = path_str.lower()
+    if low.endswith("ascii-spec.txt"):
+        return "ascii"
+    # Heuristic: any path with .../pdata/<proc#> is pdata
+    try:
+        parts = [p.lower() for p in Path(path_str).parts]
+        if "pdata" in parts:
+            # last part is usually the proc number
+            last = Path(path_str).name
+            if last.isdigit():
+                return "pdata"
+            # allow pdata/<proc>/ wherever proc is numeric
+            # if not numeric, still probably pdata but mark unknown to be safe
+            return "unknown"
+    except Exception:
+        pass
+    return "unknown"
+
+
+def _label_sort_key(lbl: str):
+    """numeric-ish sort of 'Expt N, proc M' labels"""
+    try:
+        parts = lbl.split()
+        return (int(parts[1].rstrip(',')), int(parts[3]))
+    except Exception:
+        return (10**9, 10**9)
+
+@perf.timed("scan.ascii")
+def traverse_directory_ascii(root_dir: str) -> dict:
+    """
+    {basename(root_dir): {sample: {"Expt N, proc M": <ascii-path>}}}
+    Only include .../pdata/<proc>/ascii-spec.txt files.
+    """
+    top_label = os.path.basename(root_dir)
+    samples: dict[str, dict[str, str]] = defaultdict(dict)
+
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        filenames = [f for f in filenames if not f.startswith('.')]
+
+        if "ascii-spec.txt" in filenames:
+            ascii_path = os.path.join(dirpath, "ascii-spec.txt")
+            # sample = folder immediately under root_dir
+            rel = Path(dirpath).relative_to(root_dir)
+            sample = rel.parts[0] if rel.parts else os.path.basename(root_dir)
+            label = label_for(ascii_path)
+            samples[sample][label] = ascii_path
+
+    for samp in list(samples.keys()):
+        samples[samp] = dict(sorted(samples[samp].items(), key=lambda kv: _label_sort_key(kv[0])))
+
+    return {top_label: dict(samples)}
+
+
+@perf.timed("scan.pdata")
+def traverse_directory_pdata(root_dir: str) -> dict:
+    """
+    {basename(root_dir): {sample: {"Expt N, proc M": <pdata-dir>}}}
+    Only include pdata/<proc> dirs with procs + 1r (ignore 2rr).
+    """
+    top_label = os.path.basename(root_dir)
+    samples: dict[str, dict[str, str]] = defaultdict(dict)
+
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        filenames = [f for f in filenames if not f.startswith('.')]
+
+        if is_valid_pdata_dir(dirpath):
+            rel = Path(dirpath).relative_to(root_dir)
+            sample = rel.parts[0] if rel.parts else os.path.basename(root_dir)
+            label = label_for(dirpath)
+            samples[sample][label] = dirpath
+
+    for samp in list(samples.keys()):
+        samples[samp] = dict(sorted(samples[samp].items(), key=lambda kv: _label_sort_key(kv[0])))
+
+    return {top_label: dict(samples)}
+
+
+# ---------------------------------------------------------------------------
+#  Scan caches: "TOP:<dir>" lines, each followed by that directory's dataset paths
+# ---------------------------------------------------------------------------
+@perf.timed("cache.read")
+def read_scan_cache(cache_file: str) -> list[tuple[str, list[str]]] | None:
+    """Return [(top_dir, [path …]), …] or None if the file is absent/empty."""
+    if not os.path.exists(cache_file):
+        return None
+
+    blocks = []
+    with open(cache_file, "r", encoding="utf-8") as fh:
+        cur_top, cur_paths = None, []
+        for ln in fh:
+            line = ln.rstrip("\n")
+            if line.startswith("TOP:"):
+                if cur_top:
+                    blocks.append((cur_top, cur_paths))
+                cur_top, cur_paths = line[4:], []
+            elif line:
+                cur_paths.append(line)
+        if cur_top:
+            blocks.append((cur_top, cur_paths))
+
+    return blocks or None
+
+@perf.timed("cache.save")
+def save_scan_cache(cache_file: str, top_dir: str, paths: list[str], kind: str):
+    """
+    Save or update one directory’s scan of *kind* ('ascii' or 'pdata') in *cache_file*.
+    If *top_dir* already exists in the cache, its block is **replaced**.
+    """
+    valid = is_valid_ascii_layout if kind == "ascii" else is_valid_pdata_layout
+    paths = [p for p in paths if valid(top_dir, p)]
+    # ---------- read existing blocks ----------
+    blocks: dict[str, set[str]] = {td: set(ps) for td, ps in (read_scan_cache(cache_file) or [])}
+
+    # ---------- overwrite *only* this directory ----------
+    blocks[top_dir] = set(paths)          # <- overwrite, no .update()
+
+    # ---------- write back ----------
+    with open(cache_file, "w", encoding="utf-8") as fh:
+        for td, ps in blocks.items():
+            fh.write(f"TOP:{td}\n")
+            for p in sorted(ps):
+                fh.write(p + "\n")
+
+def cached_tree(blocks, kind: str) -> tuple[dict, bool]:
+    """Build {top: {sample: {"Expt N, proc M": path}}} from read_scan_cache() blocks.
+
+    Returns (tree, skipped) where *skipped* is True if some entries had an
+    unexpected layout and were left out.
+    """
+    tree_dict: dict[str, dict[str, dict[str, str]]] = {}
+    skipped_lines = False  # track if we hit malformed entries
+
+    for top_dir, paths in blocks:
+        samples: dict[str, dict[str, str]] = defaultdict(dict)
+
+        for f in paths:
+            try:
+                parts = Path(f).relative_to(top_dir).parts
+            except Exception:
+                skipped_lines = True
+                continue
+
+            if kind == "ascii":
+                # Expect: <sample>/<expt>/pdata/<proc>/ascii-spec.txt
+                if len(parts) < 5 or parts[-1].lower() != "ascii-spec.txt" or parts[-3].lower() != "pdata":
+                    skipped_lines = True
+                    continue
+                expt, proc = parts[-4], parts[-2]
+            else:
+                # Expect: <sample>/<expt>/pdata/<proc>
+                if len(parts) < 4 or parts[-2].lower() != "pdata":
+                    skipped_lines = True
+                    continue
+                expt, proc = parts[-3], parts[-1]
+            if not (expt.isdigit() and proc.isdigit()):
+                skipped_lines = True
+                continue
+
+            sample = parts[0]
+            label = f"Expt {expt}, proc {proc}"
+            samples[sample][label] = f
+
+        for samp, sub in samples.items():
+            samples[samp] = dict(sorted(
+                sub.items(),
+                key=lambda kv: (int(kv[0].split()[1].rstrip(',')),
+                                int(kv[0].split()[3]))
+            ))
+        parts_top = Path(top_dir).parts
+        if len(parts_top) >= 2:
+            label_top = f"{parts_top[-2]}/{parts_top[-1]}"
+        else:
+            label_top = parts_top[-1]  # fallback if somehow only one part
+        tree_dict[label_top] = samples
+
+    return tree_dict, skipped_lines
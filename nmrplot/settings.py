@@ -0,0 +1,149 @@
+"""PlotSettings: an immutable, typed snapshot of the plotting parameters.
+
+Built once per plot, from the GUI widgets' text or from a template file, and
+then passed by value to loading, transforms, drawing and export. It pickles
+(worker processes) and has a content hash that is stable across runs
+(caches and duplicate detection).
+"""
+import json
+import hashlib
+from dataclasses import dataclass, fields
+
+from .templates import read_template
+
+SINGLE_COLOR = "Single color — user specified"
+
+
+def _text(s):
+    return (s or "").strip()
+
+def _number(label):
+    """Blank → None, otherwise float; ValueError naming the field for anything else."""
+    def parse(s):
+        s = _text(s)
+        if not s:
+            return None
+        try:
+            return float(s)
+        except ValueError:
+            raise ValueError(f"{label}: '{s}' is not a number") from None
+    return parse
+
+def _lenient(default=None):
+    """float if it parses, *default* otherwise (blank or not a number)."""
+    def parse(s):
+        try:
+            return float(s)
+        except (TypeError, ValueError):
+            return default
+    return parse
+
+
+@dataclass(frozen=True, slots=True)
+class PlotSettings:
+    """Plotting parameters. None means "automatic" (e.g. data extent for x_min)."""
+    x_axis_unit: str = ""
+    x_min: float | None = None
+    x_max: float | None = None
+    x_min_mask: float | None = None
+    x_max_mask: float | None = None
+    nucleus: str = ""
+    y_min: float | None = None
+    y_max: float | None = None
+    scaling_factor: float = 1.0
+    whitespace: float | None = None
+    label_font: str = ""
+    label_font_size: float | None = None
+    line_thickness: float | None = None
+    color_scheme: str = SINGLE_COLOR
+    custom_color: str = ""
+    axis_font: str = "Arial"
+    axis_font_size: float | None = None
+    mode: str = "stack"
+    x_offset: float | None = None
+    y_offset: float | None = None
+    major_tick_spacing: float | None = None
+    minor_tick_spacing: float | None = None
+    major_tick_length: float | None = None
+    minor_tick_length: float | None = None
+    size_unit: str = "mm"
+    width: float | None = 85.0
+    height: float | None = 60.0
+    dpi: float | None = 300.0
+
+    @classmethod
+    def from_values(cls, values):
+        """Parse {template key: text} (missing keys keep their defaults). ValueError on bad numbers."""
+        kwargs = {}
+        for name, (key, parse) in _KEYS.items():
+            if key in values:
+                kwargs[name] = parse(values[key])
+        return cls(**kwargs)
+
+    @classmethod
+    def from_template(cls, filepath, overrides=None):
+        """Settings from a template file, with optional {key: text} overrides on top."""
+        return cls.from_values({**read_template(filepath), **(overrides or {})})
+
+    def content_hash(self) -> str:
+        """Hex digest of every field; identical for equal settings in any process or run."""
+        items = [getattr(self, f.name) for f in fields(self)]
+        # 300 and 300.0 are equal settings, so they must hash alike
+        items = [float(v) if isinstance(v, int) and not isinstance(v, bool) else v for v in items]
+        payload = json.dumps([type(self).__name__] + items, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def load_unit(self):
+        """Unit the spectra are read in ('ppm' when the unit field is blank)."""
+        return self.x_axis_unit or "ppm"
+
+    def x_range(self, coupled=True):
+        """(lo, hi) used to crop the data: the x-limits if coupled, else the mask fields."""
+        return (self.x_min, self.x_max) if coupled else (self.x_min_mask, self.x_max_mask)
+
+    def figure_size(self):
+        """Return (w_in, h_in, dpi) from the W/H/DPI export fields."""
+        unit = self.size_unit or "mm"
+        w = self.width if self.width is not None else (85 if unit == "mm" else 3.35)
+        h = self.height if self.height is not None else (60 if unit == "mm" else 2.36)
+        dpi = int(self.dpi if self.dpi is not None else 300)
+        # convert to inches for matplotlib
+        if unit == "mm":
+            return w / 25.4, h / 25.4, dpi
+        if unit == "px":
+            return w / dpi, h / dpi, dpi
+        return w, h, dpi
+
+
+# field -> (template/widget key, parser of its text)
+_KEYS = {
+    "x_axis_unit":        ("x_axis_unit", _text),
+    "x_min":              ("x_min_entry", _number("X-Min")),
+    "x_max":              ("x_max_entry", _number("X-Max")),
+    "x_min_mask":         ("x_min_mask_entry", _number("X-Min Mask")),
+    "x_max_mask":         ("x_max_mask_entry", _number("X-Max Mask")),
+    "nucleus":            ("nucleus_entry", _text),
+    "y_min":              ("y_min_entry", _number("Y-Min")),
+    "y_max":              ("y_max_entry", _number("Y-Max")),
+    "scaling_factor":     ("scaling_factor_entry", _lenient(1.0)),
+    "whitespace":         ("whitespace_entry", _number("Whitespace")),
+    "label_font":         ("label_font_type_var", _text),
+    "label_font_size":    ("label_font_size_entry", _number("Axis Label Font Size")),
+    "line_thickness":     ("line_thickness_entry", _number("Line Thickness")),
+    "color_scheme":       ("color_scheme_var", _text),
+    "custom_color":       ("custom_color_entry", _text),
+    "axis_font":          ("axis_font_type_var", _text),
+    "axis_font_size":     ("axis_font_size_entry", _number("Tick Label Font Size")),
+    "mode":               ("mode_var", lambda s: _text(s).lower()),
+    "x_offset":           ("x_offset_entry", _number("X-Offset")),
+    "y_offset":           ("y_offset_entry", _number("Y-Offset")),
+    "major_tick_spacing": ("major_ticks_freq_entry", _lenient()),
+    "minor_tick_spacing": ("minor_ticks_freq_entry", _lenient()),
+    "major_tick_length":  ("major_ticks_len_entry", _lenient()),
+    "minor_tick_length":  ("minor_ticks_len_entry", _lenient()),
+    "size_unit":          ("fig_size_unit", _text),
+    "width":              ("fig_w_var", _lenient()),
+    "height":             ("fig_h_var", _lenient()),
+    "dpi":                ("fig_dpi_var", _lenient()),
+}
@@ -0,0 +1,191 @@
+"""Per-dataset statistics (maximum, noise, SNR, total integral) and their on-disk index.
+
+Needs numpy only. Statistics are computed from a spectrum as loaded, so they
+match what is plotted, and kept in a tab-separated index file keyed by the
+dataset path and its data file's mtime. The Data Import tree can then show SNR,
+and plots can normalise, without reading the data again:
+
+    index = StatsIndex("stats_index.txt")
+    index.record(path, "ppm", x, y)     # e.g. as memory.SpectrumCache's on_load hook
+    st = index.get(path, "ppm")         # DatasetStats, or None if unknown, stale or in another unit
+    index.save()
+
+The total integral depends on the x unit (ppm and Hz differ by the
+spectrometer frequency), so entries are kept per path and unit; the other
+statistics do not, and get(path) without a unit returns any of them.
+"""
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from .arithmetic import is_derived
+from .memory import _data_mtime
+
+NOISE_WINDOWS = 32      # the spectrum is cut into this many windows to find signal-free ones
+QUIET_WINDOWS = 4       # the noise is the median sigma of this many quietest windows
+INDEX_HEADER = "# path\tmtime_ns\tpoints\tmax\tabs_max\tnoise\tintegral\tunit"
+
+
+@dataclass(frozen=True, slots=True)
+class DatasetStats:
+    mtime: int          # st_mtime_ns of the data file the statistics were computed from
+    points: int
+    max: float          # largest value (the positive maximum, if there is one)
+    abs_max: float
+    noise: float        # noise standard deviation in the quietest windows
+    integral: float     # trapezoid integral over the whole spectrum, x ascending, in *unit*
+    unit: str
+
+    @property
+    def snr(self):
+        """Tallest peak over the noise sigma (inf for noiseless data)."""
+        return self.max / self.noise if self.noise > 0 else float("inf")
+
+    @property
+    def norm(self):
+        """What render.transform_lines() divides by: the positive maximum, else the absolute one."""
+        return self.max if self.max > 0 else self.abs_max
+
+
+def window_noise(y, windows=NOISE_WINDOWS, quiet=QUIET_WINDOWS):
+    """Noise sigma of *y* where it has no signal.
+
+    Each window's sigma comes from its first differences (which cancel a slow
+    baseline); windows holding peaks come out large, so the median of the
+    *quiet* smallest is the noise of the signal-free part of the spectrum.
+    """
+    width = len(y) // windows
+    if width < 8:
+        d = np.diff(y)
+        return float(d.std() / np.sqrt(2.0)) if d.size else 0.0
+    d = np.diff(np.asarray(y[:width * windows], dtype=float).reshape(windows, width), axis=1)
+    sigma = d.std(axis=1) / np.sqrt(2.0)
+    return float(np.median(np.partition(sigma, quiet - 1)[:quiet]))
+
+def compute_stats(x, y, x_unit, mtime=0):
+    """DatasetStats of the spectrum (x, y) loaded in *x_unit*."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if not y.size:
+        return DatasetStats(mtime, 0, 0.0, 0.0, 0.0, 0.0, x_unit)
+    top, bottom = float(np.max(y)), float(np.min(y))
+    integral = 0.5 * float(np.sum((y[1:] + y[:-1]) * np.abs(np.diff(x)))) if y.size > 1 else 0.0
+    return DatasetStats(mtime, int(y.size), top, max(abs(top), abs(bottom)),
+                        window_noise(y), integral, x_unit)
+
+
+class StatsIndex:
+    """Thread-safe DatasetStats per dataset path and x unit, persisted to *filename* (tab-separated).
+
+    The file is read on first use. Derived traces are not indexed: their
+    inputs are, and they are cheap to recompute from them.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._entries = {}          # path -> {unit: DatasetStats}, most recently recorded unit last
+        self._loaded = self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return sum(len(units) for units in self._entries.values())
+
+    def get(self, path, x_unit=None, check=True):
+        """Statistics of *path* in *x_unit* (any unit if None), or None.
+
+        With *check*, also None if the data file changed since.
+        """
+        with self._lock:
+            self._load()
+            units = self._entries.get(path) or {}
+            if x_unit is None:
+                entry = next(reversed(units.values()), None)
+            else:
+                entry = units.get(x_unit)
+        if entry is None or not check:
+            return entry
+        try:
+            return entry if _data_mtime(path) == entry.mtime else None
+        except OSError:
+            return None
+
+    def record(self, path, x_unit, x, y):
+        """Compute and store the statistics of *path*, loaded as (x, y); returns them (None if not indexed)."""
+        if is_derived(path):
+            return None
+        try:
+            mtime = _data_mtime(path)
+        except OSError:
+            return None
+        stats = compute_stats(x, y, x_unit, mtime)
+        with self._lock:
+            self._load()
+            units = self._entries.setdefault(path, {})
+            units.pop(x_unit, None)
+            if any(other.mtime != mtime for other in units.values()):
+                units.clear()           # computed from an older version of the data
+            units[x_unit] = stats
+            self._dirty = True
+        return stats
+
+    def missing(self, paths, x_unit=None):
+        """The *paths* with no statistics in *x_unit* (any unit if None), or stale ones (one stat call each)."""
+        return [p for p in paths if self.get(p, x_unit) is None]
+
+    def save(self):
+        """Write the index if anything was recorded since it was read.
+
+        Saves from different threads are serialised, and each writes its own
+        temporary file before replacing the index, so a reader never sees a
+        partial file.
+        """
+        with self._save_lock:
+            with self._lock:
+                if not (self._dirty and self.filename):
+                    return
+                entries = [(path, s) for path, units in self._entries.items() for s in units.values()]
+                self._dirty = False
+            try:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.filename)),
+                                           prefix=os.path.basename(self.filename), suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                        fh.write(INDEX_HEADER + "\n")
+                        for path, s in entries:
+                            fh.write(f"{path}\t{s.mtime}\t{s.points}\t{s.max!r}\t{s.abs_max!r}\t"
+                                     f"{s.noise!r}\t{s.integral!r}\t{s.unit}\n")
+                    os.replace(tmp, self.filename)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+            except BaseException:
+                with self._lock:
+                    self._dirty = True      # try again on the next save
+                raise
+
+    def _load(self):
+        """Read the index file once (lock held); malformed lines are skipped."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not (self.filename and os.path.exists(self.filename)):
+            return
+        with open(self.filename, encoding="utf-8") as fh:
+            for line in fh:
+                if line.startswith("#"):
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 8:
+                    continue
+                try:
+                    path, mtime, points = fields[0], int(fields[1]), int(fields[2])
+                    values = [float(v) for v in fields[3:7]]
+                except ValueError:
+                    continue
+                self._entries.setdefault(path, {}).setdefault(
+                    fields[7], DatasetStats(mtime, points, *values, fields[7]))
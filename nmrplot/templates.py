@@ -0,0 +1,21 @@
+"""Plot templates: the key:value text files written by the GUI's "Export Template"."""
+
+def read_template(filepath) -> dict[str, str]:
+    """Parse a template file into {key: value}; malformed lines are reported and skipped."""
+    values = {}
+    with open(filepath, "r", encoding="utf-8") as fh:
+        for line_number, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+
+            if ':' not in line:
+                print(f"Warning: Line {line_number} is malformed (missing colon): {line.strip()}")
+                continue
+
+            key, value = line.strip().split(":", 1)
+            if not key:                         # allow empty values
+                print(f"Warning: Line {line_number} has empty key: {line.strip()}")
+                continue
+            values[key] = value
+    return values
+
@@ -0,0 +1,114 @@
+"""Main-loop stall watchdog: tick latency and main-thread stack samples (stdlib only).
+
+The GUI calls tick() from its event loop every *interval_ms* (Tk: after()).
+A helper thread notices when the next tick is more than *threshold_ms* late
+and samples the main thread's stack via sys._current_frames() until the loop
+comes back. Each stall is then appended to the log file with its most sampled
+stack, and counted against the callback it happened in for summary().
+"""
+import os
+import sys
+import time
+import threading
+import traceback
+from collections import Counter, deque
+
+# frames from these files are "ours"; the outermost one is the callback that stalled
+_OWN_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# a sampled frame is (filename, lineno, name, line), as traceback.format_list() takes
+def _where(frame):
+    return f"{os.path.basename(frame[0])}:{frame[2]}"
+
+def _callback_frames(stack):
+    """The frames below Tk's callback dispatch (CallWrapper.__call__), or all of them."""
+    for i, f in enumerate(stack):
+        if f[2] == "__call__" and os.path.basename(os.path.dirname(f[0])) == "tkinter":
+            return stack[i + 1:]
+    return stack
+
+def _own_frames(stack):
+    return [f for f in stack if os.path.abspath(f[0]).startswith(_OWN_ROOT)]
+
+
+class StallWatchdog:
+    def __init__(self, threshold_ms=250, interval_ms=50, log_path=None, keep_latencies=1200):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.log_path = log_path
+        self.latencies_ms = deque(maxlen=keep_latencies)   # lateness of recent ticks
+        self.offenders = {}     # callback -> {"stalls", "total_ms", "worst_ms", "where"}
+        self._main = threading.main_thread().ident
+        self._samples = []
+        self._lock = threading.Lock()
+        self._last_tick = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._last_tick = time.perf_counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ---- helper thread ----
+    def _run(self):
+        # a few samples per threshold, so short stalls still get one
+        period = max(0.01, self.threshold / 4)
+        while not self._stop.wait(period):
+            if time.perf_counter() - self._last_tick > self.interval + self.threshold:
+                frame = sys._current_frames().get(self._main)
+                if frame is not None:
+                    stack = tuple((f.filename, f.lineno, f.name, f.line)
+                                  for f in traceback.extract_stack(frame))
+                    del frame
+                    with self._lock:
+                        self._samples.append(stack)
+
+    # ---- main loop ----
+    def tick(self):
+        """Call once per *interval_ms* from the event loop; closes any stall that just ended."""
+        now = time.perf_counter()
+        late = max(0.0, now - self._last_tick - self.interval)
+        self._last_tick = now
+        self.latencies_ms.append(late * 1e3)
+        with self._lock:
+            samples, self._samples = self._samples, []
+        if late > self.threshold:
+            self._report(late * 1e3, samples)
+
+    def _report(self, stall_ms, samples):
+        if samples:
+            stack, hits = Counter(samples).most_common(1)[0]
+            inner = _callback_frames(stack)
+            own = _own_frames(inner) or list(inner or stack)
+            callback, where = _where(own[0]), _where(own[-1])
+        else:
+            stack, hits = (), 0
+            callback = where = "(not sampled)"
+
+        entry = self.offenders.setdefault(callback, {"stalls": 0, "total_ms": 0.0, "worst_ms": 0.0,
+                                                     "where": where})
+        entry["stalls"] += 1
+        entry["total_ms"] += stall_ms
+        if stall_ms >= entry["worst_ms"]:
+            entry["worst_ms"], entry["where"] = stall_ms, where
+
+        if self.log_path:
+            lines = [f"{time.strftime('%Y-%m-%d %H:%M:%S')}  stall {stall_ms:.0f} ms in {callback}"
+                     f" (at {where}; {hits}/{len(samples)} samples)\n"]
+            lines += ["  " + line for chunk in traceback.format_list(stack)
+                      for line in chunk.splitlines(keepends=True)]
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as fh:
+                    fh.writelines(lines + ["\n"])
+            except OSError:
+                pass
+
+    def summary(self, n=10):
+        """The *n* callbacks with the most total stall time: [(callback, entry)], worst first."""
+        return sorted(self.offenders.items(), key=lambda kv: -kv[1]["total_ms"])[:n]